@@ -1,12 +1,22 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from .models import CustomUser, EmailOutbox
 from trznice.admin import custom_admin_site
 from django.core.exceptions import PermissionDenied
 from .forms import CustomUserCreationForm
+from .utils import apply_role_permissions, set_role_for_users
 from django.db.models import Q
 
 
+def _make_set_role_action(role):
+    def set_role(modeladmin, request, queryset):
+        # hromadně: update role + oprávnění po dávkách (account.utils.set_role_for_users)
+        count = set_role_for_users(modeladmin.manageable_users(request, queryset), role)
+        modeladmin.message_user(request, f"Role '{role}' nastavena {count} uživatelům.")
+    set_role.allowed_permissions = ("change",)
+    return set_role
+
+
 # @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
@@ -96,10 +106,50 @@ class CustomUserAdmin(UserAdmin):
         return qs
     
 
+    def manageable_users(self, request, queryset):
+        # úředník smí měnit jen prodejce a uživatele bez role, nikdy superusery
+        if request.user.role == "cityClerk":
+            return queryset.filter(Q(role__in=["seller", ""]) | Q(role__isnull=True), is_superuser=False)
+        return queryset
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # akce přidané mimo _get_base_actions Django podle allowed_permissions nefiltruje
+        if not self.has_change_permission(request):
+            return actions
+        for role, label in CustomUser.ROLE_CHOICES:
+            if request.user.role == "cityClerk" and role != "seller":
+                continue
+            name = f"set_role_{role}"
+            actions[name] = (_make_set_role_action(role), name, f"Nastavit roli: {label}")
+        return actions
+
     def save_model(self, request, obj, form, change):
         if request.user.role == "cityClerk":
             if obj.role not in ["", None, "seller"]:
                 raise PermissionDenied("City clerk can't assign this role.")
-        super().save_model(request, obj, form, change)
-
-custom_admin_site.register(CustomUser, CustomUserAdmin)
\ No newline at end of file
+        # oprávnění role až po save_related, jinak by je formulář přepsal svými user_permissions
+        obj._defer_role_permissions = True
+        try:
+            super().save_model(request, obj, form, change)
+        finally:
+            obj._defer_role_permissions = False
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        obj = form.instance
+        if obj.role and (not change or "role" in form.changed_data):
+            apply_role_permissions([obj.pk], obj.role)
+            obj._original_role = obj.role
+
+custom_admin_site.register(CustomUser, CustomUserAdmin)
+
+
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ("id", "subject", "status", "attempts", "next_attempt_at", "created_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("subject", "recipients")
+    ordering = ("-created_at",)
+    readonly_fields = ("dedupe_key", "created_at", "sent_at", "last_error")
+
+custom_admin_site.register(EmailOutbox, EmailOutboxAdmin)
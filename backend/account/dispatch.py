@@ -0,0 +1,118 @@
+"""
+Odesílání Celery tasků s circuit breakerem.
+
+`dispatch_task(task, *args, **kwargs)`:
+
+- task se pošle až po commitu transakce (`transaction.on_commit`), worker tak nikdy
+  nepracuje s necommitnutými řádky,
+- `apply_async(retry=False)`, nedostupný broker tedy neblokuje požadavek opakovaným
+  připojováním; selhání otevře breaker na `BREAKER_COOLDOWN` sekund (stav v cache,
+  sdílený všemi procesy) a po tu dobu se broker vůbec nezkouší,
+- task, který se nepodařilo odeslat, se uloží do DeferredTask a po obnovení brokeru
+  se odešle znovu (`drain_deferred_tasks_task`, naplánuje se po prvním úspěšném
+  odeslání a periodicky z Celery Beat).
+
+Task se při výpadku nikdy nespouští synchronně v požadavku.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from celery import current_app
+
+from .models import DeferredTask
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+BREAKER_KEY = "celery:breaker:open"
+BREAKER_COOLDOWN = 30  # sekundy bez pokusu o broker po jeho selhání
+DEFERRED_PENDING_KEY = "celery:deferred:pending"
+DEFERRED_BATCH_SIZE = 100
+DRAIN_TASK_NAME = "account.tasks.drain_deferred_tasks_task"
+
+
+def broker_available():
+    """False, dokud je breaker otevřený (broker nedávno selhal)."""
+    return not cache.get(BREAKER_KEY)
+
+
+def _open_breaker(error):
+    if cache.add(BREAKER_KEY, True, BREAKER_COOLDOWN):
+        logger.error(f"Celery broker nedostupný, breaker otevřen na {BREAKER_COOLDOWN}s: {error}")
+
+
+def _send(task_name, args, kwargs):
+    """Pošle task brokeru, při chybě otevře breaker a vrátí False."""
+    try:
+        task = current_app.tasks.get(task_name)
+        if task is not None:
+            task.apply_async(args=args, kwargs=kwargs, retry=False)
+        else:
+            current_app.send_task(task_name, args=args, kwargs=kwargs, retry=False)
+    except Exception as e:
+        _open_breaker(e)
+        return False
+    return True
+
+
+def _defer(task_name, args, kwargs):
+    DeferredTask.objects.create(task_name=task_name, args=list(args), kwargs=kwargs)
+    cache.set(DEFERRED_PENDING_KEY, True, None)
+
+
+def _dispatch(task_name, args, kwargs, fallback):
+    if broker_available() and _send(task_name, args, kwargs):
+        if cache.get(DEFERRED_PENDING_KEY):
+            # broker je zpět, odložené tasky dožene worker, ne tento požadavek
+            _send(DRAIN_TASK_NAME, (), {})
+        return True
+
+    if fallback:
+        _defer(task_name, args, kwargs)
+    else:
+        logger.warning(f"Task {task_name} se neodeslal (broker nedostupný)")
+    return False
+
+
+def dispatch_task(task, *args, fallback=True, **kwargs):
+    """
+    Naplánuje Celery task po commitu aktuální transakce (mimo transakci hned).
+
+    Args:
+        task: Celery task (nebo jeho jméno)
+        fallback (bool): při nedostupném brokeru task uložit do DeferredTask;
+            False pro tasky, které se stejně spouští periodicky
+    """
+    task_name = task if isinstance(task, str) else task.name
+    transaction.on_commit(lambda: _dispatch(task_name, args, kwargs, fallback))
+
+
+def drain_deferred_tasks(batch_size=DEFERRED_BATCH_SIZE):
+    """
+    Znovu odešle odložené tasky v pořadí, v jakém vznikly. Skončí při první chybě
+    (breaker se znovu otevře). Vrací počet odeslaných tasků.
+    """
+    sent = 0
+    while broker_available():
+        with transaction.atomic():
+            deferred = list(DeferredTask.objects.select_for_update(skip_locked=True).order_by("id")[:batch_size])
+            if not deferred:
+                cache.delete(DEFERRED_PENDING_KEY)
+                break
+
+            done = []
+            for item in deferred:
+                if not _send(item.task_name, item.args, item.kwargs):
+                    break
+                done.append(item.pk)
+            DeferredTask.objects.filter(pk__in=done).delete()
+            sent += len(done)
+            if len(done) < len(deferred):
+                DeferredTask.objects.filter(pk__in=[item.pk for item in deferred[len(done):]]).update(attempts=F("attempts") + 1)
+                break
+
+    if sent:
+        logger.info(f"Re-dispatched {sent} deferred Celery tasks")
+    return sent
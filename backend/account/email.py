@@ -1,14 +1,13 @@
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes
 from django.urls import reverse
-from django.core.mail import send_mail
 from .tokens import *
+from .outbox import enqueue_email
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
 from django.conf import settings
-from rest_framework.response import Response
 
 
 import logging
@@ -87,22 +86,9 @@ def send_email_clerk_accepted(user):
 def send_email_with_context(recipients, subject, message):
     """
     General function to send emails with a specific context.
+    Zpráva se jen zařadí do fronty (account/outbox.py), odešle ji drain_email_outbox_task.
     """
-    if isinstance(recipients, str):
-        recipients = [recipients]
-
-    try:
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=None,
-            recipient_list=recipients,
-            fail_silently=False,
-        )
-        return True
-    except Exception as e:
-        if settings.EMAIL_BACKEND == 'django.core.mail.backends.console.EmailBackend':
-            logger.error(f"email se neodeslal... DEBUG: {e}")
-            pass
-        else:
-            return Response({"error": f"E-mail se neodeslal, důvod: {e}"}, status=500)
+    if settings.EMAIL_BACKEND == 'django.core.mail.backends.console.EmailBackend':
+        logger.debug(f"\nEMAIL OBSAH:\n {message}\nKONEC OBSAHU")
+
+    return enqueue_email(recipients, subject, message) > 0
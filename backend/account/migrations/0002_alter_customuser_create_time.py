@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='create_time',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
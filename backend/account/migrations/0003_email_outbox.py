@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:51
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0002_alter_customuser_create_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Ve frontě'), ('sent', 'Odesláno'), ('failed', 'Neodesláno')], default='queued', max_length=20)),
+                ('recipients', models.JSONField(default=list)),
+                ('subject', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('dedupe_key', models.CharField(max_length=64)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='email_outbox_due_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'queued')), fields=('dedupe_key',), name='email_outbox_queued_dedupe')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:56
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0004_deferred_task'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.text.Upper('email'), name='customuser_email_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.text.Upper('username'), name='customuser_username_upper_idx'),
+        ),
+    ]
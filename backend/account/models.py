@@ -4,7 +4,8 @@ from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.core.validators import RegexValidator, MinLengthValidator, MaxValueValidator, MinValueValidator
 
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Upper
 from django.utils import timezone
 from datetime import timedelta
 
@@ -16,6 +17,8 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+LOGIN_SAVE_ATTEMPTS = 5
+
 # Custom User Manager to handle soft deletion
 class CustomUserActiveManager(UserManager):
     def get_queryset(self):
@@ -68,7 +71,7 @@ class CustomUser(SoftDeleteModel, AbstractUser):
     )
     
     email = models.EmailField(unique=True, db_index=True)
-    create_time = models.DateTimeField(auto_now_add=True)
+    create_time = models.DateTimeField(auto_now_add=True, db_index=True)  # cursor stránkování
 
     var_symbol = models.PositiveIntegerField(null=True, blank=True, validators=[
             MaxValueValidator(9999999999),
@@ -138,6 +141,13 @@ class CustomUser(SoftDeleteModel, AbstractUser):
 
     REQUIRED_FIELDS = ['email']
 
+    class Meta:
+        indexes = [
+            # přihlášení e-mailem nebo loginem bez ohledu na velikost písmen (__iexact → UPPER(...))
+            models.Index(Upper("email"), name="customuser_email_upper_idx"),
+            models.Index(Upper("username"), name="customuser_username_upper_idx"),
+        ]
+
 
     def __str__(self):
         return f"{self.email} at {self.create_time.strftime('%d-%m-%Y %H:%M:%S')}"
@@ -146,22 +156,35 @@ class CustomUser(SoftDeleteModel, AbstractUser):
         """
         Vygeneruje login ve formátu: prijmeni + 2 písmena jména bez diakritiky.
         Přidá číslo pokud už login existuje.
+
+        Jeden dotaz na všechny loginy s daným prefixem (i soft-smazané, username je unikátní
+        v celé tabulce), další volné číslo se dopočítá v Pythonu. Souběžnou registraci
+        stejného loginu řeší opakování v save().
         """
         from django.utils.text import slugify
         base_login = slugify(f"{last_name}{first_name[:2]}")
-        login = base_login
-        counter = 1
-        while CustomUser.objects.filter(username=login).exists():
-            login = f"{base_login}{counter}"
-            counter += 1
-        return login
+        taken = set(CustomUser.all_objects.filter(username__startswith=base_login).values_list("username", flat=True))
+        if base_login not in taken:
+            return base_login
+
+        suffixes = [int(name[len(base_login):]) for name in taken if name[len(base_login):].isdigit()]
+        return f"{base_login}{max(suffixes, default=0) + 1}"
     
     def delete(self, *args, **kwargs):
         self.is_active = False
 
         self.tickets.all().update(is_deleted=True, deleted_at=timezone.now())
+
+        # update() obchází signály, index obsazenosti, manifesty akcí a vstupenky je nutné zneplatnit ručně
+        from booking.manifest import mark_reservations_changed
+        from booking.occupancy import invalidate_slot_occupancy
+        from booking.tickets import invalidate_tickets
+        reservations = list(self.user_reservations.values_list("pk", "market_slot_id"))
         self.user_reservations.all().update(is_deleted=True, deleted_at=timezone.now())
+        invalidate_slot_occupancy(*(slot_id for _, slot_id in reservations))
+        mark_reservations_changed(*(pk for pk, _ in reservations))
         self.orders.all().update(is_deleted=True, deleted_at=timezone.now())
+        invalidate_tickets()
 
         return super().delete(*args, **kwargs)
     
@@ -182,18 +205,77 @@ class CustomUser(SoftDeleteModel, AbstractUser):
                     self.role = 'admin'
             else:
                 self.is_staff = False
+
+            if self.first_name and self.last_name:
+                return self._save_with_generated_login(*args, **kwargs)
         
         return super().save(*args, **kwargs)
 
-        # NEMAZAT prozatim to nechame, kdybychom to potrebovali
+    def _save_with_generated_login(self, *args, **kwargs):
+        # login mohl mezi generate_login a INSERTem obsadit souběžný požadavek
+        for attempt in range(LOGIN_SAVE_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                if attempt == LOGIN_SAVE_ATTEMPTS - 1 or not CustomUser.all_objects.filter(username=self.username).exists():
+                    raise
+                self.username = self.generate_login(self.first_name, self.last_name)
+
 
-        # Now assign permissions after user exists
-        # if is_new and self.role:
-        if self.role:
-            from account.utils import assign_permissions_based_on_role
-            logger.debug(f"Assigning permissions to: {self.email} with role {self.role}")
-            assign_permissions_based_on_role(self)
-        
-        # super().save(*args, **kwargs)  # save once, after prep
-    
 
+
+class EmailOutbox(models.Model):
+    """
+    Fronta odchozích e-mailů (viz account/outbox.py). Zprávy se zapíšou v rámci
+    požadavku / tasku a odesílá je drain_email_outbox_task po dávkách přes jedno SMTP spojení.
+    """
+    STATUS_CHOICES = [
+        ("queued", "Ve frontě"),
+        ("sent", "Odesláno"),
+        ("failed", "Neodesláno"),
+    ]
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued")
+
+    recipients = models.JSONField(default=list)
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    # stejná zpráva čekající ve frontě se nezařadí podruhé
+    dedupe_key = models.CharField(max_length=64)
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="email_outbox_due_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dedupe_key"],
+                condition=models.Q(status="queued"),
+                name="email_outbox_queued_dedupe",
+            ),
+        ]
+
+    def __str__(self):
+        return f"E-mail {self.id} ({self.status}): {self.subject}"
+
+
+class DeferredTask(models.Model):
+    """
+    Záložní fronta Celery tasků pro výpadek brokeru (viz account/dispatch.py).
+    Po obnovení brokeru se tasky odešlou znovu a záznam se smaže.
+    """
+    task_name = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.task_name}{tuple(self.args)}"
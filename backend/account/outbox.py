@@ -0,0 +1,162 @@
+"""
+Odchozí e-maily přes frontu v DB (EmailOutbox).
+
+- `enqueue_email` / `enqueue_emails` zprávy jen zapíšou (jeden INSERT pro celou dávku)
+  a po commitu transakce naplánují `drain_email_outbox_task` (account/dispatch.py),
+  požadavek ani task tak nečeká na SMTP.
+- `drain_outbox` si zprávy k odeslání zarezervuje krátkou transakcí (posune jim
+  `next_attempt_at` o lease, souběžné workery je přeskočí) a pošle je přes jedno
+  otevřené spojení (`get_connection` / `send_messages`).
+- Neúspěšné zprávy se opakují s exponenciálním backoffem, po `OUTBOX_MAX_ATTEMPTS`
+  zůstanou ve stavu "failed".
+- Stejná zpráva (příjemci + předmět + text), která ještě čeká ve frontě, se nezařadí znovu.
+
+Backend se řídí EMAIL_BACKEND, ve vývoji konzole / soubor, v testech locmem.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .dispatch import dispatch_task
+from .models import EmailOutbox
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_BACKOFF_BASE = 60  # sekundy, 1, 2, 4, 8 minut ...
+OUTBOX_BACKOFF_MAX = 60 * 60
+OUTBOX_LEASE = timedelta(minutes=5)  # jak dlouho zarezervované zprávy nevidí jiný worker
+
+
+def _normalize_recipients(recipients):
+    if isinstance(recipients, str):
+        recipients = [recipients]
+    return sorted({recipient for recipient in recipients if recipient})
+
+
+def dedupe_key(recipients, subject, message):
+    raw = json.dumps([recipients, subject, message], ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def enqueue_emails(messages):
+    """
+    Zařadí e-maily do fronty jedním INSERTem a po commitu spustí odesílání.
+
+    Args:
+        messages (iterable): [(subject, message, recipients), ...], recipients je e-mail nebo seznam
+
+    Returns:
+        int: počet zpráv předaných do fronty (duplicitní čekající zprávy DB přeskočí)
+    """
+    rows = []
+    for subject, message, recipients in messages:
+        recipients = _normalize_recipients(recipients)
+        if not recipients:
+            continue
+        rows.append(EmailOutbox(
+            recipients=recipients,
+            subject=subject,
+            message=message,
+            dedupe_key=dedupe_key(recipients, subject, message),
+        ))
+    if not rows:
+        return 0
+
+    EmailOutbox.objects.bulk_create(rows, ignore_conflicts=True)
+    from .tasks import drain_email_outbox_task
+
+    # zprávy jsou v DB, při výpadku brokeru je odešle periodický drain
+    dispatch_task(drain_email_outbox_task, fallback=False)
+    return len(rows)
+
+
+def enqueue_email(recipients, subject, message):
+    return enqueue_emails([(subject, message, recipients)])
+
+
+def _claim(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status="queued", next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        if claimed:
+            EmailOutbox.objects.filter(pk__in=[email.pk for email in claimed]).update(next_attempt_at=now + OUTBOX_LEASE)
+    return claimed
+
+
+def _backoff(attempts):
+    return timedelta(seconds=min(OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX))
+
+
+def drain_outbox(batch_size=OUTBOX_BATCH_SIZE, max_batches=None):
+    """
+    Odešle zprávy z fronty po dávkách, každou dávku přes jedno SMTP spojení.
+
+    Returns:
+        dict: {"sent": int, "retry": int, "failed": int}
+    """
+    stats = {"sent": 0, "retry": 0, "failed": 0}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        emails = _claim(batch_size)
+        if not emails:
+            break
+        batches += 1
+        _send_batch(emails, stats)
+    if any(stats.values()):
+        logger.info(f"E-mail outbox drained: {stats}")
+    return stats
+
+
+def _send_batch(emails, stats):
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        # bez spojení se nepošle nic z dávky
+        for email in emails:
+            _mark_failure(email, e, stats)
+        EmailOutbox.objects.bulk_update(emails, ["status", "attempts", "next_attempt_at", "last_error"])
+        return
+
+    try:
+        for email in emails:
+            message = EmailMessage(subject=email.subject, body=email.message, to=email.recipients, connection=connection)
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                _mark_failure(email, e, stats)
+            else:
+                email.status = "sent"
+                email.sent_at = timezone.now()
+                email.attempts += 1
+                email.last_error = ""
+                stats["sent"] += 1
+    finally:
+        connection.close()
+
+    EmailOutbox.objects.bulk_update(emails, ["status", "attempts", "next_attempt_at", "last_error", "sent_at"])
+
+
+def _mark_failure(email, error, stats):
+    email.attempts += 1
+    email.last_error = str(error)[:1000]
+    if email.attempts >= OUTBOX_MAX_ATTEMPTS:
+        email.status = "failed"
+        stats["failed"] += 1
+        logger.error(f"E-mail {email.id} se neodeslal ani na {email.attempts}. pokus: {error}")
+    else:
+        email.next_attempt_at = timezone.now() + _backoff(email.attempts)
+        stats["retry"] += 1
+        logger.warning(f"E-mail {email.id} se neodeslal, další pokus v {email.next_attempt_at}: {error}")
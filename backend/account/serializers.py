@@ -1,19 +1,20 @@
 import re
-from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator
 from rest_framework import serializers
 from rest_framework.exceptions import NotFound
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.utils.translation import gettext_lazy as _
-from django.utils.text import slugify
 
 from .permissions import *
 from .email import *
 
 
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from rest_framework.exceptions import PermissionDenied  
+from rest_framework_simplejwt.settings import api_settings as jwt_api_settings
+from rest_framework.exceptions import AuthenticationFailed, PermissionDenied
+from django.contrib.auth.models import update_last_login
+from django.db.models import Q
 
 
 User = get_user_model()
@@ -66,18 +67,29 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         login = attrs.get("username")
         password = attrs.get("password")
 
-        # Allow login by username or email
-        user = User.objects.filter(email__iexact=login).first() or \
-               User.objects.filter(username__iexact=login).first()
+        # Login e-mailem nebo uživatelským jménem jedním dotazem (indexy UPPER(email), UPPER(username)),
+        # při shodě obojího má přednost e-mail
+        candidates = list(User.objects.filter(Q(email__iexact=login) | Q(username__iexact=login))[:2])
+        candidates.sort(key=lambda candidate: candidate.email.lower() != str(login).lower())
+        user = candidates[0] if candidates else None
 
-        if user is None or not user.check_password(password):
+        # Heslo se ověřuje právě jednou; pro neexistujícího uživatele se hash spočítá také,
+        # aby odpověď časem neprozradila existenci účtu (stejně jako ModelBackend)
+        if user is None:
+            User().set_password(password)
             raise serializers.ValidationError(_("No active account found with the given credentials"))
+        if not user.check_password(password):
+            raise serializers.ValidationError(_("No active account found with the given credentials"))
+
+        if not jwt_api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
 
-        # Call the parent validation to create token
-        data = super().validate({
-            self.username_field: user.username,
-            "password": password
-        })
+        self.user = user
+        refresh = self.get_token(user)
+        data = {"refresh": str(refresh), "access": str(refresh.access_token)}
+
+        if jwt_api_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
 
         data["user_id"] = user.id
         data["username"] = user.username
@@ -136,23 +148,10 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({"phone_number": "Účet s tímto telefonem již existuje."})
         return data
 
-    def generate_username(self, first_name, last_name):
-        # Převod na ascii (bez diakritiky)
-        base_login = slugify(f"{last_name}{first_name[:2]}")
-        login = base_login
-        counter = 1
-        while User.objects.filter(username=login).exists():
-            login = f"{base_login}{counter}"
-            counter += 1
-        return login
-    
     def create(self, validated_data):
         password = validated_data.pop("password")
-        first_name = validated_data.get("first_name", "")
-        last_name = validated_data.get("last_name", "")
-        username = self.generate_username(first_name, last_name)
-        user = User.objects.create(
-            username=username,
+        # login vygeneruje CustomUser.save() z first_name a last_name
+        user = User(
             is_active=False, #uživatel je defaultně deaktivovaný
             **validated_data
         )
@@ -0,0 +1,31 @@
+from django.db.models.signals import post_save, post_delete, post_init, post_migrate
+from django.dispatch import receiver
+from account.models import CustomUser
+from account.tokens import invalidate_auth_user
+from account.utils import apply_role_permissions, clear_role_permission_cache
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def invalidate_cached_auth_user(sender, instance, **kwargs):
+    # role, is_active, heslo i soft delete jdou přes save(), skupiny/oprávnění se necachují
+    invalidate_auth_user(instance.pk)
+
+
+@receiver(post_init, sender=CustomUser)
+def remember_user_role(sender, instance, **kwargs):
+    instance._original_role = instance.__dict__.get("role")
+
+
+@receiver(post_save, sender=CustomUser)
+def assign_role_permissions(sender, instance, created, **kwargs):
+    # oprávnění se přepočítají jen pro nového uživatele nebo při změně role
+    if not instance.role or (not created and instance.role == instance._original_role):
+        return
+    if getattr(instance, "_defer_role_permissions", False):
+        # admin formulář: uloží user_permissions až v save_related, role se aplikuje po něm
+        return
+    instance._original_role = instance.role
+    apply_role_permissions([instance.pk], instance.role)
+
+
+post_migrate.connect(clear_role_permission_cache, dispatch_uid="account.clear_role_permission_cache")
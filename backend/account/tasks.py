@@ -1,10 +1,12 @@
 from celery import shared_task
 from celery.utils.log import get_task_logger
-from django.core.mail import send_mail
 from django.conf import settings
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes
 from .tokens import *
+from .email import send_email_with_context
+from .outbox import OUTBOX_BATCH_SIZE, drain_outbox
+from .dispatch import drain_deferred_tasks
 
 from .models import CustomUser
 
@@ -108,24 +110,16 @@ def send_email_clerk_accepted_task(user_id):
     
     
 
-def send_email_with_context(recipients, subject, message):
+@shared_task
+def drain_email_outbox_task(batch_size=OUTBOX_BATCH_SIZE):
     """
-    General function to send emails with a specific context.
+    Odešle e-maily čekající ve frontě (EmailOutbox) přes jedno SMTP spojení na dávku.
+    Spouští se po zařazení zpráv a periodicky (opakování neúspěšných s backoffem).
     """
-    if isinstance(recipients, str):
-        recipients = [recipients]
+    return drain_outbox(batch_size=batch_size)
 
-    try:
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=None,
-            recipient_list=recipients,
-            fail_silently=False,
-        )
-        if settings.EMAIL_BACKEND == 'django.core.mail.backends.console.EmailBackend':
-            logger.debug("\nEMAIL OBSAH:\n",message, "\nKONEC OBSAHU")
-        return True
-    except Exception as e:
-        logger.error(f"E-mail se neodeslal: {e}")
-        return False
+
+@shared_task
+def drain_deferred_tasks_task():
+    """Odešle tasky odložené během výpadku brokeru (DeferredTask), viz account/dispatch.py."""
+    return drain_deferred_tasks()
@@ -1,3 +1,376 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from celery.app.task import Task
+from django.core.cache import cache
+from django.contrib.auth.models import Permission
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .dispatch import BREAKER_KEY, DEFERRED_PENDING_KEY, DRAIN_TASK_NAME, broker_available, dispatch_task, drain_deferred_tasks
+from .models import CustomUser, DeferredTask, EmailOutbox
+from .outbox import OUTBOX_BACKOFF_BASE, OUTBOX_MAX_ATTEMPTS, drain_outbox, enqueue_email, enqueue_emails
+from .tokens import AUTH_USER_CACHE_KEY
+from .utils import managed_permission_ids, role_permission_ids, set_role_for_users
+from .tasks import drain_email_outbox_task, send_email_verification_task, send_password_reset_email_task
+
+
+class FailingEmailBackend(LocmemEmailBackend):
+    """Spojení se otevře, odeslání selže (výpadek SMTP uprostřed dávky)."""
+
+    def send_messages(self, messages):
+        raise ConnectionError("SMTP nedostupné")
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class EmailOutboxTests(TestCase):
+    def test_duplicate_queued_message_skipped(self):
+        enqueue_email("seller@example.com", "Předmět", "Text")
+        enqueue_emails([
+            ("Předmět", "Text", ["seller@example.com", ""]),
+            ("Předmět", "Jiný text", "seller@example.com"),
+        ])
+        self.assertEqual(EmailOutbox.objects.count(), 2)
+
+        # odeslanou zprávu lze zařadit znovu, unikátní jsou jen čekající (email_outbox_queued_dedupe)
+        EmailOutbox.objects.update(status="sent")
+        enqueue_email(["seller@example.com"], "Předmět", "Text")
+        self.assertEqual(EmailOutbox.objects.filter(status="queued").count(), 1)
+
+    def test_drain_sends_batch_over_one_connection(self):
+        enqueue_emails([("Předmět", f"Text {i}", f"seller{i}@example.com") for i in range(5)])
+
+        with mock.patch("account.outbox.get_connection", wraps=get_connection) as connections:
+            stats = drain_outbox(batch_size=10)
+
+        self.assertEqual(stats, {"sent": 5, "retry": 0, "failed": 0})
+        connections.assert_called_once()
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [f"seller{i}@example.com" for i in range(5)])
+        self.assertFalse(EmailOutbox.objects.exclude(status="sent").exists())
+
+        # odeslané zprávy se podruhé neposílají
+        self.assertEqual(drain_outbox(), {"sent": 0, "retry": 0, "failed": 0})
+
+    def test_drain_batches(self):
+        enqueue_emails([("Předmět", f"Text {i}", "seller@example.com") for i in range(5)])
+
+        with mock.patch("account.outbox.get_connection", wraps=get_connection) as connections:
+            self.assertEqual(drain_outbox(batch_size=2, max_batches=2)["sent"], 4)
+        self.assertEqual(connections.call_count, 2)
+        self.assertEqual(EmailOutbox.objects.filter(status="queued").count(), 1)
+
+    @override_settings(EMAIL_BACKEND="account.tests.FailingEmailBackend")
+    def test_backoff_until_failed(self):
+        enqueue_email("seller@example.com", "Předmět", "Text")
+        email = EmailOutbox.objects.get()
+
+        for attempt in range(1, OUTBOX_MAX_ATTEMPTS):
+            before = timezone.now()
+            self.assertEqual(drain_outbox(), {"sent": 0, "retry": 1, "failed": 0})
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), ("queued", attempt))
+            self.assertIn("SMTP nedostupné", email.last_error)
+            backoff = timedelta(seconds=OUTBOX_BACKOFF_BASE * 2 ** (attempt - 1))
+            self.assertGreaterEqual(email.next_attempt_at, before + backoff)
+            self.assertLess(email.next_attempt_at, timezone.now() + backoff)
+
+            # před uplynutím backoffu se zpráva nezkouší
+            self.assertEqual(drain_outbox(), {"sent": 0, "retry": 0, "failed": 0})
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+
+        self.assertEqual(drain_outbox(), {"sent": 0, "retry": 0, "failed": 1})
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ("failed", OUTBOX_MAX_ATTEMPTS))
+        self.assertEqual(drain_outbox(), {"sent": 0, "retry": 0, "failed": 0})
+
+
+class TaskDispatchTests(TestCase):
+    """Broker se nahrazuje mockem Task.apply_async, side_effect simuluje výpadek."""
+
+    def setUp(self):
+        cache.clear()
+
+    def _dispatch(self, *args, broker_error=None, **kwargs):
+        with mock.patch.object(Task, "apply_async", autospec=True, side_effect=broker_error) as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                dispatch_task(*args, **kwargs)
+        return apply_async
+
+    def _sent(self, apply_async):
+        # autospec: první argument je instance tasku
+        return [(call.args[0].name, list(call.kwargs["args"])) for call in apply_async.call_args_list]
+
+    def test_dispatch_after_commit(self):
+        with mock.patch.object(Task, "apply_async", autospec=True) as apply_async:
+            with self.captureOnCommitCallbacks() as callbacks:
+                dispatch_task(send_password_reset_email_task, 5)
+            apply_async.assert_not_called()
+
+            for callback in callbacks:
+                callback()
+        self.assertEqual(self._sent(apply_async), [(send_password_reset_email_task.name, [5])])
+        self.assertEqual(apply_async.call_args.kwargs["retry"], False)
+
+    def test_broker_failure_opens_breaker_and_defers(self):
+        apply_async = self._dispatch(send_password_reset_email_task, 5, broker_error=OSError("broker down"))
+
+        apply_async.assert_called_once()
+        self.assertFalse(broker_available())
+        self.assertEqual(
+            list(DeferredTask.objects.values_list("task_name", "args", "kwargs")),
+            [(send_password_reset_email_task.name, [5], {})],
+        )
+
+    def test_open_breaker_skips_broker(self):
+        self._dispatch(send_password_reset_email_task, 5, broker_error=OSError("broker down"))
+
+        apply_async = self._dispatch(send_email_verification_task, 6)
+        apply_async.assert_not_called()
+        self.assertEqual(DeferredTask.objects.count(), 2)
+
+        # periodicky spouštěné tasky se neodkládají
+        self._dispatch(drain_email_outbox_task, fallback=False)
+        self.assertEqual(DeferredTask.objects.count(), 2)
+
+    def test_drain_resends_in_order(self):
+        self._dispatch(send_password_reset_email_task, 5, broker_error=OSError("broker down"))
+        self._dispatch(send_email_verification_task, 6)
+        self._dispatch(send_password_reset_email_task, 7)
+        cache.delete(BREAKER_KEY)
+
+        with mock.patch.object(Task, "apply_async", autospec=True) as apply_async:
+            self.assertEqual(drain_deferred_tasks(), 3)
+
+        self.assertEqual(self._sent(apply_async), [
+            (send_password_reset_email_task.name, [5]),
+            (send_email_verification_task.name, [6]),
+            (send_password_reset_email_task.name, [7]),
+        ])
+        self.assertFalse(DeferredTask.objects.exists())
+        self.assertIsNone(cache.get(DEFERRED_PENDING_KEY))
+
+    def test_drain_stops_at_first_failure(self):
+        self._dispatch(send_password_reset_email_task, 5, broker_error=OSError("broker down"))
+        self._dispatch(send_email_verification_task, 6)
+        cache.delete(BREAKER_KEY)
+
+        with mock.patch.object(Task, "apply_async", autospec=True, side_effect=[None, OSError("broker down")]):
+            self.assertEqual(drain_deferred_tasks(), 1)
+
+        self.assertFalse(broker_available())
+        self.assertEqual(list(DeferredTask.objects.values_list("args", "attempts")), [([6], 1)])
+
+    def test_recovered_broker_schedules_drain(self):
+        self._dispatch(send_password_reset_email_task, 5, broker_error=OSError("broker down"))
+        cache.delete(BREAKER_KEY)
+
+        apply_async = self._dispatch(send_email_verification_task, 6)
+        self.assertEqual(self._sent(apply_async), [(send_email_verification_task.name, [6]), (DRAIN_TASK_NAME, [])])
+        self.assertEqual(DeferredTask.objects.count(), 1)
+
+
+class AuthUserCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(
+            username="seller", email="seller@example.com", role="seller", phone_number="+420123456788", is_active=True
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.cookies["access_token"] = str(AccessToken.for_user(self.user))
+
+    def _me(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/account/user/me/")
+        user_queries = [query for query in queries if f'FROM "{CustomUser._meta.db_table}"' in query["sql"]]
+        return response, len(user_queries)
+
+    def test_second_request_does_not_query_user(self):
+        response, user_queries = self._me()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(user_queries, 1)
+
+        response, user_queries = self._me()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["email"], "seller@example.com")
+        self.assertEqual(user_queries, 0)
+
+    def test_deactivation_rejected_on_next_request(self):
+        self.assertEqual(self._me()[0].status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user = CustomUser.objects.get(pk=self.user.pk)
+            user.is_active = False
+            user.save()
+
+        self.assertEqual(self._me()[0].status_code, 401)
+
+    def test_bulk_role_change_invalidates_cache(self):
+        self.assertEqual(self._me()[0].data["role"], "seller")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            set_role_for_users(CustomUser.objects.filter(pk=self.user.pk), "cityClerk")
+
+        self.assertIsNone(cache.get(AUTH_USER_CACHE_KEY.format(self.user.pk)))
+        response, user_queries = self._me()
+        self.assertEqual(response.data["role"], "cityClerk")
+        self.assertEqual(user_queries, 1)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class LoginTests(TestCase):
+    URL = "/api/account/token/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(
+            username="novakja", email="Jan.Novak@example.com", role="seller", phone_number="+420123456788", is_active=True
+        )
+        cls.user.set_password("Heslo123")
+        cls.user.save()
+
+    def _login(self, login, password="Heslo123"):
+        return APIClient().post(self.URL, {"username": login, "password": password}, format="json")
+
+    def test_login_by_email_or_username_case_insensitive(self):
+        for login in ("jan.novak@example.com", "JAN.NOVAK@EXAMPLE.COM", "novakja", "NovakJa"):
+            response = self._login(login)
+            self.assertEqual(response.status_code, 200, login)
+            self.assertEqual(response.data["user_id"], self.user.pk)
+            self.assertIn("access_token", response.cookies)
+
+    def test_wrong_password_and_unknown_user_same_error(self):
+        wrong_password = self._login("novakja", "Spatne123")
+        unknown_user = self._login("nikdo@example.com")
+
+        self.assertEqual(wrong_password.status_code, 400)
+        self.assertEqual(unknown_user.status_code, 400)
+        self.assertEqual(wrong_password.data, unknown_user.data)
+
+    def test_inactive_user_rejected(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self._login("novakja")
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data["detail"].code, "no_active_account")
+
+    def test_password_checked_once(self):
+        with mock.patch.object(CustomUser, "check_password", autospec=True, side_effect=CustomUser.check_password) as check:
+            self.assertEqual(self._login("jan.novak@example.com").status_code, 200)
+        check.assert_called_once()
+
+        with mock.patch.object(CustomUser, "check_password", autospec=True, side_effect=CustomUser.check_password) as check:
+            self.assertEqual(self._login("novakja", "Spatne123").status_code, 400)
+        check.assert_called_once()
+
+
+class GenerateLoginTests(TestCase):
+    def _user(self, username=None, index=0, **kwargs):
+        return CustomUser.objects.create(
+            username=username or f"user{index}", email=f"user{index}@example.com",
+            phone_number=f"+42012345670{index}", **kwargs
+        )
+
+    def test_next_suffix_after_existing_logins(self):
+        self.assertEqual(CustomUser().generate_login("Jan", "Novák"), "novakja")
+
+        self._user("novakja", 1)
+        self._user("novakja1", 2)
+        self._user("novakja7", 3).delete()  # soft delete, username zůstává obsazený
+        self.assertEqual(CustomUser().generate_login("Jan", "Novák"), "novakja8")
+
+    def test_non_numeric_suffixes_ignored(self):
+        self._user("novakja", 1)
+        self._user("novakjana", 2)
+        self._user("novakja2b", 3)
+        self.assertEqual(CustomUser().generate_login("Jan", "Novák"), "novakja1")
+
+    def test_integrity_error_retries_with_new_login(self):
+        self._user("novakja", 1)
+        generate_login = CustomUser.generate_login
+        calls = []
+
+        def stale_then_real(user, first_name, last_name):
+            # první volání vrátí login, který mezitím obsadil souběžný požadavek
+            calls.append(first_name)
+            return "novakja" if len(calls) == 1 else generate_login(user, first_name, last_name)
+
+        with mock.patch.object(CustomUser, "generate_login", autospec=True, side_effect=stale_then_real):
+            user = self._user(index=2, first_name="Jan", last_name="Novák")
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(user.username, "novakja1")
+
+    def test_integrity_error_on_email_or_phone_reraised(self):
+        self._user(index=1)
+        with self.assertRaises(IntegrityError):
+            CustomUser.objects.create(email="user1@example.com", phone_number="+420123456709", first_name="Jan", last_name="Novák")
+        with self.assertRaises(IntegrityError):
+            CustomUser.objects.create(email="user9@example.com", phone_number="+420123456701", first_name="Jan", last_name="Novák")
+        self.assertFalse(CustomUser.all_objects.filter(username__startswith="novakja").exists())
+
+
+class RolePermissionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            CustomUser.objects.create(
+                username=f"user{i}", email=f"user{i}@example.com", role="seller", phone_number=f"+42012345670{i}"
+            )
+            for i in range(6)
+        ]
+        # oprávnění, které žádná role nepřiděluje
+        cls.manual_permission = Permission.objects.exclude(pk__in=managed_permission_ids()).get(codename="view_order")
+
+    def _permission_ids(self, user):
+        return set(user.user_permissions.values_list("pk", flat=True))
+
+    def test_role_permissions_assigned(self):
+        user = self.users[0]
+        set_role_for_users(CustomUser.objects.filter(pk=user.pk), "squareManager")
+
+        self.assertTrue(role_permission_ids("squareManager"))
+        self.assertEqual(self._permission_ids(user), set(role_permission_ids("squareManager")))
+        user.refresh_from_db()
+        self.assertEqual(user.role, "squareManager")
+
+    def test_manual_permissions_survive_role_change(self):
+        user = self.users[0]
+        set_role_for_users(CustomUser.objects.filter(pk=user.pk), "squareManager")
+        user.user_permissions.add(self.manual_permission)
+
+        set_role_for_users(CustomUser.objects.filter(pk=user.pk), "cityClerk")
+        self.assertEqual(self._permission_ids(user), set(role_permission_ids("cityClerk")) | {self.manual_permission.pk})
+
+        set_role_for_users(CustomUser.objects.filter(pk=user.pk), "seller")
+        self.assertEqual(self._permission_ids(user), {self.manual_permission.pk})
+
+    def test_admin_flags_toggled(self):
+        user = self.users[0]
+        set_role_for_users(CustomUser.objects.filter(pk=user.pk), "admin")
+        user.refresh_from_db()
+        self.assertEqual((user.is_staff, user.is_superuser), (True, True))
+
+        set_role_for_users(CustomUser.objects.filter(pk=user.pk), "seller")
+        user.refresh_from_db()
+        self.assertFalse(user.is_superuser)
+
+    def test_query_count_does_not_depend_on_user_count(self):
+        role_permission_ids("cityClerk")  # cache ID oprávnění
+
+        def queries(users):
+            with CaptureQueriesContext(connection) as captured:
+                set_role_for_users(CustomUser.objects.filter(pk__in=[user.pk for user in users]), "cityClerk")
+            return len(captured)
+
+        self.assertEqual(queries(self.users[:1]), queries(self.users[1:]))
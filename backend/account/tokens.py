@@ -17,7 +17,42 @@ password_reset_token = PasswordResetTokenGenerator()
 
 
 
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+AUTH_USER_CACHE_KEY = "auth:user:{}"
+AUTH_USER_CACHE_TIMEOUT = 60  # krátké TTL jen jako pojistka, změny uživatele cache mažou hned (account/signals.py)
+
+
+def _load_auth_user(user_id):
+    """
+    Přihlášený uživatel z cache, jinak z DB. V cache jsou jen hodnoty polí
+    (bez _perm_cache a načtených vazeb), instance se z nich sestaví přes from_db.
+    """
+    user_model = get_user_model()
+    key = AUTH_USER_CACHE_KEY.format(user_id)
+    cached = cache.get(key)
+    if cached is not None:
+        return user_model.from_db("default", *cached)
+
+    user = user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+    field_names = [field.attname for field in user_model._meta.concrete_fields]
+    cache.set(key, (field_names, [getattr(user, name) for name in field_names]), AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+def invalidate_auth_user(user_id):
+    """Smaže uživatele z cache hned i po commitu (aby souběžný požadavek neuložil starý stav)."""
+    key = AUTH_USER_CACHE_KEY.format(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
 
 #NEMĚNIT CUSTOM SBÍRANÍ COOKIE TOKENU
 class CookieJWTAuthentication(JWTAuthentication):
@@ -31,3 +66,23 @@ class CookieJWTAuthentication(JWTAuthentication):
         validated_token = self.get_validated_token(raw_token)
         return self.get_user(validated_token), validated_token
 
+    def get_user(self, validated_token):
+        """Stejné kontroly jako JWTAuthentication.get_user, uživatel se ale bere z cache."""
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        try:
+            user = _load_auth_user(user_id)
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if getattr(api_settings, "CHECK_REVOKE_TOKEN", False):
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
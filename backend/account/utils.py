@@ -1,5 +1,6 @@
 from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
 from booking.models import Event, Reservation, MarketSlot, Square
 from product.models import Product, EventProduct
 from servicedesk.models import ServiceTicket
@@ -9,8 +10,14 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-def assign_permissions_based_on_role(user):
-    role_perms = {
+ROLE_BATCH_SIZE = 500
+
+# ID oprávnění podle role, počítá se jednou za proces (a po migrate znovu), viz role_permission_ids
+_role_permission_cache = {}
+
+
+def _role_perms():
+    return {
         "cityClerk": {
             "view": [Event, Reservation, MarketSlot, get_user_model(), Product, EventProduct, ServiceTicket],
             "add": [Reservation, get_user_model()],
@@ -32,6 +39,88 @@ def assign_permissions_based_on_role(user):
             "admin": "all",  # Mark this role specially
     }
 
+
+def _load_role_permission_ids():
+    """Všechny role najednou: jeden dotaz na ContentType (cachuje Django) a jeden na Permission."""
+    role_perms = {role: perms for role, perms in _role_perms().items() if perms != "all"}
+    models = {model for perms in role_perms.values() for model_list in perms.values() for model in model_list}
+    content_types = ContentType.objects.get_for_models(*models)
+
+    wanted = {
+        role: {(content_types[model].id, f"{action}_{model._meta.model_name}") for action, model_list in perms.items() for model in model_list}
+        for role, perms in role_perms.items()
+    }
+    codenames = {codename for keys in wanted.values() for _, codename in keys}
+    existing = {
+        (content_type_id, codename): pk
+        for pk, content_type_id, codename in Permission.objects.filter(
+            content_type__in=content_types.values(), codename__in=codenames
+        ).values_list("pk", "content_type_id", "codename")
+    }
+    return {role: frozenset(existing[key] for key in keys if key in existing) for role, keys in wanted.items()}
+
+
+def role_permission_ids(role):
+    """Množina ID oprávnění pro roli (prázdná pro admina a neznámé role)."""
+    if not _role_permission_cache:
+        _role_permission_cache.update(_load_role_permission_ids())
+    return _role_permission_cache.get(role, frozenset())
+
+
+def managed_permission_ids():
+    """Oprávnění, která přiděluje některá role (ostatní, ručně přidělená, se při změně role nemažou)."""
+    role_permission_ids(None)
+    return frozenset().union(*_role_permission_cache.values())
+
+
+def clear_role_permission_cache(**kwargs):
+    """Po migrate se mohla změnit ID oprávnění / content typů."""
+    _role_permission_cache.clear()
+    ContentType.objects.clear_cache()
+
+
+def apply_role_permissions(user_ids, role):
+    """
+    Nastaví oprávnění a příznaky role hromadně: na dávku uživatelů jeden DELETE a jeden
+    INSERT do through tabulky user_permissions, bez načítání instancí.
+    Maže se jen oprávnění spravovaná rolemi, ručně přidělená zůstávají.
+    update() obchází signály, cache přihlášených uživatelů se proto maže ručně.
+    """
+    from .tokens import invalidate_auth_user
+
+    User = get_user_model()
+    through = User.user_permissions.through
+    user_ids = list(user_ids)
+    permission_ids = role_permission_ids(role)
+    managed_ids = managed_permission_ids()
+
+    for start in range(0, len(user_ids), ROLE_BATCH_SIZE):
+        batch = user_ids[start:start + ROLE_BATCH_SIZE]
+        with transaction.atomic():
+            if role == "admin":
+                User.all_objects.filter(pk__in=batch).update(is_staff=True, is_superuser=True)
+            else:
+                # Reset in case role changed away from admin
+                User.all_objects.filter(pk__in=batch, is_superuser=True).update(is_superuser=False)
+
+            through.objects.filter(customuser_id__in=batch, permission_id__in=managed_ids).delete()
+            through.objects.bulk_create(
+                [through(customuser_id=user_id, permission_id=permission_id) for user_id in batch for permission_id in permission_ids],
+                ignore_conflicts=True,
+            )
+        for user_id in batch:
+            invalidate_auth_user(user_id)
+
+
+def set_role_for_users(queryset, role):
+    """Hromadná změna role (admin akce): update role + apply_role_permissions po dávkách."""
+    user_ids = list(queryset.values_list("pk", flat=True))
+    get_user_model().all_objects.filter(pk__in=user_ids).update(role=role)
+    apply_role_permissions(user_ids, role)
+    return len(user_ids)
+
+
+def assign_permissions_based_on_role(user):
     if not user.role:
         logger.info("User has no role set")
         return
@@ -40,23 +129,9 @@ def assign_permissions_based_on_role(user):
         user.is_staff = True
         user.is_superuser = True
         # user.save()
-        return
+    else:
+        # Reset in case role changed away from admin
+        user.is_superuser = False
 
-    # Reset in case role changed away from admin
-    user.is_superuser = False
-    
-    
-    perms_for_role = role_perms.get(user.role, {})
-
-
-    for action, models in perms_for_role.items():
-        for model in models:
-            content_type = ContentType.objects.get_for_model(model)
-            codename = f"{action}_{model._meta.model_name}"
-            try:
-                permission = Permission.objects.get(codename=codename, content_type=content_type)
-                user.user_permissions.add(permission)
-            except Permission.DoesNotExist:
-                # You may log this
-                pass
-    # user.save()   
\ No newline at end of file
+    apply_role_permissions([user.pk], user.role)
+    # user.save()
@@ -8,9 +8,11 @@ from django.views.decorators.csrf import ensure_csrf_cookie
 from .serializers import *
 from .permissions import *
 from .tasks import *
+from .dispatch import dispatch_task
 from .models import CustomUser
 from .tokens import *
 from .filters import UserFilter
+from trznice.pagination import CreateTimeCursorPagination
 
 from rest_framework import generics, permissions, status, viewsets
 from rest_framework.response import Response
@@ -86,26 +88,7 @@ class CookieTokenObtainPairView(TokenObtainPairView):
         )
 
         return response
-    
-    def validate(self, attrs):
-        username = attrs.get("username")
-        password = attrs.get("password")
-
-        # Přihlaš uživatele ručně
-        user = authenticate(request=self.context.get('request'), username=username, password=password)
-
-        if not user:
-            raise AuthenticationFailed("Špatné uživatelské jméno nebo heslo.")
-
-        if not user.is_active:
-            raise AuthenticationFailed("Uživatel je deaktivován.")
-
-        # Nastav validní uživatele (přebere další logiku ze SimpleJWT)
-        self.user = user
 
-        # Vrátí access a refresh token jako obvykle
-        return super().validate(attrs)
-    
 @extend_schema(
     tags=["api"],
     summary="Refresh JWT token using cookie",
@@ -191,6 +174,7 @@ class UserView(viewsets.ModelViewSet):
     serializer_class = CustomUserSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = UserFilter
+    pagination_class = CreateTimeCursorPagination
 
     # Require authentication and role permission
     permission_classes = [IsAuthenticated]
@@ -278,11 +262,7 @@ class UserRegistrationViewSet(ModelViewSet):
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
 
-        try:
-            send_email_verification_task.delay(user.id) # posílaní emailu pro potvrzení registrace - CELERY TASK
-        except Exception as e:
-            logger.error(f"Celery not available, using fallback. Error: {e}")
-            send_email_verification_task(user.id) # posílaní emailu pro potvrzení registrace
+        dispatch_task(send_email_verification_task, user.id) # posílaní emailu pro potvrzení registrace - CELERY TASK
 
 
             
@@ -335,11 +315,7 @@ class UserActivationViewSet(APIView):
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
 
-        try:
-            send_email_clerk_accepted_task.delay(user.id) # posílaní emailu pro informování uživatele o dokončení registrace, uředník doplnil variabilní symbol - CELERY TASK
-        except Exception as e:
-            logger.error(f"Celery not available, using fallback. Error: {e}")
-            send_email_clerk_accepted_task(user.id) # posílaní emailu pro informování uživatele o dokončení registrace, uředník doplnil variabilní symbol
+        dispatch_task(send_email_clerk_accepted_task, user.id) # posílaní emailu pro informování uživatele o dokončení registrace, uředník doplnil variabilní symbol - CELERY TASK
 
         return Response(serializer.to_representation(user), status=status.HTTP_200_OK)
 
@@ -365,11 +341,7 @@ class PasswordResetRequestView(APIView):
             except User.DoesNotExist:
                 # Always return 200 even if user doesn't exist to avoid user enumeration
                 return Response({"detail": "E-mail s odkazem byl odeslán."})
-            try:
-                send_password_reset_email_task.delay(user.id) # posílaní emailu pro obnovení hesla - CELERY TASK
-            except Exception as e:
-                logger.error(f"Celery not available, using fallback. Error: {e}")
-                send_password_reset_email_task(user.id) # posílaní emailu pro obnovení hesla registrace
+            dispatch_task(send_password_reset_email_task, user.id) # posílaní emailu pro obnovení hesla - CELERY TASK
 
             return Response({"detail": "E-mail s odkazem byl odeslán."})
         
@@ -0,0 +1,40 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .models import Event
+from .realtime import event_group_name
+
+
+class EventAvailabilityConsumer(AsyncJsonWebsocketConsumer):
+    """
+    WebSocket jedné akce: ws/booking/events/<event_id>/availability/
+    Posílá pouze delty obsazenosti (viz booking/realtime.py), zprávy od klienta ignoruje.
+    """
+
+    async def connect(self):
+        self.event_id = self.scope["url_route"]["kwargs"]["event_id"]
+        if not await self._event_exists():
+            await self.close(code=4404)
+            return
+
+        self.group_name = event_group_name(self.event_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        pass
+
+    async def availability_delta(self, message):
+        await self.send_json({
+            "type": "availability.delta",
+            "event_id": message["event_id"],
+            "changes": message["changes"],
+        })
+
+    @database_sync_to_async
+    def _event_exists(self):
+        return Event.objects.filter(pk=self.event_id).exists()
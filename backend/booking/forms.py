@@ -1,6 +1,6 @@
 from django import forms
 from django.core.exceptions import ValidationError
-from .models import Reservation
+from .models import Reservation, RESERVATION_OVERLAP_MESSAGE
 
 class ReservationAdminForm(forms.ModelForm):
     class Meta:
@@ -18,4 +18,18 @@ class ReservationAdminForm(forms.ModelForm):
                 product_names = ', '.join(str(p) for p in invalid_products)
                 raise ValidationError(f"Některé produkty nepatří k této akci: {product_names}")
 
+        # Model kontroluje překryv až při uložení, v adminu chceme chybu zobrazit ve formuláři
+        market_slot = cleaned_data.get('market_slot')
+        reserved_from = cleaned_data.get('reserved_from')
+        reserved_to = cleaned_data.get('reserved_to')
+        if market_slot and reserved_from and reserved_to and cleaned_data.get('status') == "reserved":
+            overlapping = Reservation.objects.exclude(id=self.instance.id).filter(
+                market_slot=market_slot,
+                status="reserved",
+                reserved_from__lt=reserved_to,
+                reserved_to__gt=reserved_from,
+            )
+            if overlapping.exists():
+                raise ValidationError(RESERVATION_OVERLAP_MESSAGE)
+
         return cleaned_data
@@ -0,0 +1,165 @@
+"""
+Krátkodobé držení (hold) prodejního místa během checkoutu.
+
+Mezi výběrem místa a vytvořením rezervace / objednávky si uživatel místo na daný
+termín podrží v cache (Redis v produkci, LocMem ve vývoji). Pro každé prodejní místo
+je v cache jeden záznam {token: hold}, změny se dělají pod krátkým zámkem přes
+`cache.add` (atomické i v Redisu). Konkurenční uživatel tak dostane chybu okamžitě
+a levně, bez průchodu celou validací ReservationSerializer.
+
+Termíny mají stejnou sémantiku jako index obsazenosti (booking/occupancy.py):
+`a.from < b.to and a.to > b.from`.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+
+from .occupancy import find_overlap, get_slot_intervals, merge_intervals
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+HOLD_TIMEOUT = 60 * 10  # 10 minut na dokončení checkoutu
+HOLD_CACHE_KEY = "booking:hold:slot:{}"
+HOLD_LOCK_KEY = "booking:hold:lock:{}"
+HOLD_LOCK_TIMEOUT = 5
+HOLD_LOCK_ATTEMPTS = 3
+
+
+class HoldConflict(Exception):
+    """Místo je v daném termínu rezervované nebo ho drží jiný uživatel."""
+
+
+def _overlaps(hold, start, end):
+    return hold["reserved_from"] < end and hold["reserved_to"] > start
+
+
+def _active(holds):
+    now = time.time()
+    return {token: hold for token, hold in (holds or {}).items() if hold["expires"] > now}
+
+
+@contextmanager
+def _slot_lock(market_slot_id):
+    key = HOLD_LOCK_KEY.format(market_slot_id)
+    for attempt in range(HOLD_LOCK_ATTEMPTS):
+        if cache.add(key, 1, HOLD_LOCK_TIMEOUT):
+            break
+        time.sleep(0.01 * (attempt + 1))
+    else:
+        raise HoldConflict("Prodejní místo právě rezervuje jiný uživatel, zkuste to znovu.")
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
+def _store(market_slot_id, holds):
+    key = HOLD_CACHE_KEY.format(market_slot_id)
+    if not holds:
+        cache.delete(key)
+        return
+    timeout = max(hold["expires"] for hold in holds.values()) - time.time()
+    cache.set(key, holds, max(int(timeout) + 1, 1))
+
+
+def hold_slot_id(token):
+    """Token má tvar `<market_slot_id>-<uuid>`, vrací ID místa nebo None."""
+    slot_id, _, _ = str(token).partition("-")
+    return int(slot_id) if slot_id.isdigit() else None
+
+
+def hold_expires_at(hold):
+    return datetime.fromtimestamp(hold["expires"], tz=dt_timezone.utc)
+
+
+def get_slot_holds(market_slot_id):
+    """Platné holdy prodejního místa jako {token: hold}."""
+    return _active(cache.get(HOLD_CACHE_KEY.format(market_slot_id)))
+
+
+def get_many_slot_holds(market_slot_ids):
+    """Hromadná varianta get_slot_holds, jedno volání cache pro všechna místa."""
+    keys = {HOLD_CACHE_KEY.format(slot_id): slot_id for slot_id in market_slot_ids}
+    cached = cache.get_many(list(keys))
+    return {keys[key]: _active(holds) for key, holds in cached.items()}
+
+
+def get_hold(token):
+    market_slot_id = hold_slot_id(token)
+    if market_slot_id is None:
+        return None
+    return get_slot_holds(market_slot_id).get(token)
+
+
+def held_intervals(holds, exclude_user_id=None):
+    """Sloučené intervaly holdů, holdy uživatele `exclude_user_id` se nepočítají (svoje místo vidí jako volné)."""
+    return merge_intervals(
+        (hold["reserved_from"], hold["reserved_to"])
+        for hold in holds.values()
+        if exclude_user_id is None or hold["user_id"] != exclude_user_id
+    )
+
+
+def acquire_hold(market_slot_id, reserved_from, reserved_to, user_id, timeout=HOLD_TIMEOUT):
+    """
+    Podrží místo na termín <reserved_from, reserved_to) pro uživatele.
+    Překrývající se holdy stejného uživatele nahradí (změna termínu v checkoutu).
+
+    Raises:
+        HoldConflict: místo je v termínu rezervované nebo ho drží někdo jiný
+    """
+    # Levná kontrola nad indexem obsazenosti ještě před zámkem
+    if find_overlap(get_slot_intervals(market_slot_id), reserved_from, reserved_to):
+        raise HoldConflict("Tento slot je v daném termínu již rezervován.")
+
+    with _slot_lock(market_slot_id):
+        holds = get_slot_holds(market_slot_id)
+        for token, hold in list(holds.items()):
+            if not _overlaps(hold, reserved_from, reserved_to):
+                continue
+            if hold["user_id"] != user_id:
+                raise HoldConflict("Tento slot v daném termínu právě rezervuje jiný uživatel.")
+            del holds[token]
+
+        token = f"{market_slot_id}-{uuid.uuid4().hex}"
+        hold = {
+            "token": token,
+            "market_slot_id": market_slot_id,
+            "reserved_from": reserved_from,
+            "reserved_to": reserved_to,
+            "user_id": user_id,
+            "expires": time.time() + timeout,
+        }
+        holds[token] = hold
+        _store(market_slot_id, holds)
+
+    logger.debug(f"Hold {token} acquired for user {user_id}")
+    return hold
+
+
+def release_hold(token, user_id=None):
+    """Uvolní hold, s `user_id` jen pokud patří danému uživateli. Vrací True, pokud byl hold smazán."""
+    market_slot_id = hold_slot_id(token)
+    if market_slot_id is None:
+        return False
+
+    with _slot_lock(market_slot_id):
+        holds = get_slot_holds(market_slot_id)
+        hold = holds.get(token)
+        if hold is None or (user_id is not None and hold["user_id"] != user_id):
+            return False
+        del holds[token]
+        _store(market_slot_id, holds)
+    return True
+
+
+def check_slot_hold(market_slot_id, reserved_from, reserved_to, user_id):
+    """Vyhodí HoldConflict, pokud termín drží jiný uživatel (bez zámku, jen čtení)."""
+    for hold in get_slot_holds(market_slot_id).values():
+        if hold["user_id"] != user_id and _overlaps(hold, reserved_from, reserved_to):
+            raise HoldConflict("Tento slot v daném termínu právě rezervuje jiný uživatel.")
@@ -0,0 +1,123 @@
+"""
+Rozložení prodejních míst (MarketSlot): import z JSON nebo CSV a kontrola kolizí na mřížce náměstí.
+
+Očekávané sloupce / klíče: x, y, width, height, base_size, price
+(volitelně available_extension a status). `price` je cena za m², 0 nebo prázdná
+hodnota znamená výchozí cenu akce.
+"""
+import csv
+import io
+import json
+
+import numpy as np
+
+LAYOUT_FIELDS = ["x", "y", "width", "height", "base_size", "price", "available_extension", "status"]
+
+
+def parse_layout_csv(text):
+    """Převede CSV s hlavičkou na list slovníků, prázdné buňky vynechá."""
+    reader = csv.DictReader(io.StringIO(text))
+    rows = []
+    for row in reader:
+        rows.append({
+            key.strip(): value.strip()
+            for key, value in row.items()
+            if key and key.strip() in LAYOUT_FIELDS and value is not None and value.strip() != ""
+        })
+    return rows
+
+
+def parse_layout_json(text):
+    """JSON může být přímo pole míst, nebo objekt s klíčem `slots`."""
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("slots", [])
+    return data
+
+
+def parse_layout(text, fmt):
+    if fmt == "csv":
+        return parse_layout_csv(text)
+    return parse_layout_json(text)
+
+
+#------------------------------- KOLIZE MÍST -------------------------------
+# x, width jsou sloupce mřížky náměstí (grid_cols), y, height jsou řádky (grid_rows).
+# Dvě místa se překrývají stejně jako ve frontendu (DynamicGrid.jsx):
+# a.x < b.x + b.w and a.x + a.w > b.x and a.y < b.y + b.h and a.y + a.h > b.y
+
+
+def find_out_of_bounds(rects, grid_rows, grid_cols):
+    """Vrátí klíče míst, která přesahují mřížku náměstí. `rects` je list (key, x, y, w, h)."""
+    if not rects:
+        return []
+    keys = [rect[0] for rect in rects]
+    x, y, w, h = np.array([rect[1:] for rect in rects], dtype=np.int64).T
+    outside = (x < 0) | (y < 0) | (x + w > grid_cols) | (y + h > grid_rows)
+    return [keys[i] for i in np.flatnonzero(outside)]
+
+
+def _has_overlap_raster(rects, grid_rows, grid_cols):
+    """
+    Rychlá kontrola přes NumPy raster: 2D rozdílové pole + kumulativní součty dají
+    pokrytí každé buňky mřížky. Pokud žádná buňka není pokrytá víckrát, kolize neexistují.
+    """
+    x, y, w, h = np.array([rect[1:] for rect in rects], dtype=np.int64).T
+    x0 = np.clip(x, 0, grid_cols)
+    y0 = np.clip(y, 0, grid_rows)
+    x1 = np.clip(x + w, 0, grid_cols)
+    y1 = np.clip(y + h, 0, grid_rows)
+
+    diff = np.zeros((grid_rows + 1, grid_cols + 1), dtype=np.int32)
+    np.add.at(diff, (y0, x0), 1)
+    np.add.at(diff, (y0, x1), -1)
+    np.add.at(diff, (y1, x0), -1)
+    np.add.at(diff, (y1, x1), 1)
+    coverage = diff.cumsum(axis=0).cumsum(axis=1)
+    return coverage.max() > 1
+
+
+def _overlapping_pairs_sweep(rects):
+    """Sweep podle osy x: porovnává se jen s místy, jejichž x-rozsah je ještě otevřený."""
+    pairs = []
+    active = []
+    for key, x, y, w, h in sorted(rects, key=lambda rect: rect[1]):
+        active = [other for other in active if other[1] + other[3] > x]
+        for other_key, ox, oy, ow, oh in active:
+            if oy < y + h and oy + oh > y:
+                pairs.append((other_key, key))
+        active.append((key, x, y, w, h))
+    return pairs
+
+
+def find_layout_conflicts(rects, grid_rows, grid_cols):
+    """
+    Zkontroluje celé rozložení akce.
+
+    Args:
+        rects (list[tuple]): (key, x, y, width, height) pro každé místo, key slouží jen k identifikaci v chybách
+        grid_rows (int), grid_cols (int): rozměry mřížky náměstí
+
+    Returns:
+        (out_of_bounds, pairs): klíče míst mimo mřížku a všechny dvojice klíčů překrývajících se míst
+    """
+    rects = [rect for rect in rects if rect[3] > 0 and rect[4] > 0]
+    if not rects:
+        return [], []
+
+    out_of_bounds = find_out_of_bounds(rects, grid_rows, grid_cols)
+    # Raster zachytí kolize jen uvnitř mřížky, místa mimo ni projdou sweepem vždy
+    if not out_of_bounds and not _has_overlap_raster(rects, grid_rows, grid_cols):
+        return [], []
+    return out_of_bounds, _overlapping_pairs_sweep(rects)
+
+
+def find_slot_conflicts(rect, others):
+    """Klíče míst z `others`, se kterými se místo `rect` překrývá (vektorově přes NumPy)."""
+    if not others:
+        return []
+    _, x, y, w, h = rect
+    keys = [other[0] for other in others]
+    ox, oy, ow, oh = np.array([other[1:] for other in others], dtype=np.int64).T
+    hits = (ox < x + w) & (ox + ow > x) & (oy < y + h) & (oy + oh > y)
+    return [keys[i] for i in np.flatnonzero(hits)]
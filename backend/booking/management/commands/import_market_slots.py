@@ -0,0 +1,34 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from booking.layout import parse_layout
+from booking.serializers import MarketSlotLayoutSerializer
+
+
+class Command(BaseCommand):
+    help = "Hromadně naimportuje rozložení prodejních míst pro akci z JSON nebo CSV souboru (x, y, width, height, base_size, price)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("event_id", type=int, help="ID akce (Event)")
+        parser.add_argument("path", type=str, help="Cesta k souboru .json nebo .csv")
+        parser.add_argument("--format", choices=["json", "csv"], help="Formát souboru, jinak podle přípony")
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.exists():
+            raise CommandError(f"Soubor {path} neexistuje.")
+
+        fmt = options["format"] or ("csv" if path.suffix.lower() == ".csv" else "json")
+        slots = parse_layout(path.read_text(encoding="utf-8-sig"), fmt)
+
+        serializer = MarketSlotLayoutSerializer(data={"event": options["event_id"], "slots": slots})
+        if not serializer.is_valid():
+            raise CommandError(f"Neplatné rozložení: {serializer.errors}")
+
+        try:
+            created = serializer.save()
+        except ValidationError as e:
+            raise CommandError(f"Neplatné rozložení: {e.detail}")
+        self.stdout.write(self.style.SUCCESS(f"✅ Vytvořeno {len(created)} prodejních míst pro akci {options['event_id']}."))
@@ -52,4 +52,31 @@ class Command(BaseCommand):
             description="Mazání všech záznamů označených jako smazané v databázi.\nJako vstupní argument lze zadat počet let nebo dnů, podle kterého se určí, jak staré záznamy budou trvale odstraněny."
         )
 
+        crontab_drain_outbox, _ = CrontabSchedule.objects.get_or_create(
+            minute='*',
+            hour='*',
+            day_of_week='*',
+            day_of_month='*',
+            month_of_year='*',
+            timezone=timezone.get_current_timezone_name(),
+        )
+
+        PeriodicTask.objects.get_or_create(
+            name='Odeslání e-mailů z fronty',
+            task='account.tasks.drain_email_outbox_task',
+            crontab=crontab_drain_outbox,
+            args=json.dumps([]),
+            kwargs=json.dumps({}),
+            description="Odešle e-maily čekající ve frontě (EmailOutbox) a zopakuje neúspěšné, jejichž backoff už vypršel."
+        )
+
+        PeriodicTask.objects.get_or_create(
+            name='Odeslání odložených tasků',
+            task='account.tasks.drain_deferred_tasks_task',
+            crontab=crontab_drain_outbox,
+            args=json.dumps([]),
+            kwargs=json.dumps({}),
+            description="Znovu odešle Celery tasky uložené během výpadku brokeru (DeferredTask)."
+        )
+
         self.stdout.write(self.style.SUCCESS("✅ Celery Beat tasks have been seeded."))
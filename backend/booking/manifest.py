@@ -0,0 +1,171 @@
+"""
+Denní manifest akce pro kontrolory: kdo má kde dnes stát a zda je objednávka zaplacená.
+
+Pro každou akci je v cache jeden manifest se všemi aktivními rezervacemi
+(číslo místa, rezervace, prodejce, zaplaceno, poslední kontrola, termín). Sestaví se
+jedním dotazem při prvním čtení, změny rezervací / objednávek / kontrol ho pak
+aktualizují inkrementálně (`mark_reservations_changed`, po commitu, jeden dotaz na dávku).
+
+Každý záznam nese verzi poslední změny, zrušené rezervace zůstávají jako náhrobky
+(`removed`). Klient si tak s `?since=<version>` stáhne jen rozdíl. Pokud je `since`
+starší než sestavení manifestu (`base`), vrátí se celý manifest (`full: true`).
+
+Den se filtruje až při čtení, rezervace platí pro `reserved_from <= den <= reserved_to`
+(stejně jako počet účtovaných dní v booking/pricing.py).
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_CACHE_KEY = "booking:manifest:event:{}"
+MANIFEST_LOCK_KEY = "booking:manifest:lock:{}"
+MANIFEST_DIRTY_KEY = "booking:manifest:dirty:{}"
+MANIFEST_CACHE_TIMEOUT = 60 * 60 * 24
+MANIFEST_LOCK_TIMEOUT = 5
+
+_ROW_FIELDS = (
+    "id", "event_id", "status", "is_deleted", "reserved_from", "reserved_to", "last_checked_at",
+    "market_slot__number", "user__first_name", "user__last_name", "order__status", "order__is_deleted",
+)
+
+
+def _now_version(previous=0):
+    # čas v ms, vždy rostoucí v rámci manifestu
+    return max(int(time.time() * 1000), previous + 1)
+
+
+def _rows(queryset):
+    return queryset.values(*_ROW_FIELDS)
+
+
+def _entry(row, version):
+    return {
+        "slot": row["market_slot__number"],
+        "reservation": row["id"],
+        "seller": f"{row['user__first_name'] or ''} {row['user__last_name'] or ''}".strip(),
+        "paid": row["order__status"] == "payed" and not row["order__is_deleted"],
+        "last_checked_at": row["last_checked_at"],
+        "from": row["reserved_from"],
+        "to": row["reserved_to"],
+        "v": version,
+    }
+
+
+def _is_active(row):
+    return row["status"] == "reserved" and not row["is_deleted"]
+
+
+def build_manifest(event_id):
+    """Sestaví manifest akce jedním dotazem a uloží ho do cache."""
+    from .models import Reservation
+
+    cache.delete(MANIFEST_DIRTY_KEY.format(event_id))
+    version = _now_version()
+    rows = _rows(Reservation.objects.filter(event_id=event_id, status="reserved"))
+    manifest = {
+        "base": version,
+        "version": version,
+        "entries": {row["id"]: _entry(row, version) for row in rows},
+        "removed": {},
+    }
+    _store(event_id, manifest)
+    return manifest
+
+
+def _store(event_id, manifest):
+    """
+    Uloží manifest a pak zkontroluje značku `dirty`: pokud mezitím přišla změna, kterou tento
+    zápis nezahrnuje (souběžná aktualizace bez zámku, změna během sestavení), manifest se zahodí
+    a při dalším čtení sestaví znovu. Kontrola až po zápisu pokryje i značku nastavenou těsně před ním.
+    """
+    key = MANIFEST_CACHE_KEY.format(event_id)
+    cache.set(key, manifest, MANIFEST_CACHE_TIMEOUT)
+    if cache.get(MANIFEST_DIRTY_KEY.format(event_id)):
+        cache.delete(key)
+
+
+def _mark_dirty(event_id):
+    cache.set(MANIFEST_DIRTY_KEY.format(event_id), 1, MANIFEST_LOCK_TIMEOUT * 2)
+    cache.delete(MANIFEST_CACHE_KEY.format(event_id))
+
+
+def get_manifest(event_id):
+    return cache.get(MANIFEST_CACHE_KEY.format(event_id)) or build_manifest(event_id)
+
+
+def _apply_changes(reservation_ids):
+    from .models import Reservation
+
+    # natvrdo smazané rezervace se nenajdou, skartují se ale jen už soft-smazané (v manifestu jsou jako náhrobky)
+    rows_by_event = {}
+    for row in _rows(Reservation.all_objects.filter(pk__in=reservation_ids)):
+        rows_by_event.setdefault(row["event_id"], []).append(row)
+
+    for event_id, rows in rows_by_event.items():
+        key = MANIFEST_CACHE_KEY.format(event_id)
+        lock_key = MANIFEST_LOCK_KEY.format(event_id)
+        if not cache.add(lock_key, 1, MANIFEST_LOCK_TIMEOUT):
+            # souběžná aktualizace: držitel zámku tuto změnu nezná, značka ho donutí manifest zahodit
+            # (nová base → klienti dostanou celý)
+            _mark_dirty(event_id)
+            continue
+        try:
+            cache.delete(MANIFEST_DIRTY_KEY.format(event_id))
+            manifest = cache.get(key)
+            if manifest is None:
+                # případné souběžné sestavení mohlo změnu přečíst ještě před commitem
+                _mark_dirty(event_id)
+                continue
+            version = _now_version(manifest["version"])
+            for row in rows:
+                if _is_active(row):
+                    manifest["entries"][row["id"]] = _entry(row, version)
+                    manifest["removed"].pop(row["id"], None)
+                elif manifest["entries"].pop(row["id"], None) is not None:
+                    manifest["removed"][row["id"]] = version
+            manifest["version"] = version
+            _store(event_id, manifest)
+        finally:
+            cache.delete(lock_key)
+
+
+def mark_reservations_changed(*reservation_ids):
+    """Po commitu přepočítá záznamy daných rezervací ve všech manifestech v cache."""
+    reservation_ids = {reservation_id for reservation_id in reservation_ids if reservation_id}
+    if reservation_ids:
+        transaction.on_commit(lambda: _apply_changes(reservation_ids))
+
+
+def manifest_for_day(event_id, day, since=None):
+    """
+    Manifest pro jeden den. S `since` jen změny od dané verze: upravené záznamy v `entries`,
+    ID rezervací, které v daném dni už nejsou (zrušené, přesunuté), v `removed`.
+    """
+    manifest = get_manifest(event_id)
+    full = since is None or since < manifest["base"]
+
+    entries, removed = [], []
+    for entry in manifest["entries"].values():
+        if not full and entry["v"] <= since:
+            continue
+        if entry["from"] <= day <= entry["to"]:
+            entries.append({key: entry[key] for key in ("slot", "reservation", "seller", "paid", "last_checked_at")})
+        elif not full:
+            removed.append(entry["reservation"])
+    if not full:
+        removed += [reservation_id for reservation_id, version in manifest["removed"].items() if version > since]
+
+    entries.sort(key=lambda entry: (entry["slot"] is None, entry["slot"]))
+    return {
+        "event": event_id,
+        "date": day,
+        "version": manifest["version"],
+        "full": full,
+        "entries": entries,
+        "removed": sorted(removed),
+    }
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+CONSTRAINT_NAME = "booking_reservation_no_overlap"
+
+
+def add_overlap_constraint(apps, schema_editor):
+    # Exclusion constraint umí jen PostgreSQL, SQLite používá zamčený fallback v Reservation.save()
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    schema_editor.execute(
+        f"ALTER TABLE booking_reservation ADD CONSTRAINT {CONSTRAINT_NAME} "
+        "EXCLUDE USING gist ("
+        "market_slot_id WITH =, "
+        "daterange(reserved_from, reserved_to, '[)') WITH &&"
+        ") WHERE (status = 'reserved' AND NOT is_deleted)"
+    )
+
+
+def remove_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute(f"ALTER TABLE booking_reservation DROP CONSTRAINT IF EXISTS {CONSTRAINT_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_overlap_constraint, remove_overlap_constraint),
+    ]
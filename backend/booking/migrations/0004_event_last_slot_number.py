@@ -0,0 +1,28 @@
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def init_last_slot_number(apps, schema_editor):
+    Event = apps.get_model('booking', 'Event')
+    MarketSlot = apps.get_model('booking', 'MarketSlot')
+
+    # počítá i se soft-smazanými místy, aby se čísla neopakovala
+    max_numbers = MarketSlot._base_manager.values('event_id').annotate(max_number=Max('number'))
+    for row in max_numbers:
+        Event._base_manager.filter(pk=row['event_id']).update(last_slot_number=row['max_number'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0003_reservation_no_overlap_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='last_slot_number',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Poslední přidělené číslo prodejního místa na této akci'),
+        ),
+        migrations.RunPython(init_last_slot_number, migrations.RunPython.noop),
+    ]
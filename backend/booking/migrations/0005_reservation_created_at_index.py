@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0004_event_last_slot_number'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reservation',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='reservationcheck',
+            name='checked_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0005_reservation_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservationcheck',
+            name='client_id',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='reservationcheck',
+            name='checked_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0006_reservationcheck_client_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='ticket_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,13 +1,20 @@
 from decimal import Decimal
-from django.db import models
+from django.db import models, transaction, router, connections, IntegrityError
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.conf import settings
-from django.db.models import Max
+from django.db.models import Case, F, Q, Value, When
 from django.utils import timezone
 
 from trznice.models import SoftDeleteModel
 from trznice.utils import truncate_to_minutes
+from .layout import find_layout_conflicts, find_out_of_bounds, find_slot_conflicts
+from .pricing import quote_price
+from trznice.cache import bump_catalogue_version
+from .occupancy import invalidate_slot_occupancy
+from .manifest import mark_reservations_changed
+from .realtime import broadcast_released
+from .tickets import invalidate_tickets, ticket_fields
 
 
 #náměstí
@@ -64,9 +71,8 @@ class Square(SoftDeleteModel):
         return self.name
     
     def delete(self, *args, **kwargs):
-        for event in self.square_events.all():
-            event.delete()  # ✅ This triggers Event.delete()
-        super().delete(*args, **kwargs)
+        # Akce, místa, rezervace i objednávky hromadně (trznice.models.soft_delete_cascade)
+        return self.cascade_delete()
 
 
 class Event(SoftDeleteModel):
@@ -89,6 +95,8 @@ class Event(SoftDeleteModel):
     
     image = models.ImageField(upload_to="squares-imgs/", blank=True, null=True)
 
+    last_slot_number = models.PositiveIntegerField(default=0, editable=False, help_text="Poslední přidělené číslo prodejního místa na této akci")
+
 
     def clean(self):
         if not (self.start and self.end):
@@ -110,19 +118,32 @@ class Event(SoftDeleteModel):
 
     def save(self, *args, **kwargs):
         self.full_clean()
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            # čítač čísel míst posouvá jen reserve_slot_numbers (UPDATE v DB), instance načtená
+            # před souběžným importem by ho jinak přepsala starou hodnotou
+            kwargs["update_fields"] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname != "last_slot_number"
+            ]
         super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
+
+    def reserve_slot_numbers(self, count=1):
+        """
+        Atomicky posune čítač prodejních míst akce o `count` a vrátí přidělená čísla.
+        UPDATE zamkne řádek akce až do konce transakce, souběžné vkládání tak nedostane stejná čísla.
+        """
+        with transaction.atomic():
+            Event.all_objects.filter(pk=self.pk).update(last_slot_number=F("last_slot_number") + count)
+            last = Event.all_objects.filter(pk=self.pk).values_list("last_slot_number", flat=True).get()
+        self.last_slot_number = last
+        return range(last - count + 1, last + 1)
     
     def delete(self, *args, **kwargs):
-        for market_slot in self.event_marketSlots.all():
-            market_slot.delete()
-        # self.event_marketSlots.all().update(is_deleted=True, deleted_at=timezone.now())
-        # self.event_reservations.all().update(is_deleted=True, deleted_at=timezone.now())
-        self.event_products.all().update(is_deleted=True, deleted_at=timezone.now())
-
-        return super().delete(*args, **kwargs)
+        # Místa, rezervace, objednávky i zboží akce hromadně (trznice.models.soft_delete_cascade)
+        return self.cascade_delete()
 
 
 class MarketSlot(SoftDeleteModel):
@@ -155,8 +176,32 @@ class MarketSlot(SoftDeleteModel):
     def clean(self):
         if self.base_size <= 0:
             raise ValidationError("Základní velikost prodejního místa musí být větší než nula.")
+
+        self.validate_layout()
         
         return super().clean()
+
+    def validate_layout(self):
+        """Místo se musí vejít do mřížky náměstí a nesmí se překrývat s jiným místem téže akce."""
+        if not self.event_id or self.width <= 0 or self.height <= 0:
+            return
+        # bulk_create_layout kontroluje kolize celého rozložení najednou
+        if getattr(self, "_skip_layout_validation", False):
+            return
+
+        square = self.event.square
+        rect = (self.number, self.x, self.y, self.width, self.height)
+        if find_out_of_bounds([rect], square.grid_rows, square.grid_cols):
+            raise ValidationError(f"Prodejní místo přesahuje mřížku náměstí ({square.grid_cols} × {square.grid_rows}).")
+
+        others = list(
+            MarketSlot.objects.filter(event_id=self.event_id).exclude(pk=self.pk)
+            .values_list("number", "x", "y", "width", "height")
+        )
+        conflicts = find_slot_conflicts(rect, others)
+        if conflicts:
+            numbers = ", ".join(str(number) for number in sorted(conflicts))
+            raise ValidationError(f"Prodejní místo se překrývá s místy č. {numbers}.")
     
     def save(self, *args, **kwargs):
         self.full_clean()
@@ -167,23 +212,81 @@ class MarketSlot(SoftDeleteModel):
             self.price_per_m2 = self.event.price_per_m2
 
         # Automatically assign next available number within the same event
-        if self._state.adding:
-            max_number = MarketSlot.objects.filter(event=self.event).aggregate(Max('number'))['number__max'] or 0
-            self.number = max_number + 1
+        with transaction.atomic():
+            if self._state.adding:
+                self.number = self.event.reserve_slot_numbers(1)[0]
 
-        super().save(*args, **kwargs)
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Prodejní místo {self.number} na {self.event}"
+
+    @classmethod
+    def bulk_create_layout(cls, event, slots):
+        """
+        Hromadně vytvoří prodejní místa pro akci.
+        Všechna místa se nejdřív zvalidují (bez dotazů do DB), čísla se přidělí z čítače akce
+        najednou a vše se vloží jedním bulk_create v jedné transakci.
+
+        Args:
+            event (Event): akce, ke které místa patří
+            slots (list[dict]): pole se stejnými klíči jako model (x, y, width, height, base_size, ...)
+
+        Raises:
+            ValidationError: dict {index_mista: chyby} pro všechna nevalidní místa,
+                nebo {"layout": [...]} při přesahu mřížky či překryvu míst
+        """
+        instances = []
+        errors = {}
+        for index, data in enumerate(slots):
+            slot = cls(event=event, **data)
+            if not slot.price_per_m2:
+                slot.price_per_m2 = event.price_per_m2
+            slot._skip_layout_validation = True
+            try:
+                slot.full_clean(exclude=["event", "number"], validate_unique=False, validate_constraints=False)
+            except ValidationError as e:
+                errors[str(index)] = e.messages
+            instances.append(slot)
+
+        if errors:
+            raise ValidationError(errors)
+
+        # Kolize s existujícími místy akce i mezi sebou navzájem, hlásí se všechny dvojice
+        existing = [
+            (f"č. {number}", x, y, width, height)
+            for number, x, y, width, height in cls.objects.filter(event=event).values_list("number", "x", "y", "width", "height")
+        ]
+        new = [(f"nové #{index}", slot.x, slot.y, slot.width, slot.height) for index, slot in enumerate(instances)]
+        out_of_bounds, pairs = find_layout_conflicts(existing + new, event.square.grid_rows, event.square.grid_cols)
+
+        layout_errors = [f"Místo {key} přesahuje mřížku náměstí." for key in out_of_bounds if key.startswith("nové")]
+        layout_errors += [f"Místa {a} a {b} se překrývají." for a, b in pairs if a.startswith("nové") or b.startswith("nové")]
+        if layout_errors:
+            raise ValidationError({"layout": layout_errors})
+
+        with transaction.atomic():
+            numbers = event.reserve_slot_numbers(len(instances))
+            for slot, number in zip(instances, numbers):
+                slot.number = number
+            created = cls.objects.bulk_create(instances)
+            # bulk_create neposílá signály, cache katalogu se zneplatní ručně
+            bump_catalogue_version(cls)
+            return created
     
     def delete(self, *args, **kwargs):
+        # Rezervace a objednávky místa hromadně (trznice.models.soft_delete_cascade)
+        return self.cascade_delete()
+    
 
-        for reservation in self.reservations.all():
-            reservation.delete()
-        # self.marketslot_reservations.all().update(is_deleted=True, deleted_at=timezone.now())
 
-        return super().delete(*args, **kwargs)
-    
+RESERVATION_OVERLAP_CONSTRAINT = "booking_reservation_no_overlap"
+RESERVATION_OVERLAP_MESSAGE = "Rezervace se překrývá s jinou rezervací na stejném místě."
+
+
+def connection_has_overlap_constraint(using="default"):
+    # Exclusion constraint (migrace 0003) existuje jen na PostgreSQL
+    return connections[using].vendor == "postgresql"
 
 
 class Reservation(SoftDeleteModel):
@@ -205,7 +308,7 @@ class Reservation(SoftDeleteModel):
     used_extension = models.FloatField(default=0 ,help_text="Použité rozšíření (m2)", validators=[MinValueValidator(0.0)])
     reserved_from = models.DateField(null=False, blank=False)
     reserved_to = models.DateField(null=False, blank=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)  # cursor stránkování
 
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="reserved")
     note = models.TextField(blank=True, null=True)
@@ -241,42 +344,83 @@ class Reservation(SoftDeleteModel):
         related_name="reservations_checker"
     )
 
-    def update_check_status(self):
-        last_check = self.checks.filter(is_deleted=False).order_by("-checked_at").first()
-        if last_check:
-            self.is_checked = True
-            self.last_checked_at = last_check.checked_at
-            self.last_checked_by = last_check.checker
-        else:
-            self.is_checked = False
-            self.last_checked_at = None
-            self.last_checked_by = None
+    # QR vstupenka (booking/tickets.py) nese verzi, změna místa / termínu / uživatele starší vstupenky zneplatní
+    ticket_version = models.PositiveIntegerField(default=0, editable=False)
+
+    @classmethod
+    def record_check(cls, check):
+        """
+        Inkrementální aktualizace po nové kontrole: jeden podmíněný UPDATE,
+        přepíše se jen pokud je kontrola novější než dosud poslední.
+        """
+        updated = cls.all_objects.filter(pk=check.reservation_id).filter(
+            Q(last_checked_at__isnull=True) | Q(last_checked_at__lte=check.checked_at)
+        ).update(is_checked=True, last_checked_at=check.checked_at, last_checked_by_id=check.checker_id)
+
+        reservation = check._state.fields_cache.get("reservation")
+        if updated and reservation is not None:
+            reservation.is_checked = True
+            reservation.last_checked_at = check.checked_at
+            reservation.last_checked_by_id = check.checker_id
+        if updated:
+            mark_reservations_changed(check.reservation_id)
+        return bool(updated)
+
+    @classmethod
+    def record_checks(cls, checks):
+        """
+        Hromadná obdoba record_check: jeden UPDATE s CASE pro všechny dotčené rezervace,
+        každé se nastaví nejnovější z nových kontrol, pokud je novější než uložená.
+        """
+        newest = {}
+        for check in checks:
+            current = newest.get(check.reservation_id)
+            if current is None or check.checked_at > current.checked_at:
+                newest[check.reservation_id] = check
+        if not newest:
+            return 0
+
+        def newer(reservation_id, check):
+            return Q(pk=reservation_id) & (Q(last_checked_at__isnull=True) | Q(last_checked_at__lte=check.checked_at))
+
+        mark_reservations_changed(*newest)
+        return cls.all_objects.filter(pk__in=list(newest)).update(
+            is_checked=True,
+            last_checked_at=Case(
+                *[When(newer(rid, check), then=Value(check.checked_at)) for rid, check in newest.items()],
+                default=F("last_checked_at"),
+                output_field=cls._meta.get_field("last_checked_at"),
+            ),
+            last_checked_by_id=Case(
+                *[When(newer(rid, check), then=Value(check.checker_id)) for rid, check in newest.items()],
+                default=F("last_checked_by_id"),
+                output_field=cls._meta.get_field("last_checked_by").target_field,
+            ),
+        )
+
+    @classmethod
+    def recompute_check_status(cls, reservation_id):
+        """Přepočet po smazání / změně kontroly: poslední platná kontrola jedním dotazem, pak UPDATE."""
+        last_check = (
+            ReservationCheck.objects.filter(reservation_id=reservation_id)
+            .order_by("-checked_at")
+            .values("checked_at", "checker_id")
+            .first()
+        )
+        cls.all_objects.filter(pk=reservation_id).update(
+            is_checked=last_check is not None,
+            last_checked_at=last_check["checked_at"] if last_check else None,
+            last_checked_by_id=last_check["checker_id"] if last_check else None,
+        )
+        mark_reservations_changed(reservation_id)
 
     def calculate_price(self):
-        # Use market_slot width and height for area
         if not self.event or not self.event.square:
             raise ValidationError("Rezervace musí mít přiřazenou akci s náměstím.")
         if not self.market_slot:
             raise ValidationError("Rezervace musí mít přiřazené prodejní místo.")
 
-        area = self.market_slot.width * self.market_slot.height
-
-        price_per_m2 = None
-        if self.market_slot.price_per_m2 and self.market_slot.price_per_m2 > 0:
-            price_per_m2 = self.market_slot.price_per_m2
-        else:
-            price_per_m2 = self.event.price_per_m2
-
-        if not price_per_m2 or price_per_m2 < 0:
-            raise ValidationError("Cena za m² není dostupná nebo je záporná.")
-
-        # Calculate number of days
-        days = (self.reserved_to - self.reserved_from).days + 1
-
-        # Calculate final price using slot area and reserved days
-        final_price = Decimal(area) * Decimal(price_per_m2) * Decimal(days)
-        final_price = final_price.quantize(Decimal("0.01"))
-        return final_price
+        return quote_price(self.market_slot, self.reserved_from, self.reserved_to)
 
     def clean(self):
         if not self.reserved_from or not self.reserved_to:
@@ -288,20 +432,10 @@ class Reservation(SoftDeleteModel):
         if self.reserved_from == self.reserved_to:
             raise ValidationError("Začátek a konec rezervace nemohou být stejné.")
 
-        # Only check for overlapping reservations on the same market_slot
-        if self.market_slot:
-            overlapping = Reservation.objects.exclude(id=self.id).filter(
-                market_slot=self.market_slot,
-                status="reserved",
-                reserved_from__lt=self.reserved_to,
-                reserved_to__gt=self.reserved_from,
-            )
-        else:
+        # Překryv s jinými rezervacemi se kontroluje až v save() (constraint v DB, viz _check_overlap)
+        if not self.market_slot:
             raise ValidationError("Rezervace musí mít v sobě prodejní místo (MarketSlot).")
 
-        if overlapping.exists():
-            raise ValidationError("Rezervace se překrývá s jinou rezervací na stejném místě.")
-
         # Check event bounds (date only)
         if self.event:
             event_start = self.event.start
@@ -330,15 +464,86 @@ class Reservation(SoftDeleteModel):
         return super().clean()
 
 
+    def overlapping_reservations(self):
+        return Reservation.objects.exclude(id=self.id).filter(
+            market_slot_id=self.market_slot_id,
+            status="reserved",
+            reserved_from__lt=self.reserved_to,
+            reserved_to__gt=self.reserved_from,
+        )
+
+    def _check_overlap(self, using):
+        """
+        Fallback pro databáze bez exclusion constraintu (SQLite v developmentu).
+        Běží uvnitř transakce: na SQLite je díky transaction_mode=IMMEDIATE zamčený zápis,
+        na ostatních DB se zamkne řádek prodejního místa.
+        """
+        if connection_has_overlap_constraint(using):
+            return
+        if self.status != "reserved" or self.is_deleted or not self.market_slot_id:
+            return
+
+        list(MarketSlot.all_objects.using(using).select_for_update().filter(pk=self.market_slot_id).values_list("pk"))
+        if self.overlapping_reservations().using(using).exists():
+            raise ValidationError(RESERVATION_OVERLAP_MESSAGE)
+
+    def _bump_ticket_version(self, kwargs):
+        # _original_ticket nastavuje post_init v booking/signals.py
+        original = getattr(self, "_original_ticket", None)
+        if not self.pk or original is None or original[0] is None or original == ticket_fields(self):
+            return
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            if not {"market_slot", "market_slot_id", "reserved_from", "reserved_to", "user", "user_id"} & set(update_fields):
+                return
+            kwargs["update_fields"] = [*update_fields, "ticket_version"]
+        self.ticket_version += 1
+
     def save(self, *args, validate=True, **kwargs):
         if validate:
             self.full_clean()
-
-        super().save(*args, **kwargs)
+        self._bump_ticket_version(kwargs)
+
+        using = kwargs.get("using") or router.db_for_write(Reservation, instance=self)
+        with transaction.atomic(using=using):
+            self._check_overlap(using)
+            try:
+                with transaction.atomic(using=using):
+                    super().save(*args, **kwargs)
+            except IntegrityError as e:
+                if RESERVATION_OVERLAP_CONSTRAINT in str(e):
+                    raise ValidationError(RESERVATION_OVERLAP_MESSAGE)
+                raise
 
     def __str__(self):
         return f"Rezervace {self.user} na event {self.event.name}"
     
+    @classmethod
+    def soft_delete_cascade_hook(cls, queryset, deleted_at):
+        """Hromadná obdoba vedlejších efektů delete() pro soft_delete_cascade."""
+        slot_ids = list(queryset.exclude(market_slot=None).values_list("market_slot_id", flat=True).distinct())
+        # uvolněné termíny pro realtime delty, načtené před změnou stavu
+        released = list(
+            queryset.filter(status="reserved")
+            .values_list("event_id", "market_slot_id", "reserved_from", "reserved_to")
+        )
+
+        # Order.delete() ruší rezervaci
+        queryset.filter(order__isnull=False, order__is_deleted=False).update(status="cancelled")
+
+        # zablokovaná místa akcí, které ještě neskončily, se uvolní
+        unblocked = MarketSlot.all_objects.filter(pk__in=slot_ids, status="blocked", event__end__gt=timezone.now().date())
+        unblocked_slots = list(unblocked.values_list("event_id", "pk", "event__start", "event__end"))
+        if unblocked_slots:
+            MarketSlot.all_objects.filter(pk__in=[row[1] for row in unblocked_slots]).update(status="allowed")
+            bump_catalogue_version(MarketSlot)
+
+        # update() obchází signály, index obsazenosti, manifesty i realtime delty je nutné řešit ručně
+        invalidate_slot_occupancy(*slot_ids)
+        mark_reservations_changed(*queryset.values_list("pk", flat=True))
+        invalidate_tickets()
+        broadcast_released(released, unblocked_slots)
+
     def delete(self, *args, **kwargs):
         order = getattr(self, "order", None)
         if order is not None:
@@ -369,27 +574,37 @@ class ReservationCheck(SoftDeleteModel):
         null=True,
         related_name="performed_checks"
     )
-    checked_at = models.DateTimeField(auto_now_add=True)
+    # default místo auto_now_add, offline kontroly (sync) nesou čas z klienta
+    checked_at = models.DateTimeField(default=timezone.now, db_index=True)  # cursor stránkování
+    # idempotenční ID kontroly z offline fronty klienta, opakované odeslání se nezapíše dvakrát
+    client_id = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+
+    def _loaded_related(self, name):
+        # vazba načtená už při validaci v serializeru (bez dalšího dotazu), jinak None
+        return self._state.fields_cache.get(name)
 
     def clean(self):
         # Check checker role
         if not self.checker or not hasattr(self.checker, "role") or self.checker.role not in ["admin", "checker"]:
             raise ValidationError("Uživatel není Kontrolor.")
 
-        # Validate reservation existence (safe check)
-        if not Reservation.objects.filter(pk=self.reservation_id).exists():
+        # Validate reservation existence (safe check), načtenou rezervaci není nutné hledat znovu
+        reservation = self._loaded_related("reservation")
+        if reservation is not None:
+            if reservation.is_deleted:
+                raise ValidationError("Neplatné ID Rezervace.")
+        elif not Reservation.objects.filter(pk=self.reservation_id).exists():
             raise ValidationError("Neplatné ID Rezervace.")
 
         super().clean()
 
     def save(self, *args, **kwargs):
-        self.full_clean()
+        # FK validace full_clean dělá dotaz pro každou vazbu, u načtených instancí je zbytečná
+        self.full_clean(exclude=[name for name in ("reservation", "checker") if self._loaded_related(name) is not None])
         super().save(*args, **kwargs)
 
     def delete(self, *args, **kwargs):
+        # post_save přepočítá poslední kontrolu rezervace (booking.signals)
         self.is_deleted = True
         self.deleted_at = timezone.now()
         self.save()
-        from .signals import update_reservation_check_status
-        # Simulate post_delete behavior
-        update_reservation_check_status(sender=ReservationCheck, instance=self)
@@ -0,0 +1,139 @@
+"""
+Index obsazenosti prodejních míst (MarketSlot).
+
+Pro každé prodejní místo drží v cache seřazený seznam sloučených intervalů
+(reserved_from, reserved_to) ze všech aktivních rezervací. Dotazy na rezervované
+dny a na překryv termínů se pak řeší binárním vyhledáváním nad tímto seznamem
+místo procházení rezervací den po dni.
+
+Intervaly mají stejnou sémantiku jako kontrola překryvu v Reservation.clean:
+dvě rezervace se překrývají, pokud `a.from < b.to and a.to > b.from`.
+Index se udržuje přes signály v booking/signals.py.
+"""
+from bisect import bisect_right
+
+from django.core.cache import cache
+from django.db import transaction
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+OCCUPANCY_CACHE_TIMEOUT = 60 * 60 * 24  # 1 den, index se jinak obnovuje signály
+OCCUPANCY_CACHE_KEY = "booking:occupancy:slot:{}"
+
+
+def merge_intervals(intervals):
+    """
+    Seřadí a sloučí překrývající se nebo navazující intervaly.
+    Vrací list dvojic (start, end).
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def build_slot_intervals(market_slot_id):
+    """Sestaví index prodejního místa z databáze (jeden dotaz)."""
+    from .models import Reservation
+
+    rows = Reservation.objects.filter(
+        market_slot_id=market_slot_id,
+        status="reserved",
+    ).values_list("reserved_from", "reserved_to")
+    return merge_intervals(rows)
+
+
+def get_slot_intervals(market_slot_id):
+    """Vrátí sloučené intervaly obsazenosti, při prázdné cache je dopočítá."""
+    key = OCCUPANCY_CACHE_KEY.format(market_slot_id)
+    intervals = cache.get(key)
+    if intervals is None:
+        intervals = build_slot_intervals(market_slot_id)
+        cache.set(key, intervals, OCCUPANCY_CACHE_TIMEOUT)
+    return intervals
+
+
+def get_many_slot_intervals(market_slot_ids):
+    """
+    Hromadná varianta get_slot_intervals: chybějící indexy dopočítá
+    jedním dotazem pro všechna prodejní místa najednou.
+    """
+    from .models import Reservation
+
+    market_slot_ids = list(market_slot_ids)
+    keys = {OCCUPANCY_CACHE_KEY.format(slot_id): slot_id for slot_id in market_slot_ids}
+    cached = cache.get_many(list(keys))
+    result = {keys[key]: value for key, value in cached.items()}
+
+    missing = [slot_id for slot_id in market_slot_ids if slot_id not in result]
+    if missing:
+        raw = {slot_id: [] for slot_id in missing}
+        rows = Reservation.objects.filter(
+            market_slot_id__in=missing,
+            status="reserved",
+        ).values_list("market_slot_id", "reserved_from", "reserved_to")
+        for slot_id, start, end in rows:
+            raw[slot_id].append((start, end))
+
+        fresh = {slot_id: merge_intervals(intervals) for slot_id, intervals in raw.items()}
+        cache.set_many(
+            {OCCUPANCY_CACHE_KEY.format(slot_id): intervals for slot_id, intervals in fresh.items()},
+            OCCUPANCY_CACHE_TIMEOUT,
+        )
+        result.update(fresh)
+    return result
+
+
+def find_overlap(intervals, start, end):
+    """
+    Vrátí první interval, který se překrývá s <start, end), jinak None.
+    Intervaly musí být sloučené (viz merge_intervals), pak jsou seřazené i podle konce.
+    """
+    idx = bisect_right(intervals, start, key=lambda interval: interval[1])
+    if idx < len(intervals) and intervals[idx][0] < end:
+        return intervals[idx]
+    return None
+
+
+def find_overlaps(intervals, start, end):
+    """Vrátí všechny intervaly, které se překrývají s <start, end)."""
+    idx = bisect_right(intervals, start, key=lambda interval: interval[1])
+    overlaps = []
+    while idx < len(intervals) and intervals[idx][0] < end:
+        overlaps.append(intervals[idx])
+        idx += 1
+    return overlaps
+
+
+def is_slot_free(market_slot_id, start, end):
+    return find_overlap(get_slot_intervals(market_slot_id), start, end) is None
+
+
+def refresh_slot_occupancy(market_slot_id):
+    intervals = build_slot_intervals(market_slot_id)
+    cache.set(OCCUPANCY_CACHE_KEY.format(market_slot_id), intervals, OCCUPANCY_CACHE_TIMEOUT)
+    return intervals
+
+
+def invalidate_slot_occupancy(*market_slot_ids):
+    """
+    Zahodí index daných prodejních míst a po commitu transakce ho znovu sestaví,
+    aby ostatní procesy nenačetly necommitnutý stav.
+    """
+    slot_ids = {slot_id for slot_id in market_slot_ids if slot_id}
+    if not slot_ids:
+        return
+    cache.delete_many([OCCUPANCY_CACHE_KEY.format(slot_id) for slot_id in slot_ids])
+
+    def _refresh():
+        # jeden dotaz pro všechna místa (hromadné mazání jich invaliduje stovky)
+        get_many_slot_intervals(slot_ids)
+
+    transaction.on_commit(_refresh)
+    logger.debug(f"Occupancy index invalidated for market slots {sorted(slot_ids)}")
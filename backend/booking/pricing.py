@@ -0,0 +1,94 @@
+"""
+Výpočet ceny rezervace na jednom místě.
+
+Cena = plocha místa (width × height) × cena za m² × počet dní (včetně prvního dne).
+Cena za m² se bere z prodejního místa, pokud je nastavená, jinak z akce.
+Rozšíření (used_extension) se zatím neúčtuje, jen se kontroluje proti available_extension.
+
+Používá Reservation.calculate_price, PriceCalculationSerializer, ReservationSerializer
+i hromadná kalkulace (BatchPriceCalculationSerializer).
+"""
+from decimal import Decimal
+
+import numpy as np
+from django.core.exceptions import ValidationError
+
+PRICE_QUANT = Decimal("0.01")
+MAX_FINAL_PRICE = Decimal("999999.99")  # max_digits=8, decimal_places=2 u Reservation.final_price
+
+
+def slot_price_per_m2(market_slot, event=None):
+    """Cena za m² prodejního místa, případně výchozí cena akce."""
+    if market_slot.price_per_m2 and market_slot.price_per_m2 > 0:
+        return market_slot.price_per_m2
+    event = event or market_slot.event
+    return event.price_per_m2
+
+
+def reservation_days(reserved_from, reserved_to):
+    """Počet účtovaných dní, zahrnuje i první den. Funguje pro date i datetime."""
+    return (reserved_to - reserved_from).days + 1
+
+
+def _validate_item(market_slot, reserved_from, reserved_to, used_extension):
+    event = market_slot.event
+    if not event or not event.square_id:
+        raise ValidationError("Slot musí být přiřazen k akci, která má náměstí.")
+    if reserved_from > reserved_to:
+        raise ValidationError("Datum začátku rezervace musí být dříve než její konec.")
+    if used_extension and used_extension > market_slot.available_extension:
+        raise ValidationError("Požadované rozšíření je větší než možné rožšíření daného prodejního místa.")
+
+    price_per_m2 = slot_price_per_m2(market_slot, event)
+    if not price_per_m2 or price_per_m2 < 0:
+        raise ValidationError("Cena za m² není dostupná nebo je záporná.")
+    return price_per_m2
+
+
+def quote_price(market_slot, reserved_from, reserved_to, used_extension=0):
+    """
+    Cena jedné rezervace.
+
+    Raises:
+        ValidationError: chybějící akce / cena za m², neplatný rozsah nebo rozšíření
+    """
+    price_per_m2 = _validate_item(market_slot, reserved_from, reserved_to, used_extension)
+    area = market_slot.width * market_slot.height
+    final_price = Decimal(area) * Decimal(price_per_m2) * Decimal(reservation_days(reserved_from, reserved_to))
+    return final_price.quantize(PRICE_QUANT)
+
+
+def quote_many(items):
+    """
+    Hromadná kalkulace cen bez dotazů do DB, prodejní místa musí mít načtenou akci
+    (select_related("event")). Počítá se vektorově v celých haléřích (int64), takže
+    výsledek je přesný a shodný s výpočtem v Decimal.
+
+    Args:
+        items (list[tuple]): (market_slot, reserved_from, reserved_to, used_extension)
+
+    Returns:
+        list[Decimal]: ceny ve stejném pořadí
+
+    Raises:
+        ValidationError: dict {index: chyby}, pokud je některá položka nevalidní
+    """
+    errors = {}
+    areas, days, prices = [], [], []
+    for index, (market_slot, reserved_from, reserved_to, used_extension) in enumerate(items):
+        try:
+            price_per_m2 = _validate_item(market_slot, reserved_from, reserved_to, used_extension)
+        except ValidationError as e:
+            errors[str(index)] = e.messages
+            continue
+        areas.append(market_slot.width * market_slot.height)
+        days.append(reservation_days(reserved_from, reserved_to))
+        prices.append(int(Decimal(price_per_m2).quantize(PRICE_QUANT) * 100))
+
+    if errors:
+        raise ValidationError(errors)
+    if not items:
+        return []
+
+    cents = np.array(areas, dtype=np.int64) * np.array(days, dtype=np.int64) * np.array(prices, dtype=np.int64)
+    return [Decimal(int(value)) * PRICE_QUANT for value in cents]
@@ -0,0 +1,120 @@
+"""
+Push změn obsazenosti prodejních míst přes Django Channels.
+
+Každá akce (Event) má vlastní skupinu, do které se po commitu transakce posílají
+kompaktní delty ve tvaru::
+
+    {"type": "availability.delta", "event_id": 1,
+     "changes": [{"slot_id": 5, "state": "reserved", "start": "2030-01-02", "end": "2030-01-05"}]}
+
+`state` má stejné hodnoty jako EventAvailabilitySerializer (free / blocked / reserved),
+u zablokovaného místa je vždy "blocked". `start` a `end` odpovídají reserved_from / reserved_to rezervace.
+Klient si počáteční stav načte z /api/booking/availability/ a delty pouze aplikuje.
+"""
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+EVENT_GROUP_NAME = "booking.event.{}.availability"
+
+
+def event_group_name(event_id):
+    return EVENT_GROUP_NAME.format(event_id)
+
+
+def slot_change(slot_id, state, start, end):
+    return {"slot_id": slot_id, "state": state, "start": start.isoformat(), "end": end.isoformat()}
+
+
+def _with_slot_states(changes):
+    """Zablokované místo je pro klienty "blocked" i v uvolněném intervalu (jako EventAvailabilitySerializer)."""
+    from .models import MarketSlot
+
+    slot_ids = {change["slot_id"] for change in changes if change["state"] != "blocked"}
+    blocked = set(MarketSlot.all_objects.filter(pk__in=slot_ids, status="blocked").values_list("pk", flat=True))
+    return [{**change, "state": "blocked"} if change["slot_id"] in blocked else change for change in changes]
+
+
+def _send(event_id, changes):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        # stav místa až po commitu, jedním dotazem pro celou zprávu
+        changes = _with_slot_states(changes)
+        async_to_sync(channel_layer.group_send)(
+            event_group_name(event_id),
+            {"type": "availability.delta", "event_id": event_id, "changes": changes},
+        )
+    except Exception as e:
+        # výpadek channel layeru nesmí shodit uloženou rezervaci
+        logger.warning(f"Availability delta for event {event_id} was not sent: {e}")
+
+
+def broadcast_availability(event_id, changes):
+    """Pošle delty skupině akce až po commitu, necommitnutý stav se klientům neukáže."""
+    if not event_id or not changes:
+        return
+    transaction.on_commit(lambda: _send(event_id, changes))
+
+
+def _unblocked_slot_changes(slot_id, start, end):
+    # odblokované místo je volné kromě intervalů z indexu obsazenosti (čte se až po commitu)
+    from .occupancy import get_slot_intervals
+
+    changes = [slot_change(slot_id, "free", start, end)]
+    changes += [slot_change(slot_id, "reserved", interval_start, interval_end) for interval_start, interval_end in get_slot_intervals(slot_id)]
+    return changes
+
+
+def broadcast_slot_state(market_slot):
+    """
+    Delty po změně MarketSlot.status. Zablokované místo je blokované po celou akci,
+    odblokované je volné kromě intervalů z indexu obsazenosti.
+    """
+    event = market_slot.event
+    slot_id = market_slot.id
+    event_id = event.id
+
+    if market_slot.status == "blocked":
+        broadcast_availability(event_id, [slot_change(slot_id, "blocked", event.start, event.end)])
+        return
+
+    transaction.on_commit(lambda: _send(event_id, _unblocked_slot_changes(slot_id, event.start, event.end)))
+
+
+def broadcast_released(reservations, unblocked_slots=()):
+    """
+    Delty po hromadném uvolnění přes update() (storno objednávek, kaskádový soft delete),
+    které neposílá signály. Jedna zpráva na akci, po commitu.
+
+    Args:
+        reservations (Iterable[tuple]): (event_id, slot_id, reserved_from, reserved_to) uvolněných rezervací
+        unblocked_slots (Iterable[tuple]): (event_id, slot_id, event_start, event_end) míst, kterým se zrušila blokace
+    """
+    released = defaultdict(list)
+    for event_id, slot_id, reserved_from, reserved_to in reservations:
+        if slot_id:
+            released[event_id].append(slot_change(slot_id, "free", reserved_from, reserved_to))
+    unblocked = defaultdict(list)
+    for event_id, slot_id, start, end in unblocked_slots:
+        unblocked[event_id].append((slot_id, start, end))
+
+    for event_id in released.keys() | unblocked.keys():
+        changes, slots = released[event_id], unblocked[event_id]
+        if not slots:
+            broadcast_availability(event_id, changes)
+            continue
+
+        def _send_released(event_id=event_id, changes=changes, slots=slots):
+            for slot_id, start, end in slots:
+                changes = changes + _unblocked_slot_changes(slot_id, start, end)
+            _send(event_id, changes)
+
+        transaction.on_commit(_send_released)
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .consumers import EventAvailabilityConsumer
+
+websocket_urlpatterns = [
+    path("ws/booking/events/<int:event_id>/availability/", EventAvailabilityConsumer.as_asgi()),
+]
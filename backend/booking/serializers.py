@@ -1,15 +1,18 @@
 from rest_framework import serializers
-from datetime import timedelta
+from rest_framework.settings import api_settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.utils import timezone
 from booking.models import Event, MarketSlot
 import logging
+from datetime import timedelta
 from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
-try:
-    from commerce.serializers import PriceCalculationSerializer
-except ImportError:
-    PriceCalculationSerializer = None
 
-from trznice.utils import RoundedDateTimeField
+from trznice.utils import RoundedDateTimeField, SparseFieldsetMixin
 from .models import Event, MarketSlot, Reservation, Square, ReservationCheck
+from .occupancy import get_slot_intervals, get_many_slot_intervals, find_overlap, find_overlaps
+from .pricing import quote_price, MAX_FINAL_PRICE
+from .holds import HoldConflict, check_slot_hold, get_slot_holds, get_many_slot_holds, held_intervals, hold_expires_at
 from account.models import CustomUser
 from product.serializers import EventProductSerializer
 
@@ -45,6 +48,12 @@ class SquareShortSerializer(serializers.ModelSerializer):
             "name": {"read_only": True, "help_text": "Název náměstí"}
         }
 
+class EventBriefSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Event
+        fields = ["id", "name", "start", "end"]
+        read_only_fields = fields
+
 class ReservationShortSerializer(serializers.ModelSerializer):
     user = UserShortSerializer(read_only=True)
     event = EventShortSerializer(read_only=True)
@@ -67,7 +76,7 @@ class ReservationShortSerializer(serializers.ModelSerializer):
 
 class ReservationCheckSerializer(serializers.ModelSerializer):
     reservation = serializers.PrimaryKeyRelatedField(
-        queryset=Reservation.objects.all(),
+        queryset=Reservation.objects.select_related("user", "event"),  # reservation_info v odpovědi bez dalších dotazů
         write_only=True,
         help_text="ID rezervace, která se kontroluje."
     )
@@ -96,7 +105,77 @@ class ReservationCheckSerializer(serializers.ModelSerializer):
         return value
 
 
-class ReservationSerializer(serializers.ModelSerializer):
+class OfflineCheckSerializer(serializers.Serializer):
+    id = serializers.UUIDField(help_text="Idempotenční ID kontroly vygenerované klientem.")
+    reservation = serializers.IntegerField(help_text="ID rezervace, která se kontroluje.")
+    checked_at = serializers.DateTimeField(help_text="Čas kontroly na zařízení kontrolora.")
+
+
+class ReservationCheckSyncSerializer(serializers.Serializer):
+    """
+    Dávka kontrol zaznamenaných offline. Rezervace se načtou (a zamknou) jedním dotazem, kontroly
+    se zapíšou přes bulk_create a poslední kontrola rezervací jedním UPDATE
+    (Reservation.record_checks). Nevalidní položky se jen vrátí v `errors`,
+    aby je klient mohl vyřadit z fronty, již zapsané (stejné `id`) v `duplicates`.
+    """
+    MAX_ITEMS = 500
+    CLOCK_SKEW = timedelta(minutes=5)  # tolerance hodin zařízení
+
+    checks = OfflineCheckSerializer(many=True, allow_empty=False)
+
+    def validate_checks(self, checks):
+        if len(checks) > self.MAX_ITEMS:
+            raise serializers.ValidationError(f"Najednou lze odeslat maximálně {self.MAX_ITEMS} kontrol.")
+        return checks
+
+    def sync(self, checker):
+        items = self.validated_data["checks"]
+        client_ids = {item["id"] for item in items}
+        latest_allowed = timezone.now() + self.CLOCK_SKEW
+
+        with transaction.atomic():
+            # Zámek rezervací serializuje souběžné synchronizace stejných kontrol: již zapsaná `id`
+            # se čtou až po commitu předchozí dávky, bulk_create tak nic nepřeskočí a `created`
+            # obsahuje jen skutečně vložené kontroly (ignore_conflicts je jen pojistka)
+            reservations = {
+                reservation.pk: reservation
+                for reservation in Reservation.objects.select_for_update().only("id", "status")
+                .filter(pk__in={item["reservation"] for item in items}).order_by("pk")
+            }
+            duplicates = set(ReservationCheck.all_objects.filter(client_id__in=client_ids).values_list("client_id", flat=True))
+
+            errors, new_checks = {}, []
+            for index, item in enumerate(items):
+                if item["id"] in duplicates:
+                    continue
+                reservation = reservations.get(item["reservation"])
+                if reservation is None:
+                    errors[str(index)] = ["Neplatné ID Rezervace."]
+                elif reservation.status != "reserved":
+                    errors[str(index)] = ["Rezervaci lze kontrolovat pouze pokud je ve stavu 'reserved'."]
+                elif item["checked_at"] > latest_allowed:
+                    errors[str(index)] = ["Čas kontroly je v budoucnosti."]
+                else:
+                    duplicates.add(item["id"])  # stejné id dvakrát v jedné dávce
+                    new_checks.append(ReservationCheck(
+                        client_id=item["id"],
+                        reservation_id=reservation.pk,
+                        checker=checker,
+                        checked_at=item["checked_at"],
+                    ))
+
+            ReservationCheck.objects.bulk_create(new_checks, ignore_conflicts=True)
+            Reservation.record_checks(new_checks)
+
+        created = [check.client_id for check in new_checks]
+        return {
+            "created": created,
+            "duplicates": [client_id for client_id in client_ids if client_id in duplicates and client_id not in created],
+            "errors": errors,
+        }
+
+
+class ReservationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     reserved_from = serializers.DateField()
     reserved_to = serializers.DateField()
 
@@ -208,109 +287,19 @@ class ReservationSerializer(serializers.ModelSerializer):
 
         privileged_roles = ["admin", "cityClerk"]
 
-        # Define max allowed price based on model's decimal constraints (8 digits, 2 decimal places)
-        MAX_FINAL_PRICE = Decimal("999999.99")
-
         if user and getattr(user, "role", None) in privileged_roles:
-            # 🧠 Automatický výpočet ceny rezervace pokud není zadána
+            # 🧠 Automatický výpočet ceny rezervace pokud není zadána (booking/pricing.py)
             if not final_price or final_price == 0:
                 market_slot = data.get("market_slot")
-                event = data.get("event")
-                reserved_from = data.get("reserved_from")
-                reserved_to = data.get("reserved_to")
-                used_extension = data.get("used_extension", 0)
-                # --- Prefer PriceCalculationSerializer if available ---
-                if PriceCalculationSerializer:
-                    try:
-                        price_serializer = PriceCalculationSerializer(data={
-                            "market_slot": market_slot.id if market_slot else None,
-                            "used_extension": used_extension,
-                            "reserved_from": reserved_from,
-                            "reserved_to": reserved_to,
-                            "event": event.id if event else None,
-                            "user": user.id if user else None,
-                        })
-                        price_serializer.is_valid(raise_exception=True)
-                        calculated_price = price_serializer.validated_data.get("final_price")
-                        if calculated_price is not None:
-                            try:
-                                # Always quantize to two decimals
-                                decimal_price = Decimal(str(calculated_price)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-                                # Clamp value to max allowed and raise error if exceeded
-                                if decimal_price > MAX_FINAL_PRICE:
-                                    logger.error(f"ReservationSerializer: final_price ({decimal_price}) exceeds max allowed ({MAX_FINAL_PRICE})")
-                                    data["final_price"] = MAX_FINAL_PRICE
-                                    raise serializers.ValidationError({"final_price": f"Cena je příliš vysoká, maximálně {MAX_FINAL_PRICE} Kč."})
-                                else:
-                                    data["final_price"] = decimal_price
-                            except (InvalidOperation, TypeError, ValueError):
-                                raise serializers.ValidationError("Výsledná cena není platné číslo.")
-                        else:
-                            raise serializers.ValidationError("Výpočet ceny selhal.")
-                    except Exception as e:
-                        logger.error(f"PriceCalculationSerializer failed: {e}", exc_info=True)
-                        market_slot = data.get("market_slot")
-                        event = data.get("event")
-                        reserved_from = data.get("reserved_from")
-                        reserved_to = data.get("reserved_to")
-                        used_extension = data.get("used_extension", 0)
-                        price_per_m2 = data.get("price_per_m2")
-                        if price_per_m2 is None:
-                            if market_slot and hasattr(market_slot, "price_per_m2"):
-                                price_per_m2 = market_slot.price_per_m2
-                            elif event and hasattr(event, "price_per_m2"):
-                                price_per_m2 = event.price_per_m2
-                            else:
-                                raise serializers.ValidationError("Cena za m² není dostupná.")
-                        base_size = getattr(market_slot, "base_size", None)
-                        if base_size is None:
-                            raise serializers.ValidationError("Základní velikost (base_size) není dostupná.")
-                        duration_days = (reserved_to - reserved_from).days
-                        base_size_decimal = Decimal(str(base_size))
-                        used_extension_decimal = Decimal(str(used_extension))
-                        duration_days_decimal = Decimal(str(duration_days))
-                        price_per_m2_decimal = Decimal(str(price_per_m2))
-                        calculated_price = duration_days_decimal * (price_per_m2_decimal * (base_size_decimal + used_extension_decimal))
-                        try:
-                            decimal_price = Decimal(str(calculated_price)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-                            # Clamp value to max allowed and raise error if exceeded
-                            if decimal_price > MAX_FINAL_PRICE:
-                                logger.error(f"ReservationSerializer: final_price ({decimal_price}) exceeds max allowed ({MAX_FINAL_PRICE})")
-                                data["final_price"] = MAX_FINAL_PRICE
-                                raise serializers.ValidationError({"final_price": f"Cena je příliš vysoká, maximálně {MAX_FINAL_PRICE} Kč."})
-                            else:
-                                data["final_price"] = decimal_price
-                        except (InvalidOperation, TypeError, ValueError):
-                            raise serializers.ValidationError("Výsledná cena není platné číslo.")
-                else:
-                    price_per_m2 = data.get("price_per_m2")
-                    if price_per_m2 is None:
-                        if market_slot and hasattr(market_slot, "price_per_m2"):
-                            price_per_m2 = market_slot.price_per_m2
-                        elif event and hasattr(event, "price_per_m2"):
-                            price_per_m2 = event.price_per_m2
-                        else:
-                            raise serializers.ValidationError("Cena za m² není dostupná.")
-                    resolution = event.square.cellsize if event and hasattr(event, "square") else 1
-                    width = getattr(market_slot, "width", 1)
-                    height = getattr(market_slot, "height", 1)
-                    # If you want to include used_extension, add it to area
-                    area_m2 = Decimal(width) * Decimal(height) * Decimal(resolution) * Decimal(resolution)
-                    duration_days = (reserved_to - reserved_from).days
-
-                    price_per_m2_decimal = Decimal(str(price_per_m2))
-                    calculated_price = Decimal(duration_days) * area_m2 * price_per_m2_decimal
-                    try:
-                        decimal_price = Decimal(str(calculated_price)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-                        # Clamp value to max allowed and raise error if exceeded
-                        if decimal_price > MAX_FINAL_PRICE:
-                            logger.error(f"ReservationSerializer: final_price ({decimal_price}) exceeds max allowed ({MAX_FINAL_PRICE})")
-                            data["final_price"] = MAX_FINAL_PRICE
-                            raise serializers.ValidationError({"final_price": f"Cena je příliš vysoká, maximálně {MAX_FINAL_PRICE} Kč."})
-                        else:
-                            data["final_price"] = decimal_price
-                    except (InvalidOperation, TypeError, ValueError):
-                        raise serializers.ValidationError("Výsledná cena není platné číslo.")
+                if market_slot is None:
+                    raise serializers.ValidationError("Rezervace musí mít přiřazené prodejní místo.")
+                try:
+                    data["final_price"] = quote_price(market_slot, reserved_from, reserved_to, used_extension)
+                except DjangoValidationError as e:
+                    raise serializers.ValidationError(e.messages)
+                if data["final_price"] > MAX_FINAL_PRICE:
+                    logger.error(f"ReservationSerializer: final_price ({data['final_price']}) exceeds max allowed ({MAX_FINAL_PRICE})")
+                    raise serializers.ValidationError({"final_price": f"Cena je příliš vysoká, maximálně {MAX_FINAL_PRICE} Kč."})
             else:
                 if self.instance:  # update
                     if final_price != self.instance.final_price and (not user or user.role not in privileged_roles):
@@ -345,28 +334,35 @@ class ReservationSerializer(serializers.ModelSerializer):
         if reserved_from < event.start or reserved_to > event.end:
             raise serializers.ValidationError("Rezervace musí být v rámci trvání akce.")
 
-        overlapping = None 
         if market_slot:
             if market_slot.event != event:
                 raise serializers.ValidationError("Prodejní místo nepatří do dané akce.")
             
             if used_extension > market_slot.available_extension:
                 raise serializers.ValidationError("Požadované rozšíření překračuje dostupné rozšíření.")
-            
-            overlapping = Reservation.objects.exclude(id=self.instance.id if self.instance else None).filter(
-                event=event,
-                market_slot=market_slot,
-                reserved_from__lt=reserved_to,
-                reserved_to__gt=reserved_from,
-                status="reserved"
-            )
-
-        if overlapping is not None and overlapping.exists():
-            logger.debug(f"ReservationSerializer.validate: Found overlapping reservations for market_slot {market_slot.id} in event {event.id}")
-            raise serializers.ValidationError("Rezervace se překrývá s jinou rezervací na stejném místě.")
+
+        # Překryv s jinou rezervací hlídá databáze při uložení (viz Reservation.save), chyba se převede v create/update
 
         return data
 
+    def create(self, validated_data):
+        try:
+            return super().create(validated_data)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: e.messages})
+
+    def update(self, instance, validated_data):
+        try:
+            return super().update(instance, validated_data)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: e.messages})
+
+def _request_user_id(context):
+    request = context.get("request")
+    user = getattr(request, "user", None)
+    return user.id if user is not None and user.is_authenticated else None
+
+
 class ReservationAvailabilitySerializer(serializers.Serializer):
     event_id = serializers.IntegerField()
     market_slot_id = serializers.IntegerField()
@@ -392,39 +388,119 @@ class ReservationAvailabilitySerializer(serializers.Serializer):
         if reserved_from >= reserved_to:
             raise serializers.ValidationError("Konec rezervace musí být po začátku.")
 
-        # Zkontroluj existenci Eventu a Slotu
+        # Zkontroluj existenci Eventu a Slotu (jedním dotazem)
         try:
-            event = Event.objects.get(id=event_id)
-        except Event.DoesNotExist:
-            raise serializers.ValidationError("Událost neexistuje.")
-
-        try:
-            market_slot = MarketSlot.objects.get(id=market_slot_id)
+            market_slot = MarketSlot.objects.select_related("event").get(id=market_slot_id, event_id=event_id)
         except MarketSlot.DoesNotExist:
+            if not Event.objects.filter(id=event_id).exists():
+                raise serializers.ValidationError("Událost neexistuje.")
             raise serializers.ValidationError("Slot neexistuje.")
+        event = market_slot.event
 
         # Zkontroluj status slotu
         if market_slot.status == "blocked":
             raise serializers.ValidationError("Tento slot je zablokovaný správcem.")
 
         # Zkontroluj, že datumy spadají do rozsahu události
-        if reserved_from < event.date_from or reserved_to > event.date_to:
+        if reserved_from < event.start or reserved_to > event.end:
             raise serializers.ValidationError("Vybrané datumy nespadají do trvání akce.")
 
-        # Zkontroluj, jestli už neexistuje kolizní rezervace
-        conflict = Reservation.objects.filter(
-            event=event,
-            market_slot=market_slot,
-            reserved_from__lt=reserved_to,
-            reserved_to__gt=reserved_from,
-            status="reserved"
-        ).exists()
+        # Zkontroluj, jestli už neexistuje kolizní rezervace (z indexu obsazenosti)
+        conflict = find_overlap(get_slot_intervals(market_slot.id), reserved_from, reserved_to)
 
         if conflict:
             raise serializers.ValidationError("Tento slot je v daném termínu již rezervován.")
 
+        # Místo, které právě drží jiný uživatel v checkoutu, není volné
+        try:
+            check_slot_hold(market_slot.id, reserved_from, reserved_to, _request_user_id(self.context))
+        except HoldConflict as e:
+            raise serializers.ValidationError(str(e))
+
         return data
 
+
+class EventAvailabilitySerializer(serializers.Serializer):
+    STATE_CHOICES = [
+        ("free", "Volné"),
+        ("blocked", "Zablokované"),
+        ("reserved", "Rezervované"),
+        ("held", "Podržené jiným uživatelem"),
+    ]
+
+    event_id = serializers.IntegerField(help_text="ID akce (Event)")
+    reserved_from = serializers.DateField(help_text="Začátek zvoleného období")
+    reserved_to = serializers.DateField(help_text="Konec zvoleného období")
+    min_area = serializers.FloatField(required=False, min_value=0, help_text="Minimální základní velikost místa (m²)")
+    status = serializers.ChoiceField(choices=STATE_CHOICES, required=False, help_text="Vrátí jen místa v daném stavu")
+
+    def validate(self, data):
+        if data["reserved_from"] >= data["reserved_to"]:
+            raise serializers.ValidationError("Konec rezervace musí být po začátku.")
+
+        try:
+            event = Event.objects.get(id=data["event_id"])
+        except Event.DoesNotExist:
+            raise serializers.ValidationError("Událost neexistuje.")
+
+        if data["reserved_from"] < event.start or data["reserved_to"] > event.end:
+            raise serializers.ValidationError("Vybrané datumy nespadají do trvání akce.")
+
+        data["event"] = event
+        return data
+
+    def get_availability(self):
+        """
+        Stav všech prodejních míst akce pro zvolené období.
+        Konstantní počet dotazů: akce, prodejní místa a (při prázdné cache) jeden dotaz na rezervace.
+        Holdy ostatních uživatelů (booking/holds.py) se načtou jedním voláním cache.
+        """
+        data = self.validated_data
+        reserved_from = data["reserved_from"]
+        reserved_to = data["reserved_to"]
+
+        slots = MarketSlot.objects.filter(event=data["event"]).order_by("number")
+        if data.get("min_area") is not None:
+            slots = slots.filter(base_size__gte=data["min_area"])
+        slots = list(slots.only("id", "number", "status", "base_size", "x", "y", "width", "height"))
+
+        intervals_by_slot = get_many_slot_intervals(slot.id for slot in slots)
+        holds_by_slot = get_many_slot_holds(slot.id for slot in slots)
+        user_id = _request_user_id(self.context)
+
+        result = []
+        for slot in slots:
+            conflicts = find_overlaps(intervals_by_slot.get(slot.id, []), reserved_from, reserved_to)
+            held = find_overlaps(held_intervals(holds_by_slot.get(slot.id, {}), user_id), reserved_from, reserved_to)
+
+            if slot.status == "blocked":
+                state = "blocked"
+            elif conflicts:
+                state = "reserved"
+            elif held:
+                state = "held"
+            else:
+                state = "free"
+
+            if data.get("status") and data["status"] != state:
+                continue
+
+            result.append({
+                "id": slot.id,
+                "number": slot.number,
+                "state": state,
+                "base_size": slot.base_size,
+                "reserved_ranges": [{"start": start, "end": end} for start, end in conflicts],
+                "held_ranges": [{"start": start, "end": end} for start, end in held],
+            })
+
+        return {
+            "event_id": data["event"].id,
+            "reserved_from": reserved_from,
+            "reserved_to": reserved_to,
+            "slots": result,
+        }
+
 #--- Reservation end ----
 
 
@@ -470,8 +546,54 @@ class MarketSlotSerializer(serializers.ModelSerializer):
         
         return data
 
+    # Kolize a přesah mřížky hlásí MarketSlot.clean (validate_layout) až při save()
+    def create(self, validated_data):
+        try:
+            return super().create(validated_data)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: e.messages})
+
+    def update(self, instance, validated_data):
+        try:
+            return super().update(instance, validated_data)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: e.messages})
+
+
+class MarketSlotLayoutItemSerializer(MarketSlotSerializer):
+    """Jedno místo v hromadném importu – bez akce a čísla, ty přiděluje import."""
+
+    class Meta(MarketSlotSerializer.Meta):
+        fields = [
+            "status", "base_size", "available_extension",
+            "x", "y", "width", "height",
+            "price_per_m2"
+        ]
+        read_only_fields = []
+
+    def to_internal_value(self, data):
+        # V CSV/JSON importu se cena za m² zadává jako "price"
+        if "price" in data and "price_per_m2" not in data:
+            data = dict(data)
+            data["price_per_m2"] = data.pop("price")
+        return super().to_internal_value(data)
+
+
+class MarketSlotLayoutSerializer(serializers.Serializer):
+    event = serializers.PrimaryKeyRelatedField(queryset=Event.objects.all(), help_text="ID akce, pro kterou se rozložení importuje")
+    slots = MarketSlotLayoutItemSerializer(many=True, allow_empty=False, help_text="Seznam prodejních míst (x, y, width, height, base_size, price)")
+
+    def create(self, validated_data):
+        try:
+            return MarketSlot.bulk_create_layout(validated_data["event"], validated_data["slots"])
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({"slots": e.message_dict if hasattr(e, "error_dict") else e.messages})
+
+
+class EventSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    # Vnořené stromy jen na vyžádání: ?expand=market_slots,event_products
+    expandable_fields = ("market_slots", "event_products")
 
-class EventSerializer(serializers.ModelSerializer):
     square = SquareShortSerializer(read_only=True)
     square_id = serializers.PrimaryKeyRelatedField(
         queryset=Square.objects.all(), source="square", write_only=True
@@ -480,6 +602,8 @@ class EventSerializer(serializers.ModelSerializer):
 
     market_slots = MarketSlotSerializer(many=True, read_only=True, source="event_marketSlots")
     event_products = EventProductSerializer(many=True, read_only=True)
+    market_slot_count = serializers.SerializerMethodField(help_text="Počet prodejních míst akce")
+    event_product_count = serializers.SerializerMethodField(help_text="Počet povolených zboží akce")
 
     start = serializers.DateField()
     end = serializers.DateField()
@@ -487,7 +611,8 @@ class EventSerializer(serializers.ModelSerializer):
     class Meta:
         model = Event
         fields = [
-            "id", "name", "description", "start", "end", "price_per_m2", "image", "market_slots", "event_products", 
+            "id", "name", "description", "start", "end", "price_per_m2", "image",
+            "market_slot_count", "event_product_count", "market_slots", "event_products",
             "square",     # nested read-only
             "square_id"   # required in POST/PUT
         ]
@@ -506,6 +631,15 @@ class EventSerializer(serializers.ModelSerializer):
             "square": {"help_text": "Náměstí, na kterém se akce koná (jen ke čtení)", "required": False},
             "square_id": {"help_text": "ID Náměstí, na kterém se akce koná (jen ke zápis)", "required": True},
         }
+
+    # Počty jsou v EventViewSet anotované, jinak se dopočítají
+    def get_market_slot_count(self, obj):
+        count = getattr(obj, "market_slot_count", None)
+        return count if count is not None else obj.event_marketSlots.count()
+
+    def get_event_product_count(self, obj):
+        count = getattr(obj, "event_product_count", None)
+        return count if count is not None else obj.event_products.count()
         
     def validate(self, data):
         start = data.get("start")
@@ -533,16 +667,19 @@ class EventSerializer(serializers.ModelSerializer):
         return data
 
 
-class SquareSerializer(serializers.ModelSerializer):
+class SquareSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    # Akce na náměstí jen na vyžádání: ?expand=events
+    expandable_fields = ("events",)
 
     image = serializers.ImageField(required=False, allow_null=True)  # Ensure DRF handles image upload
+    events = EventBriefSerializer(many=True, read_only=True, source="square_events")
 
     class Meta:
         model = Square
         fields = [
             "id", "name", "description", "street", "city", "psc",
             "width", "height", "grid_rows", "grid_cols", "cellsize",
-            "image"
+            "image", "events"
         ]
         read_only_fields = ["id"]
         extra_kwargs = {
@@ -560,9 +697,15 @@ class SquareSerializer(serializers.ModelSerializer):
         }
 
 #-----------------------------------------------------------------------
+class ReservedRangeSerializer(serializers.Serializer):
+    start = serializers.DateField(help_text="První rezervovaný den")
+    end = serializers.DateField(help_text="Poslední rezervovaný den")
+
+
 class ReservedDaysSerializer(serializers.Serializer):
     market_slot_id = serializers.IntegerField()
-    reserved_days = serializers.ListField(child=serializers.DateField(), read_only=True)
+    reserved_ranges = ReservedRangeSerializer(many=True, read_only=True)
+    held_ranges = ReservedRangeSerializer(many=True, read_only=True)
 
     def to_representation(self, instance):
         # Accept instance as dict or int
@@ -571,32 +714,112 @@ class ReservedDaysSerializer(serializers.Serializer):
         else:
             market_slot_id = instance  # assume int
 
-        try:
-            market_slot = MarketSlot.objects.get(id=market_slot_id)
-        except MarketSlot.DoesNotExist:
-            return {"market_slot_id": market_slot_id, "reserved_days": []}
+        # Sloučené intervaly z indexu obsazenosti (viz booking/occupancy.py)
+        intervals = get_slot_intervals(market_slot_id)
+        # Termíny podržené v checkoutu jiným uživatelem
+        held = held_intervals(get_slot_holds(market_slot_id), _request_user_id(self.context))
 
-        # Get all reserved days for this slot, return each day individually
-        reservations = Reservation.objects.filter(
-            market_slot_id=market_slot_id,
-            status="reserved"
-        )
-        reserved_days = set()
-        for reservation in reservations:
-            current = reservation.reserved_from
-            end = reservation.reserved_to
-            # Convert to date if it's a datetime
-            if hasattr(current, "date"):
-                current = current.date()
-            if hasattr(end, "date"):
-                end = end.date()
-            # Include both start and end dates
-            while current <= end:
-                reserved_days.add(current)
-                current += timedelta(days=1)
-
-        # Return reserved days as a sorted list of individual dates
         return {
             "market_slot_id": market_slot_id,
-            "reserved_days": sorted(reserved_days)
+            "reserved_ranges": ReservedRangeSerializer(
+                [{"start": start, "end": end} for start, end in intervals], many=True
+            ).data,
+            "held_ranges": ReservedRangeSerializer(
+                [{"start": start, "end": end} for start, end in held], many=True
+            ).data,
         }
+
+
+class SlotHoldSerializer(serializers.Serializer):
+    token = serializers.CharField(read_only=True, help_text="Token holdu, posílá se jako `hold` při vytvoření rezervace")
+    market_slot = serializers.PrimaryKeyRelatedField(
+        queryset=MarketSlot.objects.select_related("event"), help_text="ID prodejního místa (MarketSlot)"
+    )
+    reserved_from = serializers.DateField(help_text="Začátek drženého termínu")
+    reserved_to = serializers.DateField(help_text="Konec drženého termínu")
+    expires_at = serializers.DateTimeField(read_only=True, help_text="Kdy hold vyprší")
+
+    def validate(self, data):
+        market_slot = data["market_slot"]
+        event = market_slot.event
+
+        if data["reserved_from"] >= data["reserved_to"]:
+            raise serializers.ValidationError("Konec rezervace musí být po začátku.")
+        if market_slot.status == "blocked":
+            raise serializers.ValidationError("Tento slot je zablokovaný správcem.")
+        if data["reserved_from"] < event.start or data["reserved_to"] > event.end:
+            raise serializers.ValidationError("Vybrané datumy nespadají do trvání akce.")
+        return data
+
+    def to_representation(self, hold):
+        return {
+            "token": hold["token"],
+            "market_slot": hold["market_slot_id"],
+            "reserved_from": hold["reserved_from"],
+            "reserved_to": hold["reserved_to"],
+            "expires_at": hold_expires_at(hold),
+        }
+
+
+class EventManifestQuerySerializer(serializers.Serializer):
+    date = serializers.DateField(required=False, help_text="Den manifestu (výchozí dnes)")
+    since = serializers.IntegerField(required=False, min_value=0, help_text="Verze posledního staženého manifestu, vrátí jen změny")
+
+    def validate(self, data):
+        data.setdefault("date", timezone.localdate())
+        return data
+
+
+class EventManifestEntrySerializer(serializers.Serializer):
+    slot = serializers.IntegerField(allow_null=True, help_text="Číslo prodejního místa")
+    reservation = serializers.IntegerField(help_text="ID rezervace")
+    seller = serializers.CharField(help_text="Jméno prodejce")
+    paid = serializers.BooleanField(help_text="Objednávka je zaplacená")
+    last_checked_at = serializers.DateTimeField(allow_null=True, help_text="Čas poslední kontroly")
+
+
+class EventManifestSerializer(serializers.Serializer):
+    event = serializers.IntegerField()
+    date = serializers.DateField()
+    version = serializers.IntegerField(help_text="Posílá se zpět jako `since`")
+    full = serializers.BooleanField(help_text="Celý manifest (false = jen změny od `since`)")
+    entries = EventManifestEntrySerializer(many=True)
+    removed = serializers.ListField(child=serializers.IntegerField(), help_text="ID rezervací, které z manifestu vypadly")
+
+
+class TicketSerializer(serializers.Serializer):
+    reservation = serializers.IntegerField()
+    token = serializers.CharField(help_text="Podepsaný token vstupenky, obsah QR kódu")
+
+
+class TicketVerifySerializer(serializers.Serializer):
+    token = serializers.CharField(max_length=200, help_text="Obsah naskenovaného QR kódu")
+    date = serializers.DateField(required=False, help_text="Den kontroly (výchozí dnes)")
+
+
+class TicketVerificationSerializer(serializers.Serializer):
+    REASON_CHOICES = [
+        ("malformed", "Neplatný formát"),
+        ("signature", "Neplatný podpis"),
+        ("revoked", "Rezervace zrušena, smazaná nebo nezaplacená"),
+        ("superseded", "Nahrazeno novější vstupenkou"),
+        ("date", "Mimo termín rezervace"),
+    ]
+
+    valid = serializers.BooleanField()
+    reason = serializers.ChoiceField(choices=REASON_CHOICES, allow_null=True)
+    reservation = serializers.IntegerField(required=False)
+    market_slot = serializers.IntegerField(required=False)
+    reserved_from = serializers.DateField(required=False)
+    reserved_to = serializers.DateField(required=False)
+    user = serializers.IntegerField(required=False)
+    version = serializers.IntegerField(required=False)
+
+
+class TicketKeySerializer(serializers.Serializer):
+    algorithm = serializers.CharField(help_text="Ed25519, podpis v base64url bez paddingu")
+    public_key = serializers.CharField(help_text="Veřejný klíč (32 bajtů raw) v base64")
+    valid = serializers.DictField(
+        child=serializers.IntegerField(),
+        help_text="Platné vstupenky: rezervace → aktuální verze vstupenky (chybějící rezervace je neplatná)",
+    )
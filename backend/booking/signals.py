@@ -1,9 +1,94 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, post_init
 from django.dispatch import receiver
-from booking.models import ReservationCheck
+from booking.models import ReservationCheck, Reservation, MarketSlot, Square, Event
+from booking.occupancy import invalidate_slot_occupancy
+from booking.manifest import mark_reservations_changed
+from booking.tickets import invalidate_tickets, ticket_fields
+from booking.realtime import broadcast_availability, broadcast_slot_state, slot_change
+from trznice.cache import bump_catalogue_version
 
 @receiver([post_save, post_delete], sender=ReservationCheck)
-def update_reservation_check_status(sender, instance, **kwargs):
-    reservation = instance.reservation
-    reservation.update_check_status()
-    reservation.save(update_fields=["is_checked", "last_checked_at", "last_checked_by"])
+def update_reservation_check_status(sender, instance, created=False, **kwargs):
+    # nová kontrola jen posune poslední kontrolu (podmíněný UPDATE), přepočet až při smazání / změně
+    if created and not instance.is_deleted:
+        Reservation.record_check(instance)
+    else:
+        Reservation.recompute_check_status(instance.reservation_id)
+
+
+def _reservation_occupancy(instance):
+    # přes __dict__, aby odložená pole (.only()/.defer()) nevyvolala dotaz pro každou instanci
+    values = instance.__dict__
+    active = values.get("status") == "reserved" and not values.get("is_deleted")
+    return (values.get("market_slot_id"), values.get("reserved_from"), values.get("reserved_to"), active)
+
+
+@receiver(post_init, sender=Reservation)
+def remember_reservation_market_slot(sender, instance, **kwargs):
+    # kvůli přesunu rezervace na jiné místo je potřeba přepočítat i původní slot
+    instance._original_market_slot_id = instance.__dict__.get("market_slot_id")
+    instance._original_occupancy = _reservation_occupancy(instance)
+    instance._original_ticket = ticket_fields(instance)
+
+
+@receiver([post_save, post_delete], sender=Reservation)
+def update_event_manifest(sender, instance, **kwargs):
+    mark_reservations_changed(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Reservation)
+def update_reservation_tickets(sender, instance, **kwargs):
+    # verzi vstupenky zvýší Reservation.save, tady se jen zahodí seznam platných vstupenek
+    invalidate_tickets()
+    instance._original_ticket = ticket_fields(instance)
+
+
+@receiver([post_save, post_delete], sender=Reservation)
+def update_market_slot_occupancy(sender, instance, **kwargs):
+    update_fields = kwargs.get("update_fields")
+    if update_fields and not {"status", "reserved_from", "reserved_to", "market_slot", "is_deleted"} & set(update_fields):
+        return
+
+    invalidate_slot_occupancy(instance.market_slot_id, getattr(instance, "_original_market_slot_id", None))
+    instance._original_market_slot_id = instance.market_slot_id
+
+    original = getattr(instance, "_original_occupancy", (None, None, None, False))
+    if kwargs.get("created"):
+        original = (None, None, None, False)
+    current = _reservation_occupancy(instance)
+    if kwargs.get("signal") is post_delete:
+        current = (current[0], current[1], current[2], False)
+    instance._original_occupancy = current
+    if original == current:
+        return
+
+    # Objednávka (commerce.Order) mění stav rezervace přes Reservation.save, takže delty chodí odsud
+    changes = []
+    slot_id, start, end, active = original
+    if active and slot_id:
+        changes.append(slot_change(slot_id, "free", start, end))
+    slot_id, start, end, active = current
+    if active and slot_id:
+        changes.append(slot_change(slot_id, "reserved", start, end))
+    broadcast_availability(instance.event_id, changes)
+
+
+@receiver(post_init, sender=MarketSlot)
+def remember_market_slot_status(sender, instance, **kwargs):
+    instance._original_status = instance.__dict__.get("status")
+
+
+@receiver(post_save, sender=MarketSlot)
+def broadcast_market_slot_status(sender, instance, created, **kwargs):
+    if not created and instance.status == instance._original_status:
+        return
+    instance._original_status = instance.status
+    broadcast_slot_state(instance)
+
+
+@receiver([post_save, post_delete], sender=Square)
+@receiver([post_save, post_delete], sender=Event)
+@receiver([post_save, post_delete], sender=MarketSlot)
+def bump_booking_catalogue_version(sender, instance, **kwargs):
+    # soft delete jde přes save() (post_save), hard delete přes post_delete
+    bump_catalogue_version(sender)
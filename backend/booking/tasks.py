@@ -6,10 +6,10 @@ from django.utils import timezone
 from datetime import timedelta, datetime
 from django.apps import apps
 
-from trznice.models import SoftDeleteModel
+from trznice.retention import RETENTION_BATCH_SIZE, RETENTION_BATCH_SLEEP, hard_delete_soft_deleted
 from booking.models import Reservation, MarketSlot
 from commerce.models import Order
-from account.tasks import send_email_with_context
+from account.outbox import enqueue_emails
 
 logger = get_task_logger(__name__)
 
@@ -27,40 +27,32 @@ def _validate_days_input(years=None, days=None):
     return 365 # default fallback
 
 @shared_task
-def hard_delete_soft_deleted_records_task(years=None, days=None):
+def hard_delete_soft_deleted_records_task(years=None, days=None, batch_size=RETENTION_BATCH_SIZE, sleep=RETENTION_BATCH_SLEEP, time_limit=None):
     """
     Hard delete všech objektů, které jsou soft-deleted (is_deleted=True)
     a zároveň byly označeny jako smazané (deleted_at) před více než zadaným časovým obdobím.
     Jako vstupní argument může být zadán počet let nebo dnů, podle kterého se data skartují.
+
+    Maže se po dávkách (`batch_size`, pauza `sleep` sekund) v pořadí podle FK závislostí,
+    s checkpointem v cache. Přerušený běh (nebo běh s `time_limit`) pokračuje při dalším spuštění
+    ve stejný den (cutoff je zarovnaný na půlnoc), viz trznice/retention.py.
     """
 
     total_days = _validate_days_input(years, days)
 
-    time_period = timezone.now() - timedelta(days=total_days)
-
-    # Pro všechny modely, které dědí z SoftDeleteModel, smaž staré smazané záznamy
-    for model in apps.get_models():
-        if not issubclass(model, SoftDeleteModel):
-            continue
-        if not model._meta.managed or model._meta.abstract:
-            continue
-        if not hasattr(model, "all_objects"):
-            continue
+    # cutoff zarovnaný na půlnoc: opakovaný běh ve stejný den navazuje na checkpoint přerušeného běhu
+    time_period = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=total_days)
 
-        # Filtrování soft-deleted a starých
-        deleted_qs = model.all_objects.filter(is_deleted=True, deleted_at__lt=time_period)
-        count = deleted_qs.count()
+    result = hard_delete_soft_deleted(time_period, batch_size=batch_size, sleep=sleep, time_limit=time_limit)
 
-        # Pokud budeme chtit použit custom logiku
-        # for obj in deleted_qs:
-        #     obj.hard_delete()
+    result["cutoff"] = result["cutoff"].isoformat()
+    for label, stats in result["stats"].items():
+        if stats["deleted"]:
+            logger.info(f"{label}: {stats['deleted']} records, {stats['rows_per_second']} rows/s")
 
-        deleted_qs.delete()
-
-        if count > 0:
-            logger.info(f"Hard deleted {count} records from {model.__name__}")
-        
-    return "Successfully completed hard_delete_soft_deleted_records_task"
+    if not result["completed"]:
+        return {"message": "hard_delete_soft_deleted_records_task interrupted, will resume from checkpoint", **result}
+    return {"message": "Successfully completed hard_delete_soft_deleted_records_task", **result}
 
 
 @shared_task
@@ -74,26 +66,32 @@ def cancel_unpayed_reservations_task(minutes=30):
 
     cutoff_time = timezone.now() - timedelta(minutes=minutes)
 
-    orders_qs = Order.objects.select_related("user", "reservation__event").filter(
+    orders_qs = Order.objects.filter(
         status="pending",
         created_at__lte=cutoff_time,
         payed_at__isnull=True
     )
 
-    count = orders_qs.count()
-
-    for order in orders_qs:
-        order.status = "cancelled"
-        send_email_with_context(
-            recipients=order.user.email,
-            subject="Stornování objednávky",
-            message=(
-                f"Vaše objednávka {order.order_number} má rezervaci prodejního místa "
-                f"na akci {order.reservation.event} a byla stornována po {minutes} minutách nezaplacení."
-            )
+    # e-maily se skládají z jednoho dotazu, storno je hromadný update (konstantní počet dotazů)
+    recipients = {
+        order_id: (email, event_name)
+        for order_id, email, event_name in orders_qs.values_list("id", "user__email", "reservation__event__name")
+    }
+    cancelled_ids = [order_id for order_id in Order.bulk_cancel(orders_qs) if order_id in recipients]
+
+    enqueue_emails(
+        (
+            "Stornování objednávky",
+            (
+                f"Vaše objednávka {order_id} má rezervaci prodejního místa "
+                f"na akci {recipients[order_id][1]} a byla stornována po {minutes} minutách nezaplacení."
+            ),
+            recipients[order_id][0],
         )
-        order.save()
+        for order_id in cancelled_ids
+    )
 
+    count = len(cancelled_ids)
     if count > 0:
         logger.info(f"Canceled {count} unpaid orders and released their slots.")
 
@@ -1,3 +1,845 @@
-from django.test import TestCase
+import base64
+import random
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from account.models import CustomUser
+from commerce.models import Order
+from trznice.retention import get_checkpoint, hard_delete_soft_deleted
+from .pricing import quote_many, quote_price, reservation_days
+from .layout import _has_overlap_raster, _overlapping_pairs_sweep, find_layout_conflicts
+from .routing import websocket_urlpatterns
+from .occupancy import OCCUPANCY_CACHE_KEY, find_overlaps, get_slot_intervals, merge_intervals
+from .manifest import MANIFEST_LOCK_KEY, manifest_for_day
+from .holds import HOLD_LOCK_KEY, HoldConflict, acquire_hold, get_hold, release_hold
+from .tickets import issue_ticket, verify_ticket
+from .models import Event, MarketSlot, Reservation, ReservationCheck, Square, RESERVATION_OVERLAP_MESSAGE
+
+
+class BookingTestCase(TestCase):
+    """Akce s dvěma místy, admin a dva prodejci; cache (holdy, vstupenky) se před každým testem maže."""
+
+    @classmethod
+    def setUpTestData(cls):
+        square = Square.objects.create(name="Náměstí", grid_rows=20, grid_cols=20)
+        cls.event = Event.objects.create(
+            name="Trh", square=square, start=date(2030, 1, 1), end=date(2030, 1, 31), price_per_m2=Decimal("10")
+        )
+        cls.slot = MarketSlot.objects.create(event=cls.event, base_size=4, x=0, y=0, width=2, height=2)
+        cls.other_slot = MarketSlot.objects.create(event=cls.event, base_size=4, x=5, y=0, width=2, height=2)
+        cls.admin = CustomUser.objects.create(
+            username="admin", email="admin@example.com", role="admin", phone_number="+420123456789"
+        )
+        cls.seller = CustomUser.objects.create(
+            username="seller", email="seller@example.com", role="seller", phone_number="+420123456788"
+        )
+        cls.other_seller = CustomUser.objects.create(
+            username="seller2", email="seller2@example.com", role="seller", phone_number="+420123456787"
+        )
+
+        cls.checker = CustomUser.objects.create(
+            username="checker", email="checker@example.com", role="checker", phone_number="+420123456786"
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def reserve(self, reserved_from, reserved_to, slot=None, user=None, **kwargs):
+        return Reservation.objects.create(
+            event=self.event, market_slot=slot or self.slot, user=user or self.seller,
+            reserved_from=reserved_from, reserved_to=reserved_to, **kwargs
+        )
+
+
+class ReservationOverlapTests(BookingTestCase):
+    def test_overlapping_reservation_rejected(self):
+        self.reserve(date(2030, 1, 2), date(2030, 1, 5))
+        with self.assertRaisesMessage(ValidationError, RESERVATION_OVERLAP_MESSAGE):
+            self.reserve(date(2030, 1, 4), date(2030, 1, 6), user=self.other_seller)
+
+    def test_adjacent_and_other_slot_allowed(self):
+        self.reserve(date(2030, 1, 2), date(2030, 1, 5))
+        self.reserve(date(2030, 1, 5), date(2030, 1, 7), user=self.other_seller)
+        self.reserve(date(2030, 1, 2), date(2030, 1, 5), slot=self.other_slot, user=self.other_seller)
+        self.assertEqual(Reservation.objects.count(), 3)
+
+    def test_cancelled_reservation_does_not_block(self):
+        reservation = self.reserve(date(2030, 1, 2), date(2030, 1, 5))
+        reservation.status = "cancelled"
+        reservation.save(validate=False)
+        self.reserve(date(2030, 1, 3), date(2030, 1, 4), user=self.other_seller)
+
+    def test_moving_into_occupied_range_rejected(self):
+        self.reserve(date(2030, 1, 2), date(2030, 1, 5))
+        reservation = self.reserve(date(2030, 1, 10), date(2030, 1, 12), user=self.other_seller)
+        reservation.reserved_from, reservation.reserved_to = date(2030, 1, 3), date(2030, 1, 6)
+        with self.assertRaisesMessage(ValidationError, RESERVATION_OVERLAP_MESSAGE):
+            reservation.save()
+
+    def test_api_create_into_occupied_range_conflicts(self):
+        # obsazený termín odmítne už hold na dobu požadavku (409), před validací rezervace
+        self.reserve(date(2030, 1, 2), date(2030, 1, 5))
+        client = APIClient()
+        client.force_authenticate(self.other_seller)
+        response = client.post("/api/booking/reservations/", {
+            "event": self.event.pk, "market_slot": self.slot.pk,
+            "reserved_from": "2030-01-04", "reserved_to": "2030-01-06", "used_extension": 0,
+        }, format="json")
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Reservation.objects.filter(user=self.other_seller).exists())
+
+    def test_api_update_overlap_returns_400(self):
+        self.reserve(date(2030, 1, 2), date(2030, 1, 5))
+        reservation = self.reserve(date(2030, 1, 10), date(2030, 1, 12))
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.patch(f"/api/booking/reservations/{reservation.pk}/", {
+            "reserved_from": "2030-01-04", "reserved_to": "2030-01-06",
+        }, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.reserved_from, date(2030, 1, 10))
+
+
+class SlotHoldTests(BookingTestCase):
+    def test_acquire_and_release(self):
+        hold = acquire_hold(self.slot.pk, date(2030, 1, 2), date(2030, 1, 4), self.seller.pk)
+        self.assertEqual(get_hold(hold["token"])["user_id"], self.seller.pk)
+
+        self.assertFalse(release_hold(hold["token"], user_id=self.other_seller.pk))
+        self.assertTrue(release_hold(hold["token"], user_id=self.seller.pk))
+        self.assertIsNone(get_hold(hold["token"]))
+
+    def test_other_user_conflicts(self):
+        acquire_hold(self.slot.pk, date(2030, 1, 2), date(2030, 1, 4), self.seller.pk)
+        with self.assertRaises(HoldConflict):
+            acquire_hold(self.slot.pk, date(2030, 1, 3), date(2030, 1, 5), self.other_seller.pk)
+        # navazující termín a jiné místo jsou volné
+        acquire_hold(self.slot.pk, date(2030, 1, 4), date(2030, 1, 6), self.other_seller.pk)
+        acquire_hold(self.other_slot.pk, date(2030, 1, 2), date(2030, 1, 4), self.other_seller.pk)
+
+    def test_same_user_replaces_overlapping_hold(self):
+        first = acquire_hold(self.slot.pk, date(2030, 1, 2), date(2030, 1, 4), self.seller.pk)
+        second = acquire_hold(self.slot.pk, date(2030, 1, 3), date(2030, 1, 6), self.seller.pk)
+        self.assertIsNone(get_hold(first["token"]))
+        self.assertIsNotNone(get_hold(second["token"]))
+
+    def test_reserved_range_conflicts(self):
+        self.reserve(date(2030, 1, 2), date(2030, 1, 5))
+        with self.assertRaises(HoldConflict):
+            acquire_hold(self.slot.pk, date(2030, 1, 4), date(2030, 1, 6), self.other_seller.pk)
+
+    def test_locked_slot_conflicts(self):
+        cache.add(HOLD_LOCK_KEY.format(self.slot.pk), 1, 5)
+        with self.assertRaises(HoldConflict):
+            acquire_hold(self.slot.pk, date(2030, 1, 2), date(2030, 1, 4), self.seller.pk)
+
+    def _create(self, user, **data):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post("/api/booking/reservations/", {
+            "event": self.event.pk, "market_slot": self.slot.pk,
+            "reserved_from": "2030-01-02", "reserved_to": "2030-01-04", "used_extension": 0, **data,
+        }, format="json")
+
+    def test_held_slot_blocks_other_users_reservation(self):
+        acquire_hold(self.slot.pk, date(2030, 1, 2), date(2030, 1, 4), self.seller.pk)
+        self.assertEqual(self._create(self.other_seller).status_code, 409)
+
+    def test_hold_consumed_on_success_kept_on_failure(self):
+        hold = acquire_hold(self.slot.pk, date(2030, 1, 2), date(2030, 1, 4), self.seller.pk)
+
+        response = self._create(self.seller, hold=hold["token"], used_extension=999)
+        self.assertEqual(response.status_code, 400)
+        self.assertIsNotNone(get_hold(hold["token"]))
+
+        response = self._create(self.seller, hold=hold["token"])
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(get_hold(hold["token"]))
+
+
+class TicketTests(BookingTestCase):
+    DAY = date(2030, 1, 3)
+
+    def setUp(self):
+        super().setUp()
+        self.reservation = self.reserve(date(2030, 1, 2), date(2030, 1, 4))
+        self.order = Order.objects.create(user=self.seller, reservation=self.reservation)
+        self.order.transition("payed")
+
+    def test_valid_ticket_verifies_without_queries(self):
+        token = issue_ticket(self.reservation)
+        verify_ticket(token, self.DAY)
+        with self.assertNumQueries(0):
+            result = verify_ticket(token, self.DAY)
+
+        self.assertTrue(result["valid"])
+        self.assertEqual(result["reservation"], self.reservation.pk)
+        self.assertEqual(result["market_slot"], self.slot.pk)
+
+    def test_invalid_tokens(self):
+        token = issue_ticket(self.reservation)
+        payload, signature = token.rsplit(".", 1)
+        tampered = payload.replace(f".{self.seller.pk}.", f".{self.other_seller.pk}.")
+
+        self.assertEqual(verify_ticket("nesmysl", self.DAY)["reason"], "malformed")
+        self.assertEqual(verify_ticket(f"{tampered}.{signature}", self.DAY)["reason"], "signature")
+        self.assertEqual(verify_ticket(f"{payload}.{'B' if signature[0] == 'A' else 'A'}{signature[1:]}", self.DAY)["reason"], "signature")
+        self.assertEqual(verify_ticket(token, date(2030, 1, 5))["reason"], "date")
+
+    def test_cancelled_order_revokes_ticket(self):
+        token = issue_ticket(self.reservation)
+        self.assertTrue(verify_ticket(token, self.DAY)["valid"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.transition("cancelled")
+        self.assertEqual(verify_ticket(token, self.DAY)["reason"], "revoked")
+
+    def test_changed_dates_supersede_ticket(self):
+        old_token = issue_ticket(self.reservation)
+        self.assertTrue(verify_ticket(old_token, self.DAY)["valid"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reservation.reserved_to = date(2030, 1, 5)
+            self.reservation.save()
+        self.assertEqual(self.reservation.ticket_version, 1)
+        # verze je v DB, zneplatnění přežije i ztrátu cache
+        cache.clear()
+
+        self.assertEqual(verify_ticket(old_token, self.DAY)["reason"], "superseded")
+        self.assertTrue(verify_ticket(issue_ticket(self.reservation), self.DAY)["valid"])
+
+    def test_deleted_user_ticket_revoked(self):
+        token = issue_ticket(self.reservation)
+        self.assertTrue(verify_ticket(token, self.DAY)["valid"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.get(pk=self.seller.pk).delete()
+        self.assertEqual(verify_ticket(token, self.DAY)["reason"], "revoked")
+
+    def test_purged_reservation_stays_revoked(self):
+        token = issue_ticket(self.reservation)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.delete()
+        hard_delete_soft_deleted(timezone.now() + timedelta(days=1), sleep=0)
+        self.assertFalse(Reservation.all_objects.filter(pk=self.reservation.pk).exists())
+
+        cache.clear()
+        self.assertEqual(verify_ticket(token, self.DAY)["reason"], "revoked")
+
+    def test_unpaid_reservation_has_no_ticket(self):
+        reservation = self.reserve(date(2030, 1, 2), date(2030, 1, 4), slot=self.other_slot)
+        client = APIClient()
+        client.force_authenticate(self.seller)
+        response = client.get(f"/api/booking/reservations/{reservation.pk}/ticket/")
+        self.assertEqual(response.status_code, 409)
+
+    def test_ticket_verifies_offline_with_public_key(self):
+        client = APIClient()
+        client.force_authenticate(self.seller)
+        token = client.get(f"/api/booking/reservations/{self.reservation.pk}/ticket/").data["token"]
+
+        client.force_authenticate(self.admin)
+        key = client.get("/api/booking/checks/ticket-key/").data
+        self.assertEqual(key["algorithm"], "Ed25519")
+        self.assertEqual(set(key), {"algorithm", "public_key", "valid"})
+        self.assertEqual(key["valid"], {str(self.reservation.pk): 0})
+
+        payload, signature = token.rsplit(".", 1)
+        public = Ed25519PublicKey.from_public_bytes(base64.b64decode(key["public_key"]))
+        public.verify(base64.urlsafe_b64decode(signature + "=" * (-len(signature) % 4)), payload.encode())
+
+        response = client.post("/api/booking/checks/verify-ticket/", {"token": token, "date": "2030-01-03"}, format="json")
+        self.assertTrue(response.data["valid"])
+
+
+class CascadeDeleteTests(BookingTestCase):
+    def test_event_delete_broadcasts_released_slots(self):
+        self.slot.status = "blocked"
+        self.slot.save()
+        reservation = self.reserve(date(2030, 1, 2), date(2030, 1, 4))
+        Order.objects.create(user=self.seller, reservation=reservation)
+        self.reserve(date(2030, 1, 6), date(2030, 1, 8), slot=self.other_slot, user=self.other_seller)
+
+        with mock.patch("booking.realtime._send") as send, self.captureOnCommitCallbacks(execute=True):
+            self.event.delete()
+
+        send.assert_called_once()
+        event_id, changes = send.call_args.args
+        self.assertEqual(event_id, self.event.pk)
+        self.assertCountEqual(changes, [
+            {"slot_id": self.slot.pk, "state": "free", "start": "2030-01-02", "end": "2030-01-04"},
+            {"slot_id": self.other_slot.pk, "state": "free", "start": "2030-01-06", "end": "2030-01-08"},
+            # odblokované místo: volné po celou akci, rezervace jsou už smazané
+            {"slot_id": self.slot.pk, "state": "free", "start": "2030-01-01", "end": "2030-01-31"},
+        ])
+        self.assertEqual(MarketSlot.all_objects.get(pk=self.slot.pk).status, "allowed")
+
+
+class AvailabilityConsumerTests(BookingTestCase):
+    """Delty přes in-memory channel layer (CHANNEL_LAYERS při DEBUG)."""
+
+    application = URLRouter(websocket_urlpatterns)
+
+    def _committed(self, action):
+        with self.captureOnCommitCallbacks(execute=True):
+            return action()
+
+    def _set_status(self, instance, status):
+        instance.status = status
+        instance.save()
+
+    async def _connect(self, event_id):
+        communicator = WebsocketCommunicator(self.application, f"/ws/booking/events/{event_id}/availability/")
+        connected, code = await communicator.connect()
+        return communicator, connected, code
+
+    async def test_reservation_deltas(self):
+        communicator, connected, _ = await self._connect(self.event.pk)
+        self.assertTrue(connected)
+
+        reservation = await sync_to_async(self._committed)(lambda: self.reserve(date(2030, 1, 2), date(2030, 1, 4)))
+        self.assertEqual(await communicator.receive_json_from(), {
+            "type": "availability.delta", "event_id": self.event.pk,
+            "changes": [{"slot_id": self.slot.pk, "state": "reserved", "start": "2030-01-02", "end": "2030-01-04"}],
+        })
+
+        await sync_to_async(self._committed)(lambda: self._set_status(reservation, "cancelled"))
+        message = await communicator.receive_json_from()
+        self.assertEqual(message["changes"], [
+            {"slot_id": self.slot.pk, "state": "free", "start": "2030-01-02", "end": "2030-01-04"},
+        ])
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_blocked_slot_stays_blocked(self):
+        communicator, _, _ = await self._connect(self.event.pk)
+
+        await sync_to_async(self._committed)(lambda: self._set_status(self.slot, "blocked"))
+        message = await communicator.receive_json_from()
+        self.assertEqual(message["changes"], [
+            {"slot_id": self.slot.pk, "state": "blocked", "start": "2030-01-01", "end": "2030-01-31"},
+        ])
+
+        reservation = await sync_to_async(self._committed)(lambda: self.reserve(date(2030, 1, 2), date(2030, 1, 4)))
+        await communicator.receive_json_from()
+        await sync_to_async(self._committed)(lambda: self._set_status(reservation, "cancelled"))
+        message = await communicator.receive_json_from()
+        self.assertEqual(message["changes"], [
+            {"slot_id": self.slot.pk, "state": "blocked", "start": "2030-01-02", "end": "2030-01-04"},
+        ])
+        await communicator.disconnect()
+
+    async def test_unknown_event_rejected(self):
+        communicator, connected, code = await self._connect(0)
+        self.assertFalse(connected)
+        self.assertEqual(code, 4404)
+
+
+class LayoutConflictTests(SimpleTestCase):
+    """Obdélníky (key, x, y, w, h) jsou polootevřené: [x, x + w) × [y, y + h)."""
+
+    def test_touching_rectangles_do_not_conflict(self):
+        rects = [("a", 0, 0, 2, 2), ("b", 2, 0, 2, 2), ("c", 0, 2, 2, 2), ("d", 2, 2, 2, 2), ("e", 4, 0, 6, 10)]
+        self.assertEqual(find_layout_conflicts(rects, 10, 10), ([], []))
+
+    def test_overlapping_rectangles_reported_as_pairs(self):
+        rects = [("a", 0, 0, 3, 3), ("b", 2, 2, 3, 3), ("c", 4, 0, 2, 3), ("d", 8, 8, 2, 2)]
+        out_of_bounds, pairs = find_layout_conflicts(rects, 10, 10)
+        self.assertEqual(out_of_bounds, [])
+        self.assertCountEqual([tuple(sorted(pair)) for pair in pairs], [("a", "b"), ("b", "c")])
+
+    def test_out_of_grid_reported(self):
+        rects = [("a", 8, 0, 2, 2), ("b", 9, 0, 2, 2), ("c", 0, 9, 1, 2)]
+        out_of_bounds, pairs = find_layout_conflicts(rects, 10, 10)
+        self.assertEqual(out_of_bounds, ["b", "c"])
+        self.assertEqual([tuple(sorted(pair)) for pair in pairs], [("a", "b")])
+
+    def test_empty_rectangles_ignored(self):
+        self.assertEqual(find_layout_conflicts([("a", 0, 0, 0, 5), ("b", 0, 0, 5, 5)], 10, 10), ([], []))
+
+    def test_raster_and_sweep_match_brute_force(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            rects = [
+                (index, rng.randrange(0, 8), rng.randrange(0, 8), rng.randrange(1, 4), rng.randrange(1, 4))
+                for index in range(rng.randrange(1, 6))
+            ]
+            expected = {
+                (a[0], b[0]) for i, a in enumerate(rects) for b in rects[i + 1:]
+                if a[1] < b[1] + b[3] and a[1] + a[3] > b[1] and a[2] < b[2] + b[4] and a[2] + a[4] > b[2]
+            }
+            pairs = {tuple(sorted(pair)) for pair in _overlapping_pairs_sweep(rects)}
+            self.assertEqual(pairs, expected, rects)
+            self.assertEqual(_has_overlap_raster(rects, 10, 10), bool(expected), rects)
+
+
+class MarketSlotLayoutTests(BookingTestCase):
+    def _slot(self, x, y, width=2, height=2):
+        return MarketSlot(event=self.event, base_size=4, x=x, y=y, width=width, height=height)
+
+    def test_touching_slot_allowed(self):
+        self._slot(2, 0).save()
+        self._slot(0, 18).save()
+
+    def test_overlapping_slot_rejected(self):
+        with self.assertRaisesMessage(ValidationError, f"místy č. {self.slot.number}"):
+            self._slot(1, 1).save()
+
+    def test_out_of_grid_slot_rejected(self):
+        with self.assertRaisesMessage(ValidationError, "přesahuje mřížku"):
+            self._slot(19, 0).save()
+
+    def test_serializer_returns_400(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.post("/api/booking/market-slots/", {
+            "event": self.event.pk, "base_size": 4, "x": 1, "y": 1, "width": 2, "height": 2,
+        }, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("non_field_errors", response.data)
+
+        response = client.patch(f"/api/booking/market-slots/{self.other_slot.pk}/", {"x": 1}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("non_field_errors", response.data)
+        self.other_slot.refresh_from_db()
+        self.assertEqual(self.other_slot.x, 5)
+
+    def test_reserve_slot_numbers(self):
+        self.assertEqual(self.event.last_slot_number, 2)
+        self.assertEqual(list(self.event.reserve_slot_numbers(3)), [3, 4, 5])
+        self.assertEqual(self.event.last_slot_number, 5)
+        slot = self._slot(10, 10)
+        slot.save()
+        self.assertEqual(slot.number, 6)
+
+    def test_event_save_keeps_slot_counter(self):
+        stale = Event.objects.get(pk=self.event.pk)
+        self.event.reserve_slot_numbers(2)
+
+        stale.name = "Přejmenovaný trh"
+        stale.save()
+        stale.refresh_from_db()
+        self.assertEqual((stale.name, stale.last_slot_number), ("Přejmenovaný trh", 4))
+
+    def test_bulk_create_layout(self):
+        with CaptureQueriesContext(connection) as queries:
+            created = MarketSlot.bulk_create_layout(self.event, [
+                {"base_size": 4, "x": 10, "y": 0, "width": 2, "height": 2},
+                {"base_size": 4, "x": 12, "y": 0, "width": 2, "height": 2, "price_per_m2": Decimal("15")},
+            ])
+        # existující místa, posun čítače (UPDATE + SELECT), jeden INSERT
+        statements = [query["sql"] for query in queries if "SAVEPOINT" not in query["sql"]]
+        self.assertEqual(len(statements), 4, statements)
+        self.assertEqual([slot.number for slot in created], [3, 4])
+        self.assertEqual([slot.price_per_m2 for slot in created], [self.event.price_per_m2, Decimal("15")])
+        self.assertEqual(MarketSlot.objects.filter(event=self.event).count(), 4)
+
+    def test_bulk_create_layout_rejects_whole_layout(self):
+        with self.assertRaises(ValidationError) as error:
+            MarketSlot.bulk_create_layout(self.event, [
+                {"base_size": 4, "x": 1, "y": 1, "width": 2, "height": 2},
+                {"base_size": 4, "x": 19, "y": 0, "width": 2, "height": 2},
+                {"base_size": 4, "x": 10, "y": 10, "width": 2, "height": 2},
+            ])
+        self.assertEqual(error.exception.message_dict["layout"], [
+            "Místo nové #1 přesahuje mřížku náměstí.",
+            f"Místa č. {self.slot.number} a nové #0 se překrývají.",
+        ])
+
+        with self.assertRaises(ValidationError) as error:
+            MarketSlot.bulk_create_layout(self.event, [
+                {"base_size": 4, "x": 10, "y": 10, "width": 2, "height": 2},
+                {"base_size": 4, "x": 12, "y": 10, "width": 2, "height": 2, "status": "nesmysl"},
+            ])
+        self.assertEqual(set(error.exception.message_dict), {"1"})
+        self.assertEqual(MarketSlot.objects.filter(event=self.event).count(), 2)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.last_slot_number, 2)
+
+    def test_bulk_csv_upload(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        csv_file = "x,y,width,height,base_size,price\n10,0,2,2,4,12\n12,0,2,2,4,\n"
+
+        response = client.post("/api/booking/market-slots/bulk/", {
+            "event": self.event.pk, "file": SimpleUploadedFile("layout.csv", ("\ufeff" + csv_file).encode("utf-8")),
+        }, format="multipart")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([slot["number"] for slot in response.data], [3, 4])
+
+        response = client.post("/api/booking/market-slots/bulk/", {
+            "event": self.event.pk, "file": SimpleUploadedFile("layout.csv", "x,y,šířka\n".encode("cp1250")),
+        }, format="multipart")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("file", response.data)
+
+
+class PricingTests(BookingTestCase):
+    def _items(self):
+        # vlastní cena místa, výchozí cena akce (cena 0 na neuloženém místě) a haléřové ceny
+        own_price = MarketSlot(event=self.event, base_size=6, x=0, y=10, width=3, height=2, price_per_m2=Decimal("12.35"))
+        event_price = MarketSlot(event=self.event, base_size=1, x=0, y=15, width=1, height=1, price_per_m2=Decimal("0"))
+        cheap = MarketSlot(event=self.event, base_size=20, x=10, y=10, width=4, height=5, price_per_m2=Decimal("0.01"))
+        expensive = MarketSlot(event=self.event, base_size=4, x=15, y=15, width=2, height=2, price_per_m2=Decimal("999.99"))
+        return [
+            (self.slot, date(2030, 1, 2), date(2030, 1, 4), 0),
+            (own_price, date(2030, 1, 1), date(2030, 1, 31), 0),
+            (event_price, date(2030, 1, 5), date(2030, 1, 5), 0),
+            (cheap, date(2030, 1, 10), date(2030, 1, 17), 0),
+            (expensive, date(2030, 1, 1), date(2030, 1, 30), 0),
+        ]
+
+    def test_quote_many_matches_quote_price(self):
+        items = self._items()
+        expected = [quote_price(*item) for item in items]
+        self.assertEqual(quote_many(items), expected)
+        self.assertEqual(expected[:3], [Decimal("120.00"), Decimal("2297.10"), Decimal("10.00")])
+        for price in quote_many(items):
+            self.assertEqual(price, price.quantize(Decimal("0.01")))
+
+    def test_quote_many_reports_invalid_items_by_index(self):
+        items = self._items()
+        items[1] = (items[1][0], date(2030, 1, 5), date(2030, 1, 4), 0)
+        items[3] = (items[3][0], date(2030, 1, 5), date(2030, 1, 6), 1)
+        with self.assertRaises(ValidationError) as raised:
+            quote_many(items)
+        self.assertEqual(set(raised.exception.message_dict), {"1", "3"})
+        self.assertEqual(quote_many([]), [])
+
+    def test_reservation_days_include_first_day(self):
+        self.assertEqual(reservation_days(date(2030, 1, 2), date(2030, 1, 2)), 1)
+        self.assertEqual(reservation_days(date(2030, 1, 2), date(2030, 1, 3)), 2)
+        self.assertEqual(reservation_days(date(2030, 1, 31), date(2030, 2, 1)), 2)
+        self.assertEqual(reservation_days(date(2028, 2, 28), date(2028, 3, 1)), 3)
+        self.assertEqual(reservation_days(datetime(2030, 1, 2, 8), datetime(2030, 1, 2, 18)), 1)
+        self.assertEqual(reservation_days(datetime(2030, 1, 2, 8), datetime(2030, 1, 3, 8)), 2)
+
+    def test_reservation_price_uses_quote_price(self):
+        reservation = self.reserve(date(2030, 1, 2), date(2030, 1, 4))
+        self.assertEqual(reservation.final_price, quote_price(self.slot, date(2030, 1, 2), date(2030, 1, 4)))
+
+
+class ReservationCheckStatusTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.reservation = self.reserve(date(2030, 1, 2), date(2030, 1, 4))
+        self.earlier = timezone.now() - timedelta(hours=2)
+        self.later = timezone.now() - timedelta(hours=1)
+
+    def _check(self, checked_at, checker=None):
+        return ReservationCheck.objects.create(reservation=self.reservation, checker=checker or self.checker, checked_at=checked_at)
+
+    def _status(self):
+        self.reservation.refresh_from_db()
+        return self.reservation.is_checked, self.reservation.last_checked_at, self.reservation.last_checked_by_id
+
+    def test_older_check_does_not_overwrite_newer(self):
+        self._check(self.later, checker=self.admin)
+        self._check(self.earlier)
+        self.assertEqual(self._status(), (True, self.later, self.admin.pk))
+
+    def test_bulk_record_keeps_newest(self):
+        self._check(self.later)
+        checks = [
+            ReservationCheck(reservation=self.reservation, checker=self.admin, checked_at=self.earlier),
+            ReservationCheck(reservation=self.reservation, checker=self.admin, checked_at=self.later - timedelta(minutes=1)),
+        ]
+        Reservation.record_checks(checks)
+        self.assertEqual(self._status(), (True, self.later, self.checker.pk))
+
+    def test_deleting_latest_check_recomputes(self):
+        self._check(self.earlier, checker=self.admin)
+        latest = self._check(self.later)
+
+        latest.delete()
+        self.assertEqual(self._status(), (True, self.earlier, self.admin.pk))
+
+        ReservationCheck.objects.get().delete()
+        self.assertEqual(self._status(), (False, None, None))
+
+
+class ReservationCheckSyncTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.reservation = self.reserve(date(2030, 1, 2), date(2030, 1, 4))
+        self.client = APIClient()
+        self.client.force_authenticate(self.checker)
+
+    def _sync(self, checks):
+        return self.client.post("/api/booking/checks/sync/", {"checks": checks}, format="json")
+
+    def test_replayed_batch_is_reported_as_duplicates(self):
+        checked_at = timezone.now() - timedelta(minutes=5)
+        checks = [
+            {"id": str(uuid.uuid4()), "reservation": self.reservation.pk, "checked_at": (checked_at - timedelta(minutes=1)).isoformat()},
+            {"id": str(uuid.uuid4()), "reservation": self.reservation.pk, "checked_at": checked_at.isoformat()},
+        ]
+        ids = {check["id"] for check in checks}
+
+        response = self._sync(checks)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({str(client_id) for client_id in response.data["created"]}, ids)
+        self.assertEqual(response.data["duplicates"], [])
+
+        with mock.patch.object(Reservation, "record_checks") as record_checks:
+            replay = self._sync(checks)
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.data["created"], [])
+        self.assertEqual({str(client_id) for client_id in replay.data["duplicates"]}, ids)
+        self.assertEqual(replay.data["errors"], {})
+        record_checks.assert_called_once_with([])
+
+        self.assertEqual(ReservationCheck.objects.count(), 2)
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.last_checked_at, checked_at)
+
+    def test_invalid_items_and_repeated_id_in_batch(self):
+        client_id = str(uuid.uuid4())
+        checked_at = (timezone.now() - timedelta(minutes=5)).isoformat()
+        response = self._sync([
+            {"id": client_id, "reservation": self.reservation.pk, "checked_at": checked_at},
+            {"id": client_id, "reservation": self.reservation.pk, "checked_at": checked_at},
+            {"id": str(uuid.uuid4()), "reservation": 0, "checked_at": checked_at},
+            {"id": str(uuid.uuid4()), "reservation": self.reservation.pk, "checked_at": (timezone.now() + timedelta(hours=1)).isoformat()},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([str(created) for created in response.data["created"]], [client_id])
+        self.assertEqual(response.data["duplicates"], [])
+        self.assertEqual(set(response.data["errors"]), {"2", "3"})
+        self.assertEqual(ReservationCheck.objects.count(), 1)
+
+
+class ManifestTests(BookingTestCase):
+    DAY = date(2030, 1, 3)
+
+    def setUp(self):
+        super().setUp()
+        self.reservation = self.reserve(date(2030, 1, 2), date(2030, 1, 4))
+        self.other = self.reserve(date(2030, 1, 3), date(2030, 1, 5), slot=self.other_slot, user=self.other_seller)
+        self.order = Order.objects.create(user=self.seller, reservation=self.reservation)
+
+    def _changed(self, action):
+        with self.captureOnCommitCallbacks(execute=True):
+            action()
+
+    def _ids(self, manifest):
+        return sorted(entry["reservation"] for entry in manifest["entries"])
+
+    def test_full_build_is_cached(self):
+        self.reserve(date(2030, 1, 10), date(2030, 1, 12))  # jiný den
+
+        manifest = manifest_for_day(self.event.pk, self.DAY)
+        self.assertTrue(manifest["full"])
+        self.assertEqual(self._ids(manifest), sorted([self.reservation.pk, self.other.pk]))
+        self.assertEqual(manifest["removed"], [])
+        self.assertFalse(any(entry["paid"] for entry in manifest["entries"]))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(manifest_for_day(self.event.pk, self.DAY), manifest)
+
+    def test_since_returns_only_changed_entries(self):
+        version = manifest_for_day(self.event.pk, self.DAY)["version"]
+        self._changed(lambda: self.order.transition("payed"))
+
+        delta = manifest_for_day(self.event.pk, self.DAY, since=version)
+        self.assertFalse(delta["full"])
+        self.assertGreater(delta["version"], version)
+        self.assertEqual(self._ids(delta), [self.reservation.pk])
+        self.assertTrue(delta["entries"][0]["paid"])
+        self.assertEqual(delta["removed"], [])
+
+        self.assertEqual(manifest_for_day(self.event.pk, self.DAY, since=delta["version"])["entries"], [])
+
+    def test_cancelled_reservation_is_removed(self):
+        version = manifest_for_day(self.event.pk, self.DAY)["version"]
+        self.other.status = "cancelled"
+        self._changed(self.other.save)
+
+        delta = manifest_for_day(self.event.pk, self.DAY, since=version)
+        self.assertFalse(delta["full"])
+        self.assertEqual(delta["entries"], [])
+        self.assertEqual(delta["removed"], [self.other.pk])
+        self.assertEqual(self._ids(manifest_for_day(self.event.pk, self.DAY)), [self.reservation.pk])
+
+    def test_deleted_seller_is_removed(self):
+        version = manifest_for_day(self.event.pk, self.DAY)["version"]
+        self._changed(self.seller.delete)
+
+        delta = manifest_for_day(self.event.pk, self.DAY, since=version)
+        self.assertFalse(delta["full"])
+        self.assertEqual(delta["removed"], [self.reservation.pk])
+
+    def test_change_during_lock_forces_full_manifest(self):
+        version = manifest_for_day(self.event.pk, self.DAY)["version"]
+        cache.add(MANIFEST_LOCK_KEY.format(self.event.pk), 1)
+        self.other.status = "cancelled"
+        self._changed(self.other.save)
+        cache.delete(MANIFEST_LOCK_KEY.format(self.event.pk))
+
+        manifest = manifest_for_day(self.event.pk, self.DAY, since=version)
+        self.assertTrue(manifest["full"])
+        self.assertEqual(self._ids(manifest), [self.reservation.pk])
+
+    def test_manifest_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.seller)
+        url = f"/api/booking/events/{self.event.pk}/manifest/"
+        self.assertEqual(client.get(url, {"date": self.DAY}).status_code, 403)
+
+        client.force_authenticate(self.checker)
+        response = client.get(url, {"date": self.DAY})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["full"])
+        self.assertEqual(len(response.data["entries"]), 2)
+
+
+class RetentionTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cutoff = timezone.now() - timedelta(days=365)
+        self.purged = [self.reserve(date(2030, 1, day), date(2030, 1, day + 1)).pk for day in range(1, 10, 2)]
+        self.kept = self.reserve(date(2030, 1, 20), date(2030, 1, 21)).pk
+        Reservation.objects.filter(pk__in=self.purged).update(is_deleted=True, deleted_at=self.cutoff - timedelta(days=30))
+
+    def _remaining(self):
+        return set(Reservation.all_objects.filter(pk__in=self.purged).values_list("pk", flat=True))
+
+    def _interrupted_run(self):
+        # pád workeru po první plné dávce (checkpoint se uloží před pauzou)
+        with mock.patch("trznice.retention.time.sleep", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                hard_delete_soft_deleted(self.cutoff, batch_size=2, sleep=1)
+
+    def test_interrupted_run_resumes_from_checkpoint(self):
+        self._interrupted_run()
+        self.assertEqual(self._remaining(), set(self.purged[2:]))
+        checkpoint = get_checkpoint(self.cutoff)
+        self.assertEqual((checkpoint["model"], checkpoint["last_pk"]), ("booking.Reservation", self.purged[1]))
+
+        result = hard_delete_soft_deleted(self.cutoff, batch_size=2, sleep=0)
+        self.assertTrue(result["completed"])
+        self.assertEqual(result["stats"]["booking.Reservation"]["deleted"], 5)
+        self.assertEqual(result["stats"]["booking.Reservation"]["batches"], 3)
+        self.assertEqual(self._remaining(), set())
+        self.assertTrue(Reservation.objects.filter(pk=self.kept).exists())
+        self.assertIsNone(get_checkpoint(self.cutoff))
+
+    def test_checkpoint_of_other_cutoff_is_ignored(self):
+        self._interrupted_run()
+
+        earlier = self.cutoff - timedelta(days=60)
+        result = hard_delete_soft_deleted(earlier, batch_size=2, sleep=0)
+        self.assertTrue(result["completed"])
+        self.assertEqual(result["cutoff"], earlier)
+        self.assertEqual(result["stats"]["booking.Reservation"]["deleted"], 0)
+        self.assertEqual(self._remaining(), set(self.purged[2:]))
+        self.assertIsNotNone(get_checkpoint(self.cutoff))
+
+
+class EventAvailabilityTests(BookingTestCase):
+    URL = "/api/booking/availability/"
+
+    def _get(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client.get(self.URL, {"event_id": self.event.pk, "reserved_from": "2030-01-02", "reserved_to": "2030-01-05"})
+
+    def _count_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self._get(self.seller)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_requires_login(self):
+        self.assertIn(self._get().status_code, (401, 403))
+
+    def test_query_count_does_not_grow_with_slots(self):
+        self.reserve(date(2030, 1, 3), date(2030, 1, 4))
+        queries = self._count_queries()
+
+        for x in range(8, 18, 2):
+            slot = MarketSlot.objects.create(event=self.event, base_size=4, x=x, y=5, width=2, height=2)
+            self.reserve(date(2030, 1, 1), date(2030, 1, 3), slot=slot, user=self.other_seller if x % 4 else self.admin)
+
+        self.assertEqual(self._count_queries(), queries)
+        acquire_hold(self.other_slot.pk, date(2030, 1, 4), date(2030, 1, 6), self.other_seller.pk)
+        states = {slot["state"] for slot in self._get(self.seller).data["slots"]}
+        self.assertEqual(states, {"reserved", "held"})
+
+
+class MergeIntervalsTests(SimpleTestCase):
+    def test_merge_intervals(self):
+        self.assertEqual(merge_intervals([]), [])
+        self.assertEqual(
+            merge_intervals([(5, 7), (1, 3), (3, 4), (2, 3), (10, 12), (11, 11)]),
+            [(1, 4), (5, 7), (10, 12)],
+        )
+
+    def test_touching_boundary_does_not_overlap(self):
+        intervals = merge_intervals([(1, 3), (5, 7)])
+        self.assertEqual(find_overlaps(intervals, 3, 5), [])
+        self.assertEqual(find_overlaps(intervals, 7, 9), [])
+        self.assertEqual(find_overlaps(intervals, 0, 1), [])
+        self.assertEqual(find_overlaps(intervals, 2, 6), [(1, 3), (5, 7)])
+
+
+class OccupancyTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = self.reserve(date(2030, 1, 2), date(2030, 1, 4))
+        self.second = self.reserve(date(2030, 1, 4), date(2030, 1, 6))
+
+    def test_index_rebuilt_after_commit(self):
+        self.assertEqual(get_slot_intervals(self.slot.pk), [(date(2030, 1, 2), date(2030, 1, 6))])
+        with self.assertNumQueries(0):
+            get_slot_intervals(self.slot.pk)
+
+        self.second.status = "cancelled"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.second.save()
+            self.assertIsNone(cache.get(OCCUPANCY_CACHE_KEY.format(self.slot.pk)))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_slot_intervals(self.slot.pk), [(date(2030, 1, 2), date(2030, 1, 4))])
+
+    def test_reserved_ranges(self):
+        client = APIClient()
+        client.force_authenticate(self.seller)
+
+        response = client.get("/api/booking/reserved-days-check/", {"market_slot_id": self.slot.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["reserved_ranges"], [{"start": "2030-01-02", "end": "2030-01-06"}])
+
+        def availability(reserved_from, reserved_to):
+            response = client.get("/api/booking/availability/", {
+                "event_id": self.event.pk, "reserved_from": reserved_from, "reserved_to": reserved_to,
+            })
+            return next(slot for slot in response.data["slots"] if slot["id"] == self.slot.pk)
+
+        # navazující termín (konec = začátek) se nepřekrývá
+        touching = availability("2030-01-06", "2030-01-08")
+        self.assertEqual((touching["state"], touching["reserved_ranges"]), ("free", []))
+        overlapping = availability("2030-01-05", "2030-01-08")
+        self.assertEqual(overlapping["state"], "reserved")
+        self.assertEqual(overlapping["reserved_ranges"], [{"start": date(2030, 1, 2), "end": date(2030, 1, 6)}])
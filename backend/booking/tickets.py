@@ -0,0 +1,169 @@
+"""
+Podepsané vstupenky (QR) k zaplaceným rezervacím.
+
+Token obsahuje ID rezervace, prodejní místo, termín a uživatele a podpis Ed25519,
+např. `T1.42.7.20300102.20300103.5.0.<podpis>` (poslední číslo je verze vstupenky). QR kód z něj vykresluje klient.
+Ověření je čistě výpočetní, bez dotazu do DB:
+
+- podpis se ověří veřejným klíčem (soukromý klíč `TICKET_SIGNING_KEY`, jinak odvozený ze SECRET_KEY),
+- rezervace se vyhledá v cache mezi platnými vstupenkami (nezrušené, nesmazané a zaplacené
+  rezervace, jejichž termín ještě neskončil) s aktuální verzí vstupenky,
+- změna místa, termínu nebo uživatele zvýší `Reservation.ticket_version`, platí jen vstupenka
+  s aktuální verzí.
+
+Ověřuje se proti seznamu platných, ne zneplatněných: rezervace, která v DB chybí
+(skartovaná retenční úlohou, trznice/retention.py), tak vstupenku nezplatní znovu.
+Seznam se při změně rezervace / objednávky / uživatele smaže a při dalším ověření sestaví
+jedním dotazem. Veřejný klíč lze zveřejnit, zařízení kontrolorů s ním a se staženým
+seznamem platných vstupenek ověřují offline, vystavit vstupenku ale nemohou.
+"""
+import base64
+import binascii
+from datetime import date
+from functools import lru_cache
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+TICKET_PREFIX = "T1"
+TICKET_VALID_KEY = "booking:tickets:valid"
+# horní mez, po kterou může být seznam zastaralý (sestavení souběžné s commitem změny)
+TICKET_VALID_TIMEOUT = 5 * 60
+
+
+def _signing_seed():
+    """32 bajtů soukromého klíče: TICKET_SIGNING_KEY (base64), jinak odvozeno ze SECRET_KEY."""
+    key = getattr(settings, "TICKET_SIGNING_KEY", None)
+    if key:
+        return base64.b64decode(key)
+    return salted_hmac("booking.tickets", "signing-key", algorithm="sha256").digest()
+
+
+@lru_cache(maxsize=4)
+def _private_key(seed):
+    return Ed25519PrivateKey.from_private_bytes(seed)
+
+
+def _signing_private_key():
+    return _private_key(_signing_seed())
+
+
+def public_key():
+    """Veřejný klíč (32 bajtů raw) pro ověřování vstupenek, lze zveřejnit."""
+    return _signing_private_key().public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def ticket_fields(reservation):
+    """(rezervace, místo, od, do, uživatel) přes __dict__, aby odložená pole nevyvolala dotaz."""
+    values = reservation.__dict__
+    return (values.get("id"), values.get("market_slot_id"), values.get("reserved_from"), values.get("reserved_to"), values.get("user_id"))
+
+
+def _payload(reservation_id, market_slot_id, reserved_from, reserved_to, user_id, version):
+    return f"{TICKET_PREFIX}.{reservation_id}.{market_slot_id}.{reserved_from:%Y%m%d}.{reserved_to:%Y%m%d}.{user_id}.{version}"
+
+
+def _sign(payload):
+    return _b64(_signing_private_key().sign(payload.encode()))
+
+
+def _signature_valid(payload, signature):
+    try:
+        raw = base64.urlsafe_b64decode(signature + "=" * (-len(signature) % 4))
+        _signing_private_key().public_key().verify(raw, payload.encode())
+    except (InvalidSignature, binascii.Error, ValueError):
+        return False
+    return True
+
+
+def issue_ticket(reservation):
+    payload = _payload(*ticket_fields(reservation), reservation.ticket_version)
+    return f"{payload}.{_sign(payload)}"
+
+
+def _parse_date(value):
+    return date(int(value[:4]), int(value[4:6]), int(value[6:]))
+
+
+def _parse(token):
+    parts = token.strip().split(".")
+    if len(parts) != 8 or parts[0] != TICKET_PREFIX:
+        return None
+    try:
+        data = {
+            "reservation": int(parts[1]),
+            "market_slot": int(parts[2]),
+            "reserved_from": _parse_date(parts[3]),
+            "reserved_to": _parse_date(parts[4]),
+            "user": int(parts[5]),
+            "version": int(parts[6]),
+        }
+    except ValueError:
+        return None
+    return ".".join(parts[:7]), parts[7], data
+
+
+# --- platné vstupenky ---
+
+def _build_valid():
+    """Jeden dotaz: zaplacené aktivní rezervace, jejichž termín neskončil, s verzí vstupenky."""
+    from .models import Reservation
+
+    valid = dict(
+        Reservation.objects.filter(
+            status="reserved", order__status="payed", order__is_deleted=False, reserved_to__gte=timezone.localdate()
+        ).values_list("pk", "ticket_version")
+    )
+    cache.set(TICKET_VALID_KEY, valid, TICKET_VALID_TIMEOUT)
+    return valid
+
+
+def get_valid_tickets():
+    """{ID rezervace: aktuální verze vstupenky} platných vstupenek, sestaví se při chybění v cache."""
+    valid = cache.get(TICKET_VALID_KEY)
+    if valid is None:
+        valid = _build_valid()
+    return valid
+
+
+def invalidate_tickets():
+    """Změna stavu rezervace / objednávky: seznam platných vstupenek se po commitu sestaví znovu."""
+    transaction.on_commit(lambda: cache.delete(TICKET_VALID_KEY))
+
+
+def verify_ticket(token, day=None):
+    """
+    Ověří vstupenku bez dotazu do DB. Rezervace, která není mezi platnými, je "revoked"
+    (i když už v DB neexistuje).
+
+    Returns:
+        dict: {"valid": bool, "reason": None | "malformed" | "signature" | "date" | "revoked" | "superseded", + údaje z tokenu}
+    """
+    parsed = _parse(token)
+    if parsed is None:
+        return {"valid": False, "reason": "malformed"}
+    payload, signature, data = parsed
+    if not _signature_valid(payload, signature):
+        return {"valid": False, "reason": "signature"}
+
+    day = day or timezone.localdate()
+    valid = get_valid_tickets()
+    reason = None
+    if not data["reserved_from"] <= day <= data["reserved_to"]:
+        reason = "date"
+    elif data["reservation"] not in valid:
+        reason = "revoked"
+    elif valid[data["reservation"]] != data["version"]:
+        reason = "superseded"
+    return {"valid": reason is None, "reason": reason, **data}
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import EventViewSet, ReservationViewSet, SquareViewSet, MarketSlotViewSet, ReservationAvailabilityCheckView, ReservedDaysView, ReservationCheckViewSet
+from .views import EventViewSet, ReservationViewSet, SquareViewSet, MarketSlotViewSet, ReservationAvailabilityCheckView, EventAvailabilityView, ReservedDaysView, ReservationCheckViewSet, SlotHoldView, SlotHoldDetailView
 
 router = DefaultRouter()
 router.register(r'events', EventViewSet, basename='event')
@@ -12,5 +12,8 @@ router.register(r'checks', ReservationCheckViewSet, basename='reservation-checks
 urlpatterns = [
     path('', include(router.urls)),
     path('reservations/check', ReservationAvailabilityCheckView.as_view(), name='event-reservation-check'),
+    path('availability/', EventAvailabilityView.as_view(), name='event-availability'),
     path('reserved-days-check/', ReservedDaysView.as_view(), name='reserved-days'),
+    path('holds/', SlotHoldView.as_view(), name='slot-hold'),
+    path('holds/<str:token>/', SlotHoldDetailView.as_view(), name='slot-hold-detail'),
 ]
\ No newline at end of file
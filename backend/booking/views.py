@@ -1,5 +1,5 @@
-from rest_framework import viewsets, filters
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework import viewsets, filters, serializers
+from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
@@ -8,8 +8,12 @@ from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse, OpenApiExample
 
 from .models import Event, Reservation, MarketSlot, Square, ReservationCheck
-from .serializers import EventSerializer, ReservationSerializer, MarketSlotSerializer, SquareSerializer, ReservationAvailabilitySerializer, ReservedDaysSerializer, ReservationCheckSerializer
+from .serializers import EventSerializer, ReservationSerializer, MarketSlotSerializer, MarketSlotLayoutSerializer, SquareSerializer, ReservationAvailabilitySerializer, EventAvailabilitySerializer, ReservedDaysSerializer, ReservationCheckSerializer, ReservationCheckSyncSerializer, SlotHoldSerializer, EventManifestQuerySerializer, EventManifestSerializer, TicketSerializer, TicketVerifySerializer, TicketVerificationSerializer, TicketKeySerializer
 from .filters import EventFilter, ReservationFilter
+from .layout import parse_layout_csv
+from .holds import HoldConflict, acquire_hold, release_hold, get_hold
+from .manifest import manifest_for_day
+from .tickets import issue_ticket, verify_ticket, get_valid_tickets, public_key
 
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import PermissionDenied
@@ -18,11 +22,21 @@ from rest_framework.views import APIView
 
 from account.permissions import *
 
+import base64
 import logging
 
 import logging
 
-from account.tasks import send_email_verification_task
+from trznice.pagination import CreatedAtCursorPagination, CheckedAtCursorPagination
+from trznice.utils import query_param_set
+from trznice.cache import CatalogueCacheMixin
+from product.models import Product, EventProduct
+
+from django.db.models import Count, Q
+from django.shortcuts import get_object_or_404
+
+# Hold bez tokenu drží místo jen po dobu zpracování požadavku na rezervaci
+HOLD_REQUEST_TIMEOUT = 30
 
 
 @extend_schema(
@@ -35,11 +49,13 @@ from account.tasks import send_email_verification_task
         "- popis (`description`)\n"
         "- ulice (`street`)\n"
         "- město (`city`)\n\n"
-        "**Příklady:** `?search=Ostrava`, `?search=Hlavní třída`"
+        "**Příklady:** `?search=Ostrava`, `?search=Hlavní třída`\n\n"
+        "Pole odpovědi lze omezit přes `?fields=id,name`, akce náměstí se přidají s `?expand=events`."
     )
 )
-class SquareViewSet(viewsets.ModelViewSet):
-    queryset = Square.objects.prefetch_related("square_events").all().order_by("name")
+class SquareViewSet(CatalogueCacheMixin, viewsets.ModelViewSet):
+    queryset = Square.objects.all().order_by("name")
+    cache_models = (Square, Event)
     serializer_class = SquareSerializer
     parser_classes = [MultiPartParser, FormParser]  # Accept image uploads
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
@@ -56,8 +72,10 @@ class SquareViewSet(viewsets.ModelViewSet):
     permission_classes = [RoleAllowed("admin", "squareManager")]
 
     def get_queryset(self):
-        send_email_verification_task.delay(1)
-        return super().get_queryset()
+        queryset = super().get_queryset()
+        if "events" in query_param_set(self.request, "expand"):
+            queryset = queryset.prefetch_related("square_events")
+        return queryset
     
 
 
@@ -72,11 +90,14 @@ class SquareViewSet(viewsets.ModelViewSet):
         "- město (`square.city`)\n"
         "- popis náměstí (`square.description`)\n"
         "- ulice (`square.street`)\n\n"
-        "**Příklady:** `?search=Jarmark`, `?search=Ostrava`, `?search=Masarykovo`"
+        "**Příklady:** `?search=Jarmark`, `?search=Ostrava`, `?search=Masarykovo`\n\n"
+        "Výpis i detail vrací souhrn akce s počty míst a zboží. Prodejní místa a zboží se přidají "
+        "jen na vyžádání `?expand=market_slots,event_products`, pole lze omezit přes `?fields=id,name,start`."
     )
 )
-class EventViewSet(viewsets.ModelViewSet):
-    queryset = Event.objects.prefetch_related("event_marketSlots", "event_products").all().order_by("start")
+class EventViewSet(CatalogueCacheMixin, viewsets.ModelViewSet):
+    queryset = Event.objects.all().order_by("start")
+    cache_models = (Event, Square, MarketSlot, EventProduct, Product)
     serializer_class = EventSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
     filterset_class = EventFilter
@@ -92,6 +113,42 @@ class EventViewSet(viewsets.ModelViewSet):
 
     permission_classes = [RoleAllowed("admin", "squareManager")]
 
+    def get_queryset(self):
+        # Souhrn akce: náměstí + počty, vnořené stromy se načtou jen s ?expand=
+        queryset = super().get_queryset().select_related("square").annotate(
+            market_slot_count=Count("event_marketSlots", filter=Q(event_marketSlots__is_deleted=False), distinct=True),
+            event_product_count=Count("event_products", filter=Q(event_products__is_deleted=False), distinct=True),
+        )
+        expand = query_param_set(self.request, "expand")
+        if "market_slots" in expand:
+            queryset = queryset.prefetch_related("event_marketSlots")
+        if "event_products" in expand:
+            queryset = queryset.prefetch_related("event_products__product")
+        return queryset
+
+    @extend_schema(
+        tags=["Event"],
+        summary="Daily inspection manifest",
+        description=(
+            "Manifest akce pro kontrolory na jeden den (`?date=`, výchozí dnes): číslo místa, rezervace, prodejce, "
+            "zaplaceno a poslední kontrola. Drží se v cache a aktualizuje se při změně rezervace, objednávky či kontroly.\n\n"
+            "S `?since=<version>` z předchozí odpovědi vrací jen změny: upravené záznamy v `entries` a ID rezervací, "
+            "které pro daný den zmizely, v `removed`. Pokud rozdíl nelze sestavit, vrátí se celý manifest (`full: true`)."
+        ),
+        parameters=[
+            OpenApiParameter(name="date", type=str, location=OpenApiParameter.QUERY, required=False, description="Den (YYYY-MM-DD)"),
+            OpenApiParameter(name="since", type=int, location=OpenApiParameter.QUERY, required=False, description="Verze posledního staženého manifestu"),
+        ],
+        responses={200: EventManifestSerializer},
+    )
+    @action(detail=True, methods=["get"], url_path="manifest", permission_classes=[OnlyRolesAllowed("admin", "checker")])
+    def manifest(self, request, pk=None):
+        query = EventManifestQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        event = get_object_or_404(Event.objects.only("pk"), pk=pk)
+        data = manifest_for_day(event.pk, query.validated_data["date"], query.validated_data.get("since"))
+        return Response(EventManifestSerializer(data).data)
+
 
 @extend_schema(
     tags=["MarketSlot"],
@@ -107,6 +164,37 @@ class MarketSlotViewSet(viewsets.ModelViewSet):
 
     permission_classes = [RoleAllowed("admin", "squareManager")]
 
+    @extend_schema(
+        tags=["MarketSlot"],
+        summary="Bulk import of a market slot layout",
+        description=(
+            "Hromadné vytvoření prodejních míst pro akci. Přijímá JSON `{event, slots: [...]}` "
+            "nebo multipart s CSV souborem (`file`, UTF-8) a polem `event`. Sloupce: x, y, width, height, base_size, price. "
+            "Všechna místa se validují najednou, čísla se přidělí z čítače akce a vloží se v jedné transakci."
+        ),
+        request=MarketSlotLayoutSerializer,
+        responses={201: MarketSlotSerializer(many=True)},
+    )
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        upload = request.FILES.get("file")
+        if upload is not None:
+            try:
+                text = upload.read().decode("utf-8-sig")
+            except UnicodeDecodeError:
+                raise serializers.ValidationError({"file": ["CSV soubor musí být v kódování UTF-8."]})
+            data = {
+                "event": request.data.get("event"),
+                "slots": parse_layout_csv(text),
+            }
+        else:
+            data = request.data
+
+        serializer = MarketSlotLayoutSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        slots = serializer.save()
+        return Response(MarketSlotSerializer(slots, many=True).data, status=status.HTTP_201_CREATED)
+
 
 @extend_schema(
     tags=["Reservation"],
@@ -120,6 +208,8 @@ class ReservationViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = ReservationFilter
     ordering_fields = ["reserved_from", "reserved_to", "created_at"]
+    ordering = ["-created_at", "-id"]
+    pagination_class = CreatedAtCursorPagination
     search_fields = [
         "event__name",
         "event__square__name",
@@ -133,7 +223,7 @@ class ReservationViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         # queryset = Reservation.objects.select_related("event", "marketSlot", "user").prefetch_related("event_products").order_by("-created_at")
-        queryset = Reservation.objects.all().order_by("-created_at")
+        queryset = Reservation.objects.select_related("event", "user", "last_checked_by").order_by("-created_at")
         user = self.request.user
         if hasattr(user, "role") and user.role == "seller":
             return queryset.filter(user=user)
@@ -143,11 +233,61 @@ class ReservationViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         logger = logging.getLogger(__name__)
         logger.debug(f"Reservation create POST data: {request.data}")
+
+        # Hold místa se ověří / získá ještě před validací, souběžný požadavek skončí hned s 409
         try:
-            return super().create(request, *args, **kwargs)
+            hold_token, request_scoped = self._claim_hold(request)
+        except HoldConflict as e:
+            return Response({"detail": str(e)}, status=status.HTTP_409_CONFLICT)
+
+        created = False
+        try:
+            response = super().create(request, *args, **kwargs)
+            created = status.is_success(response.status_code)
+            return response
         except Exception as e:
             logger.error(f"Error in ReservationViewSet.create: {e}", exc_info=True)
             raise
+        finally:
+            # hold z checkoutu se spotřebuje jen vytvořením rezervace, při chybě ho uživatel drží dál
+            if hold_token and (created or request_scoped):
+                self._release_hold(hold_token)
+
+    def _release_hold(self, token):
+        try:
+            release_hold(token)
+        except HoldConflict:
+            # zámek místa se nepodařilo získat, hold vyprší sám (request-scoped do HOLD_REQUEST_TIMEOUT)
+            logging.getLogger(__name__).warning(f"Could not release slot hold {token}, leaving it to expire")
+
+    def _claim_hold(self, request):
+        """
+        S tokenem `hold` ověří, že hold patří uživateli a pokrývá požadovaný termín.
+        Bez tokenu si místo podrží jen na dobu zpracování požadavku.
+        Vrací (token holdu, True pokud je hold jen na dobu požadavku) nebo (None, False).
+        """
+        data = request.data
+        slot_id = data.get("market_slot") or data.get("marketSlot")
+        try:
+            slot_id = int(slot_id)
+            reserved_from = serializers.DateField().to_internal_value(data.get("reserved_from"))
+            reserved_to = serializers.DateField().to_internal_value(data.get("reserved_to"))
+        except (TypeError, ValueError, serializers.ValidationError):
+            # neplatná data ohlásí ReservationSerializer
+            return None, False
+
+        token = data.get("hold")
+        if token:
+            hold = get_hold(token)
+            if hold is None or hold["user_id"] != request.user.id:
+                raise HoldConflict("Podržení místa vypršelo, vyberte místo znovu.")
+            if hold["market_slot_id"] != slot_id or reserved_from < hold["reserved_from"] or reserved_to > hold["reserved_to"]:
+                raise HoldConflict("Rezervace neodpovídá podrženému místu a termínu.")
+            return token, False
+
+        if reserved_from >= reserved_to:
+            return None, False
+        return acquire_hold(slot_id, reserved_from, reserved_to, request.user.id, timeout=HOLD_REQUEST_TIMEOUT)["token"], True
     
     def perform_create(self, serializer):
         self._check_blocked_permission(serializer.validated_data)
@@ -181,6 +321,24 @@ class ReservationViewSet(viewsets.ModelViewSet):
             if getattr(user, "role", None) not in ["admin", "clerk"]:
                 raise PermissionDenied("Toto prodejní místo je zablokované.")
 
+    @extend_schema(
+        tags=["Reservation"],
+        summary="Signed QR ticket of a paid reservation",
+        description=(
+            "Vrátí podepsaný token vstupenky (obsah QR kódu) pro zaplacenou rezervaci. "
+            "Kontrolor ho ověří bez dotazu do databáze přes `POST /api/booking/checks/verify-ticket/`. "
+            "Po změně místa, termínu nebo uživatele je nutné vstupenku stáhnout znovu."
+        ),
+        responses={200: TicketSerializer, 409: OpenApiResponse(description="Rezervace není zaplacená nebo je zrušená")},
+    )
+    @action(detail=True, methods=["get"], url_path="ticket")
+    def ticket(self, request, pk=None):
+        reservation = self.get_object()
+        order = getattr(reservation, "order", None)
+        if reservation.status != "reserved" or order is None or order.is_deleted or order.status != "payed":
+            return Response({"detail": "Vstupenku lze vydat jen k zaplacené rezervaci."}, status=status.HTTP_409_CONFLICT)
+        return Response(TicketSerializer({"reservation": reservation.pk, "token": issue_ticket(reservation)}).data)
+
 @extend_schema(
     tags=["Reservation"],
     summary="Check reservation availability",
@@ -193,20 +351,46 @@ class ReservationViewSet(viewsets.ModelViewSet):
 )
 class ReservationAvailabilityCheckView(APIView):
     def post(self, request):
-        serializer = ReservationAvailabilitySerializer(data=request.data)
+        serializer = ReservationAvailabilitySerializer(data=request.data, context={"request": request})
         if serializer.is_valid():
             return Response({"available": True}, status=status.HTTP_200_OK)
         return Response({"available": False}, status=status.HTTP_200_OK)
 
+@extend_schema(
+    tags=["Reservation"],
+    summary="Batch availability of all market slots of an event",
+    description=(
+        "Vrátí stav (`free` / `blocked` / `reserved` / `held`) všech prodejních míst akce pro zvolené období. "
+        "U rezervovaných a podržených míst vrací i kolizní rozsahy. Výsledek se počítá v konstantním počtu dotazů "
+        "nad indexem obsazenosti, mapa se tak načte jedním požadavkem. Vyžaduje přihlášení."
+    ),
+    parameters=[
+        OpenApiParameter(name="event_id", type=int, location=OpenApiParameter.QUERY, required=True, description="ID akce"),
+        OpenApiParameter(name="reserved_from", type=str, location=OpenApiParameter.QUERY, required=True, description="Začátek období (YYYY-MM-DD)"),
+        OpenApiParameter(name="reserved_to", type=str, location=OpenApiParameter.QUERY, required=True, description="Konec období (YYYY-MM-DD)"),
+        OpenApiParameter(name="min_area", type=float, location=OpenApiParameter.QUERY, required=False, description="Minimální základní velikost místa (m²)"),
+        OpenApiParameter(name="status", type=str, location=OpenApiParameter.QUERY, required=False, enum=["free", "blocked", "reserved", "held"], description="Filtr podle stavu"),
+    ],
+)
+class EventAvailabilityView(APIView):
+    # mapa obsazenosti jen pro přihlášené uživatele (stejně jako výpis akcí a míst), čte každá role
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        serializer = EventAvailabilitySerializer(data=request.query_params, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.get_availability(), status=status.HTTP_200_OK)
+
 logger = logging.getLogger(__name__)
 
 @extend_schema(
     tags=["Reservation"],
-    summary="Get reserved days for a market slot in an event",
+    summary="Get reserved date ranges for a market slot in an event",
     description=(
-        "Returns a list of reserved days for a given event and market slot. "
+        "Returns merged reserved date ranges (`start`–`end`, both inclusive) for a given market slot, "
+        "plus `held_ranges` currently held by other users during checkout. "
         "Useful for visualizing slot occupancy and preventing double bookings. "
-        "Provide `event_id` and `market_slot_id` as query parameters."
+        "Answered from the per-slot occupancy index, provide `market_slot_id` as query parameter."
     ),
     parameters=[
         OpenApiParameter(
@@ -221,8 +405,8 @@ logger = logging.getLogger(__name__)
 )
 class ReservedDaysView(APIView):
     """
-    Returns reserved days for a given event and market slot.
-    GET params: event_id, market_slot_id
+    Returns reserved date ranges for a given market slot.
+    GET params: market_slot_id
     """
     def get(self, request, *args, **kwargs):
         market_slot_id = request.query_params.get("market_slot_id")
@@ -231,14 +415,60 @@ class ReservedDaysView(APIView):
                 {"detail": "market_slot_id is required."},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        try:
+            market_slot_id = int(market_slot_id)
+        except ValueError:
+            return Response(
+                {"detail": "market_slot_id must be an integer."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         serializer = ReservedDaysSerializer({
             "market_slot_id": market_slot_id
-        })
+        }, context={"request": request})
         logger.debug(f"ReservedDaysView GET market_slot_id={market_slot_id}")
         return Response(serializer.data)
     
 
 
+@extend_schema(
+    tags=["Reservation"],
+    summary="Hold a market slot during checkout",
+    description=(
+        "Podrží prodejní místo na zvolený termín po dobu checkoutu (10 minut). "
+        "Vrácený `token` se posílá jako `hold` při vytvoření rezervace, ta hold spotřebuje. "
+        "Pokud termín drží jiný uživatel nebo je už rezervovaný, vrací 409."
+    ),
+    request=SlotHoldSerializer,
+    responses={201: SlotHoldSerializer, 409: OpenApiResponse(description="Místo je obsazené nebo podržené")},
+)
+class SlotHoldView(APIView):
+    permission_classes = [OnlyRolesAllowed("admin", "squareManager", "seller")]
+
+    def post(self, request):
+        serializer = SlotHoldSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            hold = acquire_hold(data["market_slot"].id, data["reserved_from"], data["reserved_to"], request.user.id)
+        except HoldConflict as e:
+            return Response({"detail": str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(SlotHoldSerializer(hold).data, status=status.HTTP_201_CREATED)
+
+
+@extend_schema(
+    tags=["Reservation"],
+    summary="Release a market slot hold",
+    responses={204: None, 404: OpenApiResponse(description="Hold neexistuje nebo už vypršel")},
+)
+class SlotHoldDetailView(APIView):
+    permission_classes = [OnlyRolesAllowed("admin", "squareManager", "seller")]
+
+    def delete(self, request, token):
+        if not release_hold(token, user_id=request.user.id):
+            return Response({"detail": "Hold neexistuje nebo už vypršel."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 @extend_schema(
     tags=["Reservation Checks"],
     description="Správa kontrol rezervací – vytváření záznamů o kontrole a jejich výpis."
@@ -247,6 +477,7 @@ class ReservationCheckViewSet(viewsets.ModelViewSet):
     queryset = ReservationCheck.objects.select_related("reservation", "checker").all().order_by("-checked_at")
     serializer_class = ReservationCheckSerializer
     permission_classes = [OnlyRolesAllowed("admin", "checker")]  # Only checkers & admins can use it
+    pagination_class = CheckedAtCursorPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -255,4 +486,60 @@ class ReservationCheckViewSet(viewsets.ModelViewSet):
         return self.queryset
 
     def perform_create(self, serializer):
-        serializer.save()
\ No newline at end of file
+        serializer.save()
+
+    @extend_schema(
+        tags=["Reservation Checks"],
+        summary="Sync checks recorded offline",
+        description=(
+            "Hromadné odeslání kontrol zaznamenaných offline (čas z klienta, idempotenční `id`). "
+            "Kontroly se stejným `id` se nezapíší dvakrát (`duplicates`), nevalidní položky vrací `errors` podle indexu. "
+            "Kontrolorem je přihlášený uživatel."
+        ),
+        request=ReservationCheckSyncSerializer,
+        responses={200: {"type": "object", "properties": {
+            "created": {"type": "array", "items": {"type": "string", "format": "uuid"}},
+            "duplicates": {"type": "array", "items": {"type": "string", "format": "uuid"}},
+            "errors": {"type": "object"},
+        }}},
+    )
+    @action(detail=False, methods=["post"], url_path="sync")
+    def sync(self, request):
+        serializer = ReservationCheckSyncSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.sync(request.user), status=status.HTTP_200_OK)
+
+    @extend_schema(
+        tags=["Reservation Checks"],
+        summary="Verify a signed QR ticket",
+        description=(
+            "Ověří vstupenku bez dotazu do databáze: podpis, termín a seznam platných vstupenek v cache "
+            "(`date`, výchozí dnes). Neplatná vstupenka vrací `valid: false` a důvod v `reason`."
+        ),
+        request=TicketVerifySerializer,
+        responses={200: TicketVerificationSerializer},
+    )
+    @action(detail=False, methods=["post"], url_path="verify-ticket")
+    def verify(self, request):
+        serializer = TicketVerifySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = verify_ticket(serializer.validated_data["token"], serializer.validated_data.get("date"))
+        return Response(TicketVerificationSerializer(result).data)
+
+    @extend_schema(
+        tags=["Reservation Checks"],
+        summary="Ticket public key and valid tickets for offline verification",
+        description=(
+            "Veřejný klíč a platné vstupenky pro ověřování offline v zařízení kontrolora. "
+            "Podpis je Ed25519 přes část tokenu před posledním `.` (base64url bez paddingu). "
+            "Veřejným klíčem lze vstupenky jen ověřit, ne vystavit."
+        ),
+        responses={200: TicketKeySerializer},
+    )
+    @action(detail=False, methods=["get"], url_path="ticket-key")
+    def ticket_key(self, request):
+        return Response(TicketKeySerializer({
+            "algorithm": "Ed25519",
+            "public_key": base64.b64encode(public_key()).decode(),
+            "valid": {str(reservation_id): version for reservation_id, version in get_valid_tickets().items()},
+        }).data)
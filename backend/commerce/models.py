@@ -1,18 +1,23 @@
 import uuid
 
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 from trznice.models import SoftDeleteModel
 from booking.models import Reservation
+from booking.occupancy import invalidate_slot_occupancy
+from booking.manifest import mark_reservations_changed
+from booking.tickets import invalidate_tickets
+from booking.realtime import broadcast_released
 from account.models import CustomUser
 
 class Order(SoftDeleteModel):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="orders", null=False, blank=False)
     reservation = models.OneToOneField(Reservation, on_delete=models.CASCADE, related_name="order", null=False, blank=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)  # cursor stránkování
 
     STATUS_CHOICES = [
         ("payed", "Zaplaceno"),
@@ -32,6 +37,12 @@ class Order(SoftDeleteModel):
                                     )
     
     payed_at = models.DateTimeField(null=True, blank=True)
+
+    # Povolené přechody stavu přes transition(), ostatní změny jdou plnou cestou save()
+    TRANSITIONS = {
+        "pending": {"payed", "cancelled"},
+        "payed": {"cancelled"},
+    }
     
 
     def __str__(self):
@@ -92,7 +103,11 @@ class Order(SoftDeleteModel):
             raise ValidationError(errors)
     
 
-    def save(self, *args, **kwargs):
+    def save(self, *args, validate=True, **kwargs):
+        if not validate:
+            # jen uložení sloupců (transition), bez validace a synchronizace rezervace
+            return super().save(*args, **kwargs)
+
         self.full_clean()
 
         if self.status == "cancelled":
@@ -106,6 +121,77 @@ class Order(SoftDeleteModel):
         
         super().save(*args, **kwargs)
 
+    def can_transition(self, status):
+        return status in self.TRANSITIONS.get(self.status, ())
+
+    def transition(self, status, payed_at=None, update_fields=()):
+        """
+        Změna stavu objednávky (pending → payed / cancelled, payed → cancelled) bez full_clean.
+
+        Přechod nemění rezervaci, cenu ani uživatele, takže validace v clean() (existence rezervace,
+        jedna objednávka na rezervaci, cena) ani Reservation.full_clean výsledek změnit nemohou.
+        Ukládají se jen změněné sloupce (`update_fields`), rezervace se ukládá jen při stornu
+        (status = cancelled, bez validace – storno nemůže vytvořit překryv).
+
+        Args:
+            status (str): cílový stav
+            payed_at (datetime | None): čas zaplacení, výchozí teď
+            update_fields (Iterable[str]): další pole nastavená volajícím, která se mají uložit (např. note)
+        """
+        if not self.can_transition(status):
+            raise ValidationError({"status": f"Objednávku nelze převést ze stavu {self.get_status_display()} do stavu {dict(self.STATUS_CHOICES).get(status, status)}."})
+
+        self.status = status
+        # payed_at patří jen zaplaceným objednávkám (viz clean)
+        self.payed_at = (payed_at or timezone.now()) if status == "payed" else None
+
+        with transaction.atomic():
+            if status == "cancelled" and self.reservation.status != "cancelled":
+                self.reservation.status = "cancelled"
+                self.reservation.save(validate=False, update_fields=["status"])
+            self.save(validate=False, update_fields=["status", "payed_at", *update_fields])
+
+    @classmethod
+    def bulk_cancel(cls, queryset):
+        """
+        Hromadné storno nezaplacených objednávek (a jejich rezervací) bez save()/full_clean.
+        Počet dotazů nezávisí na počtu objednávek. Index obsazenosti a realtime delty
+        se řeší ručně, protože update() neposílá signály.
+
+        Returns:
+            list[int]: ID stornovaných objednávek
+        """
+        with transaction.atomic():
+            rows = list(
+                queryset.filter(status="pending", payed_at__isnull=True)
+                .select_for_update(of=("self",))
+                .values_list(
+                    "id", "reservation_id", "reservation__status", "reservation__event_id",
+                    "reservation__market_slot_id", "reservation__reserved_from", "reservation__reserved_to",
+                )
+            )
+            if not rows:
+                return []
+
+            order_ids = [row[0] for row in rows]
+            cls.objects.filter(pk__in=order_ids).update(status="cancelled")
+            Reservation.objects.filter(pk__in=[row[1] for row in rows]).update(status="cancelled")
+
+            invalidate_slot_occupancy(*(row[4] for row in rows))
+            mark_reservations_changed(*(row[1] for row in rows))
+            invalidate_tickets()
+            broadcast_released(row[3:] for row in rows if row[2] == "reserved")
+
+        return order_ids
+
+    @classmethod
+    def soft_delete_cascade_hook(cls, queryset, deleted_at):
+        # Objednávky smazané kaskádou (akce, místo, rezervace) se stornují, zaplacené zůstávají
+        queryset.filter(status="pending").update(status="cancelled")
+        # zaplacenost v manifestech kontrolorů
+        mark_reservations_changed(*queryset.values_list("reservation_id", flat=True))
+        invalidate_tickets()
+
     def delete(self, *args, **kwargs):
         self.reservation.status = "cancelled"
         self.reservation.save()
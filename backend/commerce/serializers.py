@@ -1,11 +1,13 @@
 from rest_framework import serializers
 from django.utils import timezone
+from django.core.exceptions import ValidationError as DjangoValidationError
 
 from trznice.utils import RoundedDateTimeField
 from account.serializers import CustomUserSerializer
 from booking.serializers import ReservationSerializer
 from account.models import CustomUser
 from booking.models import Event, MarketSlot, Reservation
+from booking.pricing import quote_price, quote_many, reservation_days
 from .models import Order
 
 from decimal import Decimal
@@ -20,7 +22,7 @@ class SlotPriceInputSerializer(serializers.Serializer):
 
 #počítaní ceny!!! (počítá správně!!)
 class PriceCalculationSerializer(serializers.Serializer):
-    slot = serializers.PrimaryKeyRelatedField(queryset=MarketSlot.objects.all())
+    slot = serializers.PrimaryKeyRelatedField(queryset=MarketSlot.objects.select_related("event"))
     reserved_from = RoundedDateTimeField()
     reserved_to = RoundedDateTimeField()
     used_extension = serializers.FloatField(min_value=0, required=False)
@@ -38,34 +40,62 @@ class PriceCalculationSerializer(serializers.Serializer):
         if is_naive(reserved_to):
             reserved_to = make_aware(reserved_to)
 
-        duration = reserved_to - reserved_from
-        days = duration.days + 1  # zahrnujeme první den
-
         data["reserved_from"] = reserved_from
         data["reserved_to"] = reserved_to
-        data["duration"] = days
+        data["duration"] = reservation_days(reserved_from, reserved_to)
 
-        market_slot = data["slot"]
-        event = market_slot.event if hasattr(market_slot, "event") else None
+        try:
+            final_price = quote_price(data["slot"], reserved_from, reserved_to, data.get("used_extension", 0))
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.messages)
 
-        if not event or not event.square:
-            raise serializers.ValidationError("Slot musí být přiřazen k akci, která má náměstí.")
+        data["final_price"] = final_price
+        return data
 
-        # Get width and height from market_slot
-        area = market_slot.width * market_slot.height
 
-        price_per_m2 = market_slot.price_per_m2 if market_slot.price_per_m2 and market_slot.price_per_m2 > 0 else event.price_per_m2
 
-        if not price_per_m2 or price_per_m2 < 0:
-            raise serializers.ValidationError("Cena za m² není dostupná nebo je záporná.")
+class PriceQuoteItemSerializer(serializers.Serializer):
+    slot = serializers.IntegerField(help_text="ID prodejního místa (MarketSlot)")
+    reserved_from = serializers.DateField()
+    reserved_to = serializers.DateField()
+    used_extension = serializers.FloatField(min_value=0, required=False, default=0)
 
-        # Calculate final price using slot area and reserved days
-        final_price = Decimal(area) * Decimal(price_per_m2) * Decimal(days)
-        final_price = final_price.quantize(Decimal("0.01"))
 
-        data["final_price"] = final_price
-        return data
+class BatchPriceCalculationSerializer(serializers.Serializer):
+    """
+    Cena pro více kombinací (místo, termín, rozšíření) najednou.
+    Prodejní místa se načtou jedním dotazem, ceny spočítá booking.pricing.quote_many.
+    """
+    MAX_ITEMS = 500
+
+    items = PriceQuoteItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        if len(items) > self.MAX_ITEMS:
+            raise serializers.ValidationError(f"Najednou lze spočítat maximálně {self.MAX_ITEMS} položek.")
+        return items
 
+    def get_quotes(self):
+        items = self.validated_data["items"]
+        slots = MarketSlot.objects.select_related("event").in_bulk({item["slot"] for item in items})
+
+        missing = {str(index): ["Prodejní místo neexistuje."] for index, item in enumerate(items) if item["slot"] not in slots}
+        if missing:
+            raise serializers.ValidationError({"items": missing})
+
+        try:
+            prices = quote_many([
+                (slots[item["slot"]], item["reserved_from"], item["reserved_to"], item["used_extension"])
+                for item in items
+            ])
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({"items": e.message_dict})
+
+        quotes = [
+            {**item, "duration": reservation_days(item["reserved_from"], item["reserved_to"]), "final_price": price}
+            for item, price in zip(items, prices)
+        ]
+        return {"items": quotes, "total": sum(prices, Decimal("0.00"))}
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -115,6 +145,8 @@ class OrderSerializer(serializers.ModelSerializer):
             "payed_at": {"help_text": "Datum a čas, kdy byla objednávka zaplacena", "required": False},
         }
 
+    TRANSITION_FIELDS = {"status", "note"}
+
     def validate(self, data):
         if "status" in data and data["status"] not in dict(Order.STATUS_CHOICES):
             raise serializers.ValidationError({"status": "Neplatný stav objednávky."})
@@ -143,8 +175,8 @@ class OrderSerializer(serializers.ModelSerializer):
         user = data.get("user")
         request_user = self.context["request"].user if "request" in self.context else None
 
-        # If user is not specified, use the logged-in user
-        if user is None and request_user is not None:
+        # If user is not specified, use the logged-in user (only on create, update keeps the order's user)
+        if user is None and request_user is not None and self.instance is None:
             user = request_user
             data["user"] = user
 
@@ -173,6 +205,18 @@ class OrderSerializer(serializers.ModelSerializer):
 
         logger.debug(f"\n\nUpdating order {instance.id} from status {old_status} to {new_status}\n\n")
 
+        # Samotná změna stavu (případně s poznámkou) jde přes stavový automat, bez full_clean
+        if set(validated_data) <= self.TRANSITION_FIELDS and instance.can_transition(new_status):
+            update_fields = []
+            if "note" in validated_data:
+                instance.note = validated_data["note"]
+                update_fields.append("note")
+            try:
+                instance.transition(new_status, update_fields=update_fields)
+            except DjangoValidationError as e:
+                raise serializers.ValidationError(e.message_dict)
+            return instance
+
         if old_status != "payed" and new_status == "payed":
             validated_data["payed_at"] = timezone.now()
         return super().update(instance, validated_data)
\ No newline at end of file
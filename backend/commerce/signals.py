@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from commerce.models import Order
+from booking.manifest import mark_reservations_changed
+from booking.tickets import invalidate_tickets
+
+
+@receiver([post_save, post_delete], sender=Order)
+def update_reservation_payment_state(sender, instance, **kwargs):
+    # stav objednávky = "zaplaceno" v manifestu kontrolorů a platnost vstupenky
+    # (Order.save ukládá rezervaci dřív než sebe)
+    mark_reservations_changed(instance.reservation_id)
+    invalidate_tickets()
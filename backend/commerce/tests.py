@@ -1,3 +1,233 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from account.models import CustomUser, EmailOutbox
+from booking.tasks import cancel_unpayed_reservations_task
+from booking.models import Event, MarketSlot, Reservation, Square
+from booking.pricing import quote_price
+from .models import Order
+from .serializers import BatchPriceCalculationSerializer
+
+
+class OrderTransitionTests(TestCase):
+    """Změna stavu objednávky nesmí spouštět full_clean objednávky ani rezervace (rozpočet dotazů)."""
+
+    # SAVEPOINT + UPDATE order + RELEASE
+    PAYED_QUERY_BUDGET = 3
+    # SAVEPOINT + Reservation.save bez validace (2× SAVEPOINT + UPDATE + 2× RELEASE) + UPDATE order + RELEASE
+    CANCELLED_QUERY_BUDGET = 8
+    # načtení objednávky + SAVEPOINT/UPDATE/RELEASE + vnořená rezervace v odpovědi (akce, uživatel)
+    API_QUERY_BUDGET = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        square = Square.objects.create(name="Náměstí", grid_rows=20, grid_cols=20)
+        event = Event.objects.create(
+            name="Trh", square=square, start=date(2030, 1, 1), end=date(2030, 1, 31), price_per_m2=Decimal("10")
+        )
+        slot = MarketSlot.objects.create(event=event, base_size=4, x=0, y=0, width=2, height=2)
+        cls.admin = CustomUser.objects.create(
+            username="admin", email="admin@example.com", role="admin", phone_number="+420123456789"
+        )
+        cls.seller = CustomUser.objects.create(
+            username="seller", email="seller@example.com", role="seller", phone_number="+420123456788"
+        )
+        cls.reservation = Reservation.objects.create(
+            event=event, market_slot=slot, user=cls.seller,
+            reserved_from=date(2030, 1, 2), reserved_to=date(2030, 1, 4),
+        )
+        cls.order = Order.objects.create(user=cls.seller, reservation=cls.reservation)
+
+    def _order(self):
+        return Order.objects.select_related("reservation").get(pk=self.order.pk)
+
+    def test_pay_within_query_budget(self):
+        order = self._order()
+        with self.assertNumQueries(self.PAYED_QUERY_BUDGET):
+            order.transition("payed")
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, "payed")
+        self.assertIsNotNone(order.payed_at)
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, "reserved")
+
+    def test_cancel_within_query_budget(self):
+        order = self._order()
+        order.transition("payed")
+        with self.assertNumQueries(self.CANCELLED_QUERY_BUDGET):
+            order.transition("cancelled")
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, "cancelled")
+        self.assertIsNone(order.payed_at)
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, "cancelled")
+
+    def test_invalid_transition(self):
+        order = self._order()
+        order.transition("cancelled")
+        with self.assertNumQueries(0), self.assertRaises(ValidationError):
+            order.transition("payed")
+
+    def test_api_status_change_within_query_budget(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with self.assertNumQueries(self.API_QUERY_BUDGET):
+            response = client.patch(f"/api/commerce/orders/{self.order.pk}/", {"status": "payed"}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "payed")
+        order = self._order()
+        self.assertEqual(order.user_id, self.seller.pk)
+        self.assertIsNotNone(order.payed_at)
+
+
+class BatchPriceCalculationTests(TestCase):
+    URL = "/api/commerce/calculate_price/batch/"
+
+    @classmethod
+    def setUpTestData(cls):
+        square = Square.objects.create(name="Náměstí", grid_rows=20, grid_cols=20)
+        cls.event = Event.objects.create(
+            name="Trh", square=square, start=date(2030, 1, 1), end=date(2030, 1, 31), price_per_m2=Decimal("10")
+        )
+        cls.slots = [
+            MarketSlot.objects.create(event=cls.event, base_size=4, x=0, y=0, width=2, height=2),
+            MarketSlot.objects.create(
+                event=cls.event, base_size=6, x=5, y=0, width=3, height=2, price_per_m2=Decimal("12.35"), available_extension=2
+            ),
+        ]
+
+    def _post(self, items):
+        return APIClient().post(self.URL, {"items": items}, format="json")
+
+    def test_batch_matches_single_quotes(self):
+        items = [
+            {"slot": self.slots[0].pk, "reserved_from": "2030-01-02", "reserved_to": "2030-01-02"},
+            {"slot": self.slots[1].pk, "reserved_from": "2030-01-01", "reserved_to": "2030-01-31", "used_extension": 2},
+            {"slot": self.slots[1].pk, "reserved_from": "2030-01-30", "reserved_to": "2030-01-31"},
+        ]
+        response = self._post(items)
+
+        self.assertEqual(response.status_code, 200)
+        expected = [
+            quote_price(self.slots[0], date(2030, 1, 2), date(2030, 1, 2)),
+            quote_price(self.slots[1], date(2030, 1, 1), date(2030, 1, 31), 2),
+            quote_price(self.slots[1], date(2030, 1, 30), date(2030, 1, 31)),
+        ]
+        self.assertEqual([Decimal(str(item["final_price"])) for item in response.data["items"]], expected)
+        self.assertEqual([item["duration"] for item in response.data["items"]], [1, 31, 2])
+        self.assertEqual(Decimal(str(response.data["total"])), sum(expected))
+
+    def test_constant_query_count(self):
+        item = {"slot": self.slots[0].pk, "reserved_from": "2030-01-02", "reserved_to": "2030-01-04"}
+        # jeden dotaz na prodejní místa i s akcí
+        with self.assertNumQueries(1):
+            self.assertEqual(self._post([item]).status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self._post([item] * 50).status_code, 200)
+
+    def test_max_items(self):
+        item = {"slot": self.slots[0].pk, "reserved_from": "2030-01-02", "reserved_to": "2030-01-04"}
+        self.assertEqual(self._post([item] * BatchPriceCalculationSerializer.MAX_ITEMS).status_code, 200)
+
+        response = self._post([item] * (BatchPriceCalculationSerializer.MAX_ITEMS + 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("items", response.data)
+
+    def test_invalid_items_reported_by_index(self):
+        response = self._post([
+            {"slot": self.slots[0].pk, "reserved_from": "2030-01-02", "reserved_to": "2030-01-04"},
+            {"slot": 0, "reserved_from": "2030-01-02", "reserved_to": "2030-01-04"},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data["items"]), {"1"})
+
+        response = self._post([
+            {"slot": self.slots[0].pk, "reserved_from": "2030-01-04", "reserved_to": "2030-01-02"},
+            {"slot": self.slots[0].pk, "reserved_from": "2030-01-02", "reserved_to": "2030-01-04", "used_extension": 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data["items"]), {"0", "1"})
+
+
+class BulkCancelTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        square = Square.objects.create(name="Náměstí", grid_rows=20, grid_cols=20)
+        cls.event = Event.objects.create(
+            name="Trh", square=square, start=date(2030, 1, 1), end=date(2030, 1, 31), price_per_m2=Decimal("10")
+        )
+        cls.slots = [MarketSlot.objects.create(event=cls.event, base_size=4, x=3 * i, y=0, width=2, height=2) for i in range(6)]
+        cls.sellers = [
+            CustomUser.objects.create(
+                username=f"seller{i}", email=f"seller{i}@example.com", role="seller", phone_number=f"+42012345678{i}"
+            )
+            for i in range(6)
+        ]
+
+    def _orders(self, count, offset=0):
+        orders = []
+        for i in range(offset, offset + count):
+            reservation = Reservation.objects.create(
+                event=self.event, market_slot=self.slots[i], user=self.sellers[i],
+                reserved_from=date(2030, 1, 2), reserved_to=date(2030, 1, 4),
+            )
+            orders.append(Order.objects.create(user=self.sellers[i], reservation=reservation))
+        return orders
+
+    def _cancel_queries(self, queryset):
+        with CaptureQueriesContext(connection) as queries:
+            Order.bulk_cancel(queryset)
+        return len(queries)
+
+    def test_cancels_only_pending_unpaid_orders(self):
+        pending, payed, cancelled = self._orders(3)
+        payed.transition("payed")
+        cancelled.transition("cancelled")
+
+        with mock.patch("booking.realtime._send") as send, self.captureOnCommitCallbacks(execute=True):
+            cancelled_ids = Order.bulk_cancel(Order.objects.all())
+
+        self.assertEqual(cancelled_ids, [pending.pk])
+        statuses = dict(Order.objects.values_list("pk", "status"))
+        self.assertEqual(statuses, {pending.pk: "cancelled", payed.pk: "payed", cancelled.pk: "cancelled"})
+        self.assertEqual(
+            dict(Reservation.objects.values_list("order__pk", "status")),
+            {pending.pk: "cancelled", payed.pk: "reserved", cancelled.pk: "cancelled"},
+        )
+        send.assert_called_once_with(self.event.pk, [
+            {"slot_id": self.slots[0].pk, "state": "free", "start": "2030-01-02", "end": "2030-01-04"},
+        ])
+
+    def test_constant_query_count(self):
+        one = self._orders(1)
+        many = self._orders(5, offset=1)
+        single = self._cancel_queries(Order.objects.filter(pk=one[0].pk))
+        self.assertEqual(self._cancel_queries(Order.objects.filter(pk__in=[order.pk for order in many])), single)
+
+    def test_task_enqueues_one_batch_of_mails(self):
+        orders = self._orders(4)
+        Order.objects.filter(pk=orders[0].pk).update(created_at=timezone.now())
+        Order.objects.filter(pk__in=[order.pk for order in orders[1:]]).update(created_at=timezone.now() - timedelta(hours=1))
+
+        with CaptureQueriesContext(connection) as queries:
+            cancel_unpayed_reservations_task(minutes=30)
 
-# Create your tests here.
+        # INSERT OR IGNORE na SQLite, ON CONFLICT DO NOTHING na PostgreSQL
+        inserts = [query for query in queries if query["sql"].startswith("INSERT") and EmailOutbox._meta.db_table in query["sql"]]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            sorted(recipients for (recipients,) in EmailOutbox.objects.values_list("recipients")),
+            [[seller.email] for seller in self.sellers[1:4]],
+        )
+        self.assertEqual(Order.objects.get(pk=orders[0].pk).status, "pending")
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import OrderViewSet, CalculateReservationPriceView
+from .views import OrderViewSet, CalculateReservationPriceView, BatchCalculateReservationPriceView
 
 router = DefaultRouter()
 router.register(r'orders', OrderViewSet, basename='order')
@@ -8,4 +8,5 @@ router.register(r'orders', OrderViewSet, basename='order')
 urlpatterns = [
     path('', include(router.urls)),
     path("calculate_price/", CalculateReservationPriceView.as_view(), name="calculate_price"),
+    path("calculate_price/batch/", BatchCalculateReservationPriceView.as_view(), name="calculate_price_batch"),
 ]
\ No newline at end of file
@@ -11,8 +11,9 @@ from drf_spectacular.utils import extend_schema
 
 from account.permissions import RoleAllowed
 from rest_framework.permissions import IsAuthenticated
-from .serializers import OrderSerializer, PriceCalculationSerializer
+from .serializers import OrderSerializer, PriceCalculationSerializer, BatchPriceCalculationSerializer
 from .filters import OrderFilter
+from trznice.pagination import CreatedAtCursorPagination
 
 from .models import Order
 
@@ -36,6 +37,8 @@ class OrderViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
     filterset_class = OrderFilter
     ordering_fields = ["created_at", "price_to_pay", "payed_at"]
+    ordering = ["-created_at", "-id"]
+    pagination_class = CreatedAtCursorPagination
     search_fields = [
         "note",
         "user__email",
@@ -71,4 +74,22 @@ class CalculateReservationPriceView(APIView):
 
         data = serializer.validated_data
         # PriceCalculationSerializer now returns 'final_price' in validated_data
-        return Response({"final_price": data["final_price"]}, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response({"final_price": data["final_price"]}, status=status.HTTP_200_OK)
+
+
+class BatchCalculateReservationPriceView(APIView):
+
+    @extend_schema(
+        request=BatchPriceCalculationSerializer,
+        responses={200: {"type": "object", "properties": {"items": {"type": "array", "items": {"type": "object"}}, "total": {"type": "number"}}}},
+        tags=["Order"],
+        summary="Calculate prices for many reservations at once",
+        description=(
+            "Spočítá ceny pro více kombinací prodejní místo + termín + rozšíření jedním požadavkem. "
+            "Prodejní místa se načtou jedním dotazem, vrací cenu každé položky a součet `total`."
+        )
+    )
+    def post(self, request):
+        serializer = BatchPriceCalculationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.get_quotes(), status=status.HTTP_200_OK)
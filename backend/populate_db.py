@@ -167,7 +167,10 @@ def create_market_slots(events, max_slots=8):
     slots = []
     for event in events:
         count = random.randint(3, max_slots)
-        for _ in range(count):
+        attempts = 0
+        created = 0
+        while created < count and attempts < count * 5:
+            attempts += 1
             slot = MarketSlot(
                 event=event,
                 status=random.choice(["allowed", "blocked"]),
@@ -179,8 +182,13 @@ def create_market_slots(events, max_slots=8):
                 height=random.randint(2, 10),
                 price_per_m2=Decimal(f"{random.randint(10, 100)}.00")
             )
-            slot.full_clean()
-            slot.save()
+            try:
+                slot.full_clean()
+                slot.save()
+            except ValidationError:
+                # místo se překrývá s jiným nebo přesahuje mřížku náměstí
+                continue
+            created += 1
             # Check fields and relations
             assert slot.event == event
             assert slot.status in ["allowed", "blocked"]
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from product.models import Product, EventProduct
+from trznice.cache import bump_catalogue_version
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=EventProduct)
+def bump_product_catalogue_version(sender, instance, **kwargs):
+    # soft delete jde přes save() (post_save), hard delete přes post_delete
+    bump_catalogue_version(sender)
@@ -8,12 +8,15 @@ from rest_framework import viewsets, filters
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema
 
+from trznice.cache import CatalogueCacheMixin
+
 @extend_schema(
     tags=["Product"],
     description="Seznam produktů, jejich vytváření a úprava. Produkty lze filtrovat a třídit dle názvu nebo kódu."
 )
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CatalogueCacheMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all().order_by("name")
+    cache_models = (Product,)
     serializer_class = ProductSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
     filterset_fields = ["code"]
@@ -27,9 +30,10 @@ class ProductViewSet(viewsets.ModelViewSet):
     tags=["EventProduct"],
     description="Propojení produktů s událostmi. Zde se nastavují data prodeje konkrétního produktu na konkrétní události."
 )
-class EventProductViewSet(viewsets.ModelViewSet):
+class EventProductViewSet(CatalogueCacheMixin, viewsets.ModelViewSet):
     # queryset = EventProduct.objects.select_related("product", "event").all().order_by("start_selling_date")
     queryset = EventProduct.objects.select_related("product").order_by("start_selling_date")
+    cache_models = (EventProduct, Product)
     serializer_class = EventProductSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
     filterset_fields = ["product", "event"]
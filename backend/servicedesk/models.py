@@ -25,7 +25,7 @@ class ServiceTicket(SoftDeleteModel):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name="Zadavatel", related_name="tickets", null=False, blank=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="new", verbose_name="Stav", blank=True)
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default="tech", verbose_name="Kategorie", blank=True)
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Datum", editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Datum", editable=False, db_index=True)
 
     def __str__(self):
         return f"{self.title} ({self.get_status_display()})"
@@ -6,6 +6,7 @@ from django.contrib.auth import get_user_model
 from .models import ServiceTicket
 from .serializers import ServiceTicketSerializer
 from .filters import ServiceTicketFilter
+from trznice.pagination import CreatedAtCursorPagination
 from account.email import send_email_with_context
 
 from rest_framework.permissions import IsAuthenticated
@@ -25,6 +26,8 @@ class ServiceTicketViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
     filterset_class = ServiceTicketFilter
     ordering_fields = ["created_at"]
+    ordering = ["-created_at", "-id"]
+    pagination_class = CreatedAtCursorPagination
     search_fields = ["title", "description", "user__username"]
     permission_classes = [IsAuthenticated]
 
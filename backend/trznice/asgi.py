@@ -13,4 +13,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'trznice.settings')
 
-application = get_asgi_application()
+# Django se musí inicializovat dřív, než se naimportují consumery (modely)
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.security.websocket import AllowedHostsOriginValidator
+
+from booking.routing import websocket_urlpatterns as booking_websocket_urlpatterns
+
+application = ProtocolTypeRouter({
+    "http": django_asgi_app,
+    "websocket": AllowedHostsOriginValidator(
+        URLRouter(booking_websocket_urlpatterns)
+    ),
+})
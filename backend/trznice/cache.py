@@ -0,0 +1,99 @@
+"""
+Cache odpovědí pro katalog (náměstí, akce, zboží) řízená verzemi modelů.
+
+Každý model katalogu má v Django cache čítač verze. Signály při uložení / smazání
+čítač zvýší (po commitu transakce), čímž se všechny uložené odpovědi, které na modelu
+závisí, stanou neplatnými. Klíč odpovědi i ETag se skládají z cesty, query parametrů
+a verzí modelů, takže:
+
+- při shodném If-None-Match se vrátí 304 bez dotazu do DB i bez serializace,
+- při shodě v cache se vrátí uložená data bez dotazu do DB,
+- jinak se odpověď spočítá a uloží.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOGUE_VERSION_KEY = "catalogue:version:{}"
+CATALOGUE_RESPONSE_KEY = "catalogue:response:{}"
+CATALOGUE_RESPONSE_TIMEOUT = 60 * 60  # verze zajistí čerstvost, timeout jen uvolňuje paměť
+
+
+def _model_label(model):
+    return model if isinstance(model, str) else model._meta.label_lower
+
+
+def get_catalogue_versions(models):
+    """Aktuální verze modelů jako {label: verze}, chybějící se založí."""
+    labels = sorted({_model_label(model) for model in models})
+    keys = {CATALOGUE_VERSION_KEY.format(label): label for label in labels}
+    versions = {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+
+    for label in labels:
+        if label not in versions:
+            # po vyprázdnění cache začíná verze časem, aby se neopakovaly staré ETagy
+            cache.add(CATALOGUE_VERSION_KEY.format(label), int(time.time() * 1000), None)
+            versions[label] = cache.get(CATALOGUE_VERSION_KEY.format(label))
+    return versions
+
+
+def bump_catalogue_version(*models):
+    """Zneplatní odpovědi závislé na modelech, až po commitu (jinak by se mohla uložit stará data)."""
+    labels = {_model_label(model) for model in models}
+
+    def _bump():
+        for label in labels:
+            key = CATALOGUE_VERSION_KEY.format(label)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, int(time.time() * 1000), None)
+
+    transaction.on_commit(_bump)
+
+
+def _parse_etags(header):
+    return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
+
+
+class CatalogueCacheMixin:
+    """
+    Mixin pro ModelViewSet: cachuje `list` a `retrieve` podle verzí modelů v `cache_models`
+    a odpovídá na If-None-Match. `cache_models` musí obsahovat všechny modely,
+    které se v odpovědi serializují (i vnořené).
+    """
+    cache_models = ()
+
+    def _catalogue_cache_key(self, request):
+        versions = get_catalogue_versions(self.cache_models)
+        media_type = getattr(request, "accepted_media_type", "")
+        params = sorted(request.query_params.lists())
+        raw = f"{request.path}|{params}|{media_type}|{sorted(versions.items())}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _cached_response(self, request, handler, *args, **kwargs):
+        key = self._catalogue_cache_key(request)
+        etag = f'"{key[:32]}"'
+
+        if etag in _parse_etags(request.headers.get("If-None-Match", "")):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        data = cache.get(CATALOGUE_RESPONSE_KEY.format(key))
+        if data is not None:
+            return Response(data, headers={"ETag": etag})
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(CATALOGUE_RESPONSE_KEY.format(key), response.data, CATALOGUE_RESPONSE_TIMEOUT)
+            response["ETag"] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(request, super().retrieve, *args, **kwargs)
@@ -1,6 +1,12 @@
-from django.db import models
+from collections import Counter
+
+from django.db import models, transaction
 from django.utils import timezone
 
+import logging
+
+logger = logging.getLogger(__name__)
+
 class ActiveManager(models.Manager):
     def get_queryset(self):
         return super().get_queryset().filter(is_deleted=False)
@@ -38,6 +44,69 @@ class SoftDeleteModel(models.Model):
     def hard_delete(self, using=None, keep_parents=False):
         super().delete(using=using, keep_parents=keep_parents)
 
+    def cascade_delete(self):
+        """Soft delete instance včetně všech navázaných záznamů, viz soft_delete_cascade."""
+        deleted_at = timezone.now()
+        result = soft_delete_cascade(type(self).all_objects.filter(pk=self.pk), deleted_at)
+        self.is_deleted = True
+        self.deleted_at = deleted_at
+        return result
+
+
+def _cascade_relations(model):
+    """Reverzní FK / O2O vazby s on_delete=CASCADE na jiné SoftDeleteModel."""
+    return [
+        rel for rel in model._meta.related_objects
+        if not rel.many_to_many
+        and rel.on_delete is models.CASCADE
+        and issubclass(rel.related_model, SoftDeleteModel)
+    ]
+
+
+def soft_delete_cascade(queryset, deleted_at=None):
+    """
+    Hromadný soft delete záznamů i všeho, co na nich kaskádově závisí
+    (např. Square → Event → MarketSlot → Reservation → Order).
+
+    Každá úroveň je jeden UPDATE s poddotazem na rodiče, vše v jedné transakci,
+    bez načítání instancí a bez full_clean. Úrovně se mažou od listů ke kořeni.
+    Vedlejší efekty jednotlivých delete() (storno objednávek, uvolnění míst, ...)
+    dělají hromadně classmethody `soft_delete_cascade_hook(queryset, deleted_at)` modelů,
+    volané před označením dané úrovně jako smazané.
+
+    Signály post_save se neposílají, verze cache katalogu se zvýší přímo.
+
+    Returns:
+        (int, dict): celkový počet smazaných záznamů a počty podle modelu, stejně jako QuerySet.delete()
+    """
+    from trznice.cache import bump_catalogue_version
+
+    deleted_at = deleted_at or timezone.now()
+    counts = Counter()
+
+    def _delete(queryset):
+        model = queryset.model
+        active = queryset.filter(is_deleted=False)
+
+        hook = getattr(model, "soft_delete_cascade_hook", None)
+        if hook is not None:
+            hook(active, deleted_at)
+
+        parents = active.values("pk")
+        for rel in _cascade_relations(model):
+            _delete(rel.related_model.all_objects.filter(**{f"{rel.field.name}__in": parents}))
+
+        count = active.update(is_deleted=True, deleted_at=deleted_at)
+        if count:
+            counts[model._meta.label] += count
+            bump_catalogue_version(model)
+
+    with transaction.atomic(using=queryset.db):
+        _delete(queryset)
+
+    logger.info(f"Soft delete cascade: {dict(counts)}")
+    return sum(counts.values()), dict(counts)
+
 
 
 # SiteSettings model for managing site-wide settings
@@ -0,0 +1,31 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset (cursor) stránkování pro seznamy, které rostou s časem (rezervace, objednávky, ...).
+    Stránka se načte podle pozice v indexu (created_at, id), takže doba odpovědi
+    nezávisí na tom, kolik záznamů už v tabulce je.
+
+    Stránkování je na vyžádání: zapne se jen s `?cursor=` nebo `?page_size=` (výchozí 50, maximálně 500),
+    bez nich se vrací celý seznam jako dřív (stávající klienti počítají s polem).
+    U viewsetů s OrderingFilter se řadí podle `?ordering=` / `ordering` viewsetu,
+    kurzor se pak drží prvního pole řazení.
+    """
+    ordering = ("-created_at", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params and self.page_size_query_param not in request.query_params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class CheckedAtCursorPagination(CreatedAtCursorPagination):
+    ordering = ("-checked_at", "-id")
+
+
+class CreateTimeCursorPagination(CreatedAtCursorPagination):
+    ordering = ("-create_time", "-id")
@@ -0,0 +1,174 @@
+"""
+Skartace (hard delete) soft-smazaných záznamů po dávkách.
+
+Místo jednoho `QuerySet.delete()` přes celou tabulku (Django collector načte všechny
+řádky i kaskády do paměti a drží zámky po celou dobu) se maže:
+
+- po modelech v pořadí podle FK závislostí, potomci před rodiči
+  (Order → Reservation → MarketSlot → Event → Square), takže kaskáda
+  u rodičů už obvykle nemá co mazat,
+- po dávkách seřazených podle PK, každá dávka ve vlastní krátké transakci,
+  s volitelnou pauzou mezi dávkami,
+- s checkpointem v cache po každé dávce, klíčovaným datem skartace (`cutoff`); přerušený
+  běh (pád workeru, `time_limit`) se stejným `cutoff` pokračuje od posledního PK, běh
+  s jiným `cutoff` začne od začátku.
+"""
+import time
+from graphlib import CycleError, TopologicalSorter
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import SoftDeleteModel
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+RETENTION_BATCH_SIZE = 1000
+RETENTION_BATCH_SLEEP = 0.1  # sekundy mezi dávkami, uvolní DB pro běžný provoz
+RETENTION_CHECKPOINT_KEY = "retention:checkpoint:{}"
+RETENTION_CHECKPOINT_TIMEOUT = 60 * 60 * 24 * 7  # nedokončený běh s jiným cutoff už nikdo nenavrátí
+
+
+def soft_delete_models():
+    """Spravované modely dědící ze SoftDeleteModel."""
+    return [
+        model for model in apps.get_models()
+        if issubclass(model, SoftDeleteModel)
+        and model._meta.managed
+        and not model._meta.abstract
+        and hasattr(model, "all_objects")
+    ]
+
+
+def dependency_order(models):
+    """
+    Seřadí modely tak, aby model s FK na jiný model byl před ním (potomci první).
+    Při cyklu (vzájemné FK) se vrátí pořadí podle labelu, kaskádu pak dořeší Django collector.
+    """
+    models = sorted(models, key=lambda model: model._meta.label)
+    graph = {model: set() for model in models}
+    for model in models:
+        for field in model._meta.concrete_fields:
+            parent = field.related_model if field.is_relation else None
+            if parent in graph and parent is not model:
+                # rodič čeká na smazání potomka
+                graph[parent].add(model)
+
+    try:
+        return list(TopologicalSorter(graph).static_order())
+    except CycleError:
+        logger.warning("Cyclic FK between soft-delete models, falling back to label order")
+        return models
+
+
+def _checkpoint_key(cutoff):
+    return RETENTION_CHECKPOINT_KEY.format(cutoff.isoformat())
+
+
+def get_checkpoint(cutoff):
+    checkpoint = cache.get(_checkpoint_key(cutoff))
+    # checkpoint jiného běhu (jiná množina mazaných záznamů) se nepoužije
+    if checkpoint and checkpoint["cutoff"] == cutoff:
+        return checkpoint
+    return None
+
+
+def save_checkpoint(checkpoint):
+    cache.set(_checkpoint_key(checkpoint["cutoff"]), checkpoint, RETENTION_CHECKPOINT_TIMEOUT)
+
+
+def clear_checkpoint(cutoff):
+    cache.delete(_checkpoint_key(cutoff))
+
+
+def _delete_model(model, cutoff, checkpoint, batch_size, sleep, deadline):
+    """Maže jeden model po dávkách od `checkpoint["last_pk"]`. Vrací False, pokud vypršel čas."""
+    label = model._meta.label
+    stats = checkpoint["stats"].setdefault(label, {"deleted": 0, "cascaded": 0, "batches": 0, "seconds": 0.0})
+    queryset = model.all_objects.filter(is_deleted=True, deleted_at__lt=cutoff).order_by("pk")
+
+    while True:
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+
+        last_pk = checkpoint["last_pk"]
+        batch = queryset.filter(pk__gt=last_pk) if last_pk is not None else queryset
+        pks = list(batch.values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return True
+
+        started = time.monotonic()
+        with transaction.atomic():
+            _, counts = model.all_objects.filter(pk__in=pks).delete()
+        stats["seconds"] += time.monotonic() - started
+        stats["batches"] += 1
+        stats["deleted"] += counts.get(label, 0)
+        stats["cascaded"] += sum(count for name, count in counts.items() if name != label)
+
+        checkpoint["last_pk"] = pks[-1]
+        save_checkpoint(checkpoint)
+
+        if len(pks) < batch_size:
+            return True
+        if sleep:
+            time.sleep(sleep)
+
+
+def _throughput(stats):
+    for row in stats.values():
+        row["seconds"] = round(row["seconds"], 3)
+        row["rows_per_second"] = round(row["deleted"] / row["seconds"], 1) if row["seconds"] else None
+    return stats
+
+
+def hard_delete_soft_deleted(cutoff, batch_size=RETENTION_BATCH_SIZE, sleep=RETENTION_BATCH_SLEEP, time_limit=None):
+    """
+    Trvale smaže soft-smazané záznamy s `deleted_at` před `cutoff`.
+
+    Pokud v cache existuje checkpoint nedokončeného běhu se stejným `cutoff`, pokračuje
+    se v něm. Checkpoint jiného `cutoff` se ignoruje (mazala by se jiná množina záznamů).
+
+    Args:
+        cutoff (datetime): hranice deleted_at
+        batch_size (int): počet řádků v jedné dávce / transakci
+        sleep (float): pauza mezi dávkami v sekundách
+        time_limit (float | None): po kolika sekundách běh přerušit (checkpoint zůstane)
+
+    Returns:
+        dict: {"completed": bool, "cutoff": datetime, "stats": {model: {deleted, cascaded, batches, seconds, rows_per_second}}}
+    """
+    batch_size = max(int(batch_size), 1)
+    deadline = time.monotonic() + time_limit if time_limit else None
+
+    checkpoint = get_checkpoint(cutoff)
+    if checkpoint:
+        logger.info(f"Retention: resuming from {checkpoint['model']} pk>{checkpoint['last_pk']}")
+    else:
+        checkpoint = {"cutoff": cutoff, "done": [], "model": None, "last_pk": None, "stats": {}}
+
+    for model in dependency_order(soft_delete_models()):
+        label = model._meta.label
+        if label in checkpoint["done"]:
+            continue
+        if checkpoint["model"] != label:
+            checkpoint["model"], checkpoint["last_pk"] = label, None
+
+        if not _delete_model(model, cutoff, checkpoint, batch_size, sleep, deadline):
+            logger.info(f"Retention: time limit reached in {label}, checkpoint kept")
+            return {"completed": False, "cutoff": cutoff, "stats": _throughput(checkpoint["stats"])}
+
+        checkpoint["done"].append(label)
+        save_checkpoint(checkpoint)
+
+        stats = checkpoint["stats"][label]
+        if stats["deleted"]:
+            logger.info(
+                f"Hard deleted {stats['deleted']} records from {model.__name__} "
+                f"(+{stats['cascaded']} cascaded) in {stats['batches']} batches, {stats['seconds']:.2f}s"
+            )
+
+    clear_checkpoint(cutoff)
+    return {"completed": True, "cutoff": cutoff, "stats": _throughput(checkpoint["stats"])}
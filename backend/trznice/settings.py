@@ -130,6 +130,9 @@ USE_X_FORWARDED_HOST = True
 
 SESSION_COOKIE_AGE = 86400  # one day
 
+# Soukromý klíč Ed25519 pro podpis QR vstupenek (32 bajtů v base64, booking/tickets.py), bez nastavení se odvodí ze SECRET_KEY
+TICKET_SIGNING_KEY = os.getenv("TICKET_SIGNING_KEY")
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -497,6 +500,12 @@ if USE_PRODUCTION_DB is False:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',  # Database engine
             'NAME': BASE_DIR / 'db.sqlite3',         # Path to the SQLite database file
+            'OPTIONS': {
+                # zápisové transakce se serializují (BEGIN IMMEDIATE), SQLite nemá exclusion constraint
+                # a kontrola překryvu rezervací v Reservation.save() spoléhá na tento zámek
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
         }
     }
 else:
@@ -535,6 +544,11 @@ else:
     # PRODUCTION
     EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 
+# Lokální náhrada SMTP: e-maily z fronty (account/outbox.py) se zapisují do souborů v EMAIL_FILE_PATH
+if os.getenv("EMAIL_FILE_PATH"):
+    EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+    EMAIL_FILE_PATH = os.getenv("EMAIL_FILE_PATH")
+
 EMAIL_HOST = os.getenv("EMAIL_HOST_DEV")
 EMAIL_PORT = int(os.getenv("EMAIL_PORT_DEV", 465))
 EMAIL_USE_TLS = True           # ❌ Keep this OFF when using SSL
@@ -1,4 +1,5 @@
 from rest_framework.fields import DateTimeField
+from rest_framework.permissions import SAFE_METHODS
 from datetime import datetime
 
 
@@ -9,4 +10,40 @@ def truncate_to_minutes(dt: datetime) -> datetime:
 class RoundedDateTimeField(DateTimeField):
     def to_internal_value(self, value):
         dt = super().to_internal_value(value)
-        return truncate_to_minutes(dt)
\ No newline at end of file
+        return truncate_to_minutes(dt)
+
+
+def query_param_set(request, name):
+    """Hodnoty čárkami odděleného query parametru jako set, např. ?expand=market_slots,event_products."""
+    if request is None:
+        return set()
+    value = request.query_params.get(name, "")
+    return {item.strip() for item in value.split(",") if item.strip()}
+
+
+class SparseFieldsetMixin:
+    """
+    Mixin pro ModelSerializer:
+    - `?fields=id,name` vrátí jen vyjmenovaná pole,
+    - pole z `expandable_fields` (vnořené stromy) se serializují jen s `?expand=<pole>`.
+
+    Uplatní se jen na serializer volaný z view (kontext s requestem), vnořené serializery zůstávají beze změny.
+    """
+    expandable_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or not hasattr(request, "query_params"):
+            return
+
+        expand = query_param_set(request, "expand")
+        for name in self.expandable_fields:
+            if name not in expand:
+                self.fields.pop(name, None)
+
+        # ?fields= jen pro čtení, při zápisu (POST/PUT/PATCH) se musí validovat všechna pole
+        only = query_param_set(request, "fields")
+        if only and request.method in SAFE_METHODS:
+            for name in set(self.fields) - only - expand:
+                self.fields.pop(name)
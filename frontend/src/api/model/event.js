@@ -25,10 +25,11 @@ export const getEvents = async (params = {}) => {
  * GET detail konkrétní události.
  * 
  * @param {number} id - ID události
+ * @param {Object} params - např. { expand: "market_slots,event_products" } pro vnořená prodejní místa a zboží
  * @returns {Promise<Event>}
  */
-export const getEventById = async (id) => {
-  const response = await axios_instance.get(`${API_BASE_URL}/${id}/`);
+export const getEventById = async (id, params = {}) => {
+  const response = await axios_instance.get(`${API_BASE_URL}/${id}/`, { params });
   return response.data;
 };
 
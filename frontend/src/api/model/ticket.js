@@ -16,7 +16,8 @@ const API_BASE_URL = "/service-tickets";
  */
 export const getServiceTickets = async (params = {}) => {
   const response = await axios_instance.get(`${API_BASE_URL}/`, { params });
-  return response.data;
+  // bez params.cursor / params.page_size vrací API celý seznam, jinak stránku ({ next, previous, results })
+  return response.data?.results ?? response.data;
 };
 
 /**
@@ -13,7 +13,8 @@ const userAPI = {
    */
   async getUsers(params) {
     const response = await axios_instance.get(`${API_BASE_URL}/`, { params });
-    return response.data;
+    // bez params.cursor / params.page_size vrací API celý seznam, jinak stránku ({ next, previous, results })
+    return response.data?.results ?? response.data;
   },
 
   /**
@@ -23,7 +23,7 @@ export default function Step3Map({ data, setData, next, prev }) {
   // Load all slots for the selected event on initial load
   useEffect(() => {
     if (!data?.event?.id) return;
-    eventAPI.getEventById(data.event.id).then((eventData) => {
+    eventAPI.getEventById(data.event.id, { expand: "market_slots" }).then((eventData) => {
       if (eventData?.market_slots) {
         const mappedSlots = eventData.market_slots.map((slot) => ({
           ...slot,
@@ -52,8 +52,8 @@ export default function Step3Map({ data, setData, next, prev }) {
     if (slotId) {
       try {
         const res = await reservationAPI.getReservedRanges(slotId);
-        // Expecting { reserved_days: [date1, date2, ...] }
-        setBookedRanges(res?.reserved_days ?? []);
+        // Expecting { reserved_ranges: [{ start, end }, ...] }
+        setBookedRanges(res?.reserved_ranges ?? []);
       } catch (e) {
         setBookedRanges([]);
       }
@@ -197,7 +197,7 @@ export default function Step3Map({ data, setData, next, prev }) {
             eventStart={data?.event?.start ? new Date(data.event.start) : null}
             eventEnd={data?.event?.end ? new Date(data.event.end) : null}
             defaultDate={data?.event?.start ? new Date(data.event.start) : null}
-            bookedRanges={bookedRanges} // <-- now array of dates
+            bookedRanges={bookedRanges} // <-- array of { start, end } ranges
           />
         </Modal.Body>
       </Modal>
@@ -27,12 +27,13 @@ export default function DaySelectorCalendar({
 
   // Helper to check if a date is reserved
   const isReserved = (date) => {
-    // bookedRanges is now array of dates (string or Date)
-    return bookedRanges.some((reserved) => {
-      // Normalize both to YYYY-MM-DD for comparison
-      const d = dayjs(date).format("YYYY-MM-DD");
-      const r = dayjs(reserved).format("YYYY-MM-DD");
-      return d === r;
+    // bookedRanges is array of { start, end } (both days inclusive)
+    const d = dayjs(date).format("YYYY-MM-DD");
+    return bookedRanges.some(({ start, end }) => {
+      // Normalize to YYYY-MM-DD for comparison
+      const s = dayjs(start).format("YYYY-MM-DD");
+      const e = dayjs(end).format("YYYY-MM-DD");
+      return d >= s && d <= e;
     });
   };
 
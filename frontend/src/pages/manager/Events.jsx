@@ -575,10 +575,8 @@ function Events() {
                     <p><strong>Začátek:</strong> {selectedEvent.start ? dayjs(selectedEvent.start).format("DD.MM.YYYY HH:mm") : "—"}</p>
                     <p><strong>Konec:</strong> {selectedEvent.end ? dayjs(selectedEvent.end).format("DD.MM.YYYY HH:mm") : "—"}</p>
                     <p><strong>Cena za m²:</strong> {selectedEvent.price_per_m2 ? `${selectedEvent.price_per_m2} Kč` : "—"}</p>
-                    <p><strong>Počet míst:</strong> {Array.isArray(selectedEvent.market_slots) ? selectedEvent.market_slots.length : "—"}</p>
-                    <p><strong>Produkty:</strong> {Array.isArray(selectedEvent.event_products) && selectedEvent.event_products.length > 0
-                      ? selectedEvent.event_products.map(p => p.name).join(", ")
-                      : "—"}</p>
+                    <p><strong>Počet míst:</strong> {selectedEvent.market_slot_count ?? "—"}</p>
+                    <p><strong>Počet produktů:</strong> {selectedEvent.event_product_count ?? "—"}</p>
                     <p><strong>Obrázek:</strong> {selectedEvent.image ? <img src={selectedEvent.image} alt={selectedEvent.name} style={{ width: "100px", height: "auto", borderRadius: "8px" }} /> : "Žádný obrázek"}</p>
                   </>
                 )}
@@ -22,7 +22,7 @@ function MapEditor() {
 
     async function fetchSlots() {
       try {
-        const data = await apiEvent.getEventById(eventId);
+        const data = await apiEvent.getEventById(eventId, { expand: "market_slots" });
         setEventObject(data);
         setMarketSlots((data.market_slots || []).map((slot) => ({
                 ...slot,